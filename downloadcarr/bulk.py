@@ -0,0 +1,301 @@
+"""Concurrent bulk operations against *arr API.
+
+The clients in this package are synchronous; each method issues a single
+blocking HTTP request via urllib.  Bulk operations over thousands of items
+(e.g. changing the quality profile of every series in the library) are
+dominated by network latency, so here we fan the per-item requests out over a
+bounded pool of worker threads, with retries for transient failures.
+"""
+import os
+import time
+import threading
+import contextlib
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    Iterable,
+    Iterator,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+from .client import ArrConnectionError, ArrHttpError
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+#  HTTP status codes worth retrying; anything else in the 4xx range means the
+#  request itself is bad and will fail again.
+RETRY_HTTP_CODES = ("429", "500", "502", "503", "504")
+
+
+@dataclass(frozen=True)
+class BulkItemResult(Generic[T]):
+    """Outcome of a bulk operation on a single item.
+
+    ``item`` is the input as originally supplied; ``result`` is the value
+    returned by the API (None if the item was skipped or failed).
+    """
+
+    item: T
+    result: Any = None
+    error: Optional[Exception] = None
+    skipped: bool = False
+    attempts: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass(frozen=True)
+class BulkSummary(Generic[T]):
+    """Per-item results of a bulk operation, in input order, with throughput.
+    """
+
+    results: Tuple[BulkItemResult[T], ...]
+    elapsed: float
+
+    @property
+    def succeeded(self) -> Tuple[BulkItemResult[T], ...]:
+        return tuple(r for r in self.results if r.ok and not r.skipped)
+
+    @property
+    def failed(self) -> Tuple[BulkItemResult[T], ...]:
+        return tuple(r for r in self.results if not r.ok)
+
+    @property
+    def skipped(self) -> Tuple[BulkItemResult[T], ...]:
+        return tuple(r for r in self.results if r.skipped)
+
+    @property
+    def requests(self) -> int:
+        """Total HTTP requests issued, including retries."""
+        return sum(r.attempts for r in self.results)
+
+    @property
+    def throughput(self) -> float:
+        """Items processed (i.e. not skipped) per second."""
+        processed = len(self.results) - len(self.skipped)
+        if self.elapsed <= 0:
+            return 0.0
+        return processed / self.elapsed
+
+
+@dataclass(frozen=True)
+class BulkAddReport(Generic[T]):
+    """Outcome of a bulk add pipeline.
+
+    ``timings`` maps the name of each pipeline stage to its wall-clock
+    duration in seconds.  ``resumed`` holds inputs skipped because a previous
+    run had already processed them.
+    """
+
+    added: Tuple[T, ...]
+    existing: Tuple[str, ...]
+    not_found: Tuple[str, ...]
+    failed: Tuple[BulkItemResult, ...]
+    timings: Dict[str, float]
+    resumed: Tuple[str, ...] = ()
+
+    @property
+    def elapsed(self) -> float:
+        return sum(self.timings.values())
+
+
+@contextlib.contextmanager
+def stopwatch(timings: Dict[str, float], stage: str) -> Iterator[None]:
+    """Accumulate wall-clock time spent in the ``with`` block under
+    ``timings[stage]``.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+class RateLimiter:
+    """Token bucket limiting the rate of calls shared across threads.
+
+    ``rate`` is the sustained number of calls per second; ``burst`` is the
+    number of calls allowed back-to-back after a quiet period.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError(f"RateLimiter(): rate must be positive, not {rate}")
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a call is allowed."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class Checkpoint:
+    """Append-only record of processed keys, one per line, so that an
+    interrupted bulk job can resume where it stopped.
+
+    Each call to record() is flushed to disk before returning; a line
+    truncated by a crash is ignored on load, and dropped by the next
+    record().
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Set[str]:
+        try:
+            with open(self.path, "r") as f:
+                return {line[:-1] for line in f if line.endswith("\n")}
+        except FileNotFoundError:
+            return set()
+
+    def record(self, keys: Iterable[str]) -> None:
+        lines = "".join(f"{key}\n" for key in keys)
+        if not lines:
+            return
+        with open(self.path, "ab+") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size:
+                f.seek(size - 1)
+                if f.read(1) != b"\n":
+                    #  Drop a line truncated by a crash
+                    f.seek(0)
+                    f.truncate(f.read().rfind(b"\n") + 1)
+            f.write(lines.encode())
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def is_retryable(err: Exception) -> bool:
+    """Transient errors worth retrying: connection failures/timeouts,
+    rate limiting and server-side errors.
+    """
+    if isinstance(err, ArrConnectionError):
+        return True
+    if isinstance(err, ArrHttpError):
+        return err.args[0] in RETRY_HTTP_CODES
+    return False
+
+
+def map_concurrent(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    max_workers: int = 8,
+    retries: int = 2,
+    retry_delay: float = 0.5,
+    limiter: Optional[RateLimiter] = None,
+) -> Tuple[BulkItemResult[T], ...]:
+    """Apply ``func`` to each of ``items`` on a bounded thread pool.
+
+    Transient errors are retried with exponential backoff.  Errors are
+    collected per item rather than raised; results are returned in input order.
+
+    If ``limiter`` is supplied, every attempt (including retries) waits its
+    turn under the rate limit.
+    """
+
+    def run(item: T) -> BulkItemResult[T]:
+        attempt = 0
+        while True:
+            attempt += 1
+            if limiter is not None:
+                limiter.acquire()
+            try:
+                result = func(item)
+            except Exception as err:
+                if attempt > retries or not is_retryable(err):
+                    return BulkItemResult(item=item, error=err, attempts=attempt)
+                time.sleep(retry_delay * 2 ** (attempt - 1))
+            else:
+                return BulkItemResult(item=item, result=result, attempts=attempt)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return tuple(executor.map(run, items))
+
+
+def bulk_apply(
+    update: Callable[[T], R],
+    transform: Callable[[T], T],
+    items: Iterable[T],
+    max_workers: int = 8,
+    retries: int = 2,
+    retry_delay: float = 0.5,
+) -> BulkSummary[T]:
+    """Apply ``transform`` to each of ``items``, then send the transformed
+    values to the server via ``update`` (e.g. ``SonarrClient.update_series``).
+
+    Items whose transformed value compares equal to the original are skipped
+    without making a request.
+    """
+    start = time.perf_counter()
+
+    results = []
+    pending = []  # (index into results, original, transformed)
+    for item in items:
+        try:
+            transformed = transform(item)
+        except Exception as err:
+            results.append(BulkItemResult(item=item, error=err))
+            continue
+
+        if transformed == item:
+            results.append(BulkItemResult(item=item, skipped=True))
+        else:
+            pending.append((len(results), item, transformed))
+            results.append(BulkItemResult(item=item))
+
+    updated = map_concurrent(
+        update,
+        (transformed for index, item, transformed in pending),
+        max_workers=max_workers,
+        retries=retries,
+        retry_delay=retry_delay,
+    )
+    for (index, item, transformed), outcome in zip(pending, updated):
+        results[index] = BulkItemResult(
+            item=item,
+            result=outcome.result,
+            error=outcome.error,
+            attempts=outcome.attempts,
+        )
+
+    return BulkSummary(results=tuple(results), elapsed=time.perf_counter() - start)
+
+
+def batched(items: Iterable[T], size: int) -> Iterator[Tuple[T, ...]]:
+    """Split ``items`` into tuples of at most ``size`` items."""
+    if size < 1:
+        raise ValueError(f"batched(): size must be positive, not {size}")
+    iterator = iter(items)
+    while True:
+        batch = tuple(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
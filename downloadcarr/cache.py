@@ -0,0 +1,223 @@
+"""Client-side caching of *arr API responses.
+
+Responses are held as JSON text rather than as decoded models, so that the
+optional on-disk tier (stdlib sqlite3) can persist them across restarts, and
+so that the memory held by the cache can be measured.
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Mapping, Optional, Tuple
+
+
+#  Sentinel distinguishing a cache miss from a cached null response.
+MISSING = object()
+
+
+def normalize_term(term: str) -> str:
+    """Normalize a search term for use in a cache key: case-insensitive,
+    with runs of whitespace (or "+" used as space) collapsed.
+    """
+    return " ".join(term.replace("+", " ").split()).casefold()
+
+
+def make_key(uri: str, query: Optional[Mapping[str, Any]] = None) -> str:
+    """Cache key for a request to ``uri`` with normalized ``query`` params.
+    """
+    if not query:
+        return uri
+    params = "&".join(
+        f"{param}={normalize_term(str(value))}"
+        for param, value in sorted(query.items())
+    )
+    return f"{uri}?{params}"
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    """Snapshot of ResponseCache counters."""
+
+    hits: int
+    misses: int
+    disk_hits: int
+    evictions: int
+    expirations: int
+    entries: int
+    bytes: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return 0.0
+        return self.hits / lookups
+
+
+class ResponseCache:
+    """Thread-safe LRU cache of JSON responses, with a time-to-live per entry.
+
+    At most ``maxsize`` entries are held in memory; the least recently used
+    entry is evicted to make room.  Entries expire ``ttl`` seconds after
+    they're stored.
+
+    If ``path`` is supplied, entries are also written through to a sqlite3
+    database there; memory misses fall back to it, so the cache survives
+    restarts.  It too holds at most ``maxsize`` entries, dropping those
+    expiring soonest.  Since expiry must survive restarts too, it's measured
+    by wall clock (``clock``, by default time.time).
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float = 3600.0,
+        path: Optional[str] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self.clock = clock
+
+        #  key -> (expiry time, JSON text, size of JSON text in bytes)
+        self._entries: "OrderedDict[str, Tuple[float, str, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._hits = self._misses = self._disk_hits = 0
+        self._evictions = self._expirations = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS response "
+                "(key TEXT PRIMARY KEY, expires REAL, payload TEXT)"
+            )
+            self._db.execute("DELETE FROM response WHERE expires <= ?", (clock(),))
+            self._prune_disk()
+            self._db.commit()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return self._lookup(key, count=False) is not None
+
+    def get(self, key: str) -> Any:
+        """Return the decoded response cached under ``key``, or MISSING.
+        """
+        payload = self._lookup(key, count=True)
+        if payload is None:
+            return MISSING
+        return json.loads(payload)
+
+    def put(self, key: str, response: Any) -> None:
+        """Cache a JSON-serializable ``response`` under ``key``.
+        """
+        payload = json.dumps(response)
+        expires = self.clock() + self.ttl
+        with self._lock:
+            self._store(key, expires, payload)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO response VALUES (?, ?, ?)",
+                    (key, expires, payload),
+                )
+                self._prune_disk()
+                self._db.commit()
+
+    def invalidate(self, key: str) -> None:
+        """Drop the entry cached under ``key``, if any."""
+        with self._lock:
+            self._discard(key)
+            if self._db is not None:
+                self._db.execute("DELETE FROM response WHERE key = ?", (key,))
+                self._db.commit()
+
+    def clear(self) -> None:
+        """Drop all entries (statistics are retained)."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM response")
+                self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                disk_hits=self._disk_hits,
+                evictions=self._evictions,
+                expirations=self._expirations,
+                entries=len(self._entries),
+                bytes=self._bytes,
+            )
+
+    def _lookup(self, key: str, count: bool) -> Optional[str]:
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                self._discard(key)
+                self._expirations += 1
+                entry = None
+
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if count:
+                    self._hits += 1
+                return entry[1]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT expires, payload FROM response "
+                    "WHERE key = ? AND expires > ?",
+                    (key, now),
+                ).fetchone()
+                if row is not None:
+                    self._store(key, row[0], row[1])
+                    if count:
+                        self._hits += 1
+                        self._disk_hits += 1
+                    return row[1]
+
+            if count:
+                self._misses += 1
+            return None
+
+    def _store(self, key: str, expires: float, payload: str) -> None:
+        self._discard(key)
+        size = len(payload.encode())
+        self._entries[key] = (expires, payload, size)
+        self._bytes += size
+        while len(self._entries) > self.maxsize:
+            oldest, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self._evictions += 1
+
+    def _prune_disk(self) -> None:
+        """Drop the entries on disk beyond ``maxsize``, expiring soonest
+        (or, among those expiring together, written first).
+        """
+        assert self._db is not None
+        self._db.execute(
+            "DELETE FROM response WHERE rowid IN (SELECT rowid FROM response "
+            "ORDER BY expires DESC, rowid DESC LIMIT -1 OFFSET ?)",
+            (self.maxsize,),
+        )
+
+    def _discard(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
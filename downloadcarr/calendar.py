@@ -0,0 +1,256 @@
+"""Client-side caching of /calendar responses by date interval.
+
+Dashboards tend to request overlapping windows of the calendar over and over
+(e.g. "this week", every few seconds).  A CalendarCache remembers which date
+intervals it holds and when each was fetched, so that only the sub-ranges of
+a query not already held (or gone stale) are fetched from the server.
+
+Intervals are half-open ranges of dates [start, end), matching the way
+get_calendar() is normally called with consecutive windows.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import (
+    Any,
+    Callable,
+    Generic,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Tuple,
+    TypeVar,
+)
+
+
+T = TypeVar("T")
+
+ONE_DAY = timedelta(days=1)
+
+
+@dataclass(frozen=True)
+class Interval:
+    """Range of dates [start, end) held by a CalendarCache, with the items
+    dated within it.
+
+    ``undated`` holds the items without dates (e.g. movies whose only
+    release is one ``dates`` doesn't report), each with the range
+    [start, end) it was fetched for.
+    """
+
+    start: date
+    end: date
+    fetched: float
+    items: Tuple[Any, ...]
+    undated: Tuple[Tuple[date, date, Any], ...] = ()
+
+
+def within(days: Iterable[date], start: date, end: date) -> bool:
+    return any(start <= day < end for day in days)
+
+
+def date_range(start: date, end: date) -> Iterator[date]:
+    """Days in [start, end)."""
+    day = start
+    while day < end:
+        yield day
+        day += ONE_DAY
+
+
+class CalendarCache(Generic[T]):
+    """Thread-safe cache of calendar items by date interval.
+
+    Each interval expires ``ttl`` seconds after it was fetched.  Adjacent
+    intervals are merged, keeping the older fetch time, so that a window
+    sliding forward a day at a time doesn't fragment the cache; a merged
+    interval is refreshed by a single request once it goes stale.
+
+    ``key`` identifies an item, so that one dated in several intervals is
+    returned only once.
+
+    A CalendarCache should only be shared by clients of the same server.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 300.0,
+        key: Callable[[T], Hashable] = lambda item: item.id,  # type: ignore
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.key = key
+        self.clock = clock
+        self.fetches = 0
+
+        self._intervals: List[Interval] = []
+        self._lock = threading.RLock()
+
+    @property
+    def intervals(self) -> Tuple[Tuple[date, date], ...]:
+        """Date ranges currently held, in order."""
+        with self._lock:
+            return tuple((i.start, i.end) for i in self._intervals)
+
+    def get(
+        self,
+        start: date,
+        end: date,
+        fetch: Callable[[date, date], Iterable[T]],
+        dates: Callable[[T], Iterable[date]],
+    ) -> Tuple[T, ...]:
+        """Items dated within [start, end).
+
+        ``fetch(start, end)`` is called for each sub-range not held fresh in
+        the cache.  ``dates`` returns the dates on which an item falls within
+        the calendar; items for which it returns none are kept as dated by
+        the server within the sub-range they were fetched for.
+        """
+        if end <= start:
+            return ()
+
+        with self._lock:
+            self._expire()
+            for gap_start, gap_end in self._gaps(start, end):
+                fetched = self.clock()
+                items = []
+                undated = []
+                for item in fetch(gap_start, gap_end):
+                    days = tuple(dates(item))
+                    if not days:
+                        undated.append((gap_start, gap_end, item))
+                    elif within(days, gap_start, gap_end):
+                        items.append(item)
+                self.fetches += 1
+                interval = Interval(
+                    gap_start, gap_end, fetched, tuple(items), tuple(undated)
+                )
+                self._insert(interval)
+
+            return self._collect(start, end, dates)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._intervals.clear()
+
+    def invalidate(
+        self,
+        match: Callable[[T], bool],
+        dates: Callable[[T], Iterable[date]],
+        days: Iterable[date] = (),
+    ) -> None:
+        """Forget the days held on which items for which ``match`` is true
+        are dated, and ``days`` (e.g. the new dates of a changed item), so
+        that only those are fetched afresh; the rest of the cache is kept.
+
+        An undated item matching drops the whole range it was fetched for.
+        """
+        invalid = set(days)
+        with self._lock:
+            intervals = []
+            for interval in self._intervals:
+                drop = {d for d in invalid if interval.start <= d < interval.end}
+                for item in interval.items:
+                    if match(item):
+                        drop.update(
+                            d for d in dates(item) if interval.start <= d < interval.end
+                        )
+                for fetch_start, fetch_end, item in interval.undated:
+                    if match(item):
+                        drop.update(date_range(fetch_start, fetch_end))
+                if not drop:
+                    intervals.append(interval)
+                    continue
+                start = interval.start
+                for day in sorted(drop) + [interval.end]:
+                    if start < day:
+                        intervals.append(self._slice(interval, start, day, dates))
+                    start = day + ONE_DAY
+            self._intervals = intervals
+
+    def _expire(self) -> None:
+        now = self.clock()
+        self._intervals = [i for i in self._intervals if now - i.fetched < self.ttl]
+
+    def _gaps(self, start: date, end: date) -> List[Tuple[date, date]]:
+        gaps = []
+        cursor = start
+        for interval in self._intervals:
+            if interval.end <= cursor:
+                continue
+            if interval.start >= end:
+                break
+            if interval.start > cursor:
+                gaps.append((cursor, interval.start))
+            cursor = max(cursor, interval.end)
+        if cursor < end:
+            gaps.append((cursor, end))
+        return gaps
+
+    def _insert(self, new: Interval) -> None:
+        """Insert an interval not overlapping any held, merging it with
+        adjacent intervals.
+        """
+        merged = []
+        for interval in self._intervals:
+            if interval.end == new.start or interval.start == new.end:
+                first, second = sorted((interval, new), key=lambda i: i.start)
+                new = Interval(
+                    start=first.start,
+                    end=second.end,
+                    fetched=min(first.fetched, second.fetched),
+                    items=first.items + second.items,
+                    undated=first.undated + second.undated,
+                )
+            else:
+                merged.append(interval)
+        merged.append(new)
+        merged.sort(key=lambda i: i.start)
+        self._intervals = merged
+
+    def _slice(
+        self,
+        interval: Interval,
+        start: date,
+        end: date,
+        dates: Callable[[T], Iterable[date]],
+    ) -> Interval:
+        """Part [start, end) of an interval, with the items it holds."""
+        items = tuple(
+            item for item in interval.items if within(dates(item), start, end)
+        )
+        undated = tuple(
+            (max(fetch_start, start), min(fetch_end, end), item)
+            for fetch_start, fetch_end, item in interval.undated
+            if fetch_start < end and fetch_end > start
+        )
+        return Interval(start, end, interval.fetched, items, undated)
+
+    def _collect(
+        self, start: date, end: date, dates: Callable[[T], Iterable[date]]
+    ) -> Tuple[T, ...]:
+        """Items dated within [start, end), ordered by their first date in it
+        (undated items, by the start of the range they were fetched for).
+        """
+        seen = set()
+        dated = []
+        for interval in self._intervals:
+            if interval.end <= start or interval.start >= end:
+                continue
+            for item in interval.items:
+                key = self.key(item)
+                if key in seen:
+                    continue
+                days = [day for day in dates(item) if start <= day < end]
+                if days:
+                    seen.add(key)
+                    dated.append((min(days), item))
+            for fetch_start, fetch_end, item in interval.undated:
+                key = self.key(item)
+                if key in seen or fetch_end <= start or fetch_start >= end:
+                    continue
+                seen.add(key)
+                dated.append((max(fetch_start, start), item))
+        dated.sort(key=lambda pair: pair[0])
+        return tuple(item for day, item in dated)
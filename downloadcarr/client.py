@@ -8,11 +8,13 @@ import ssl
 import json
 import socket
 from typing import Any, Mapping, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from .__version__ import __version__, __title__
 from .enums import HttpMethod
 from .models import CommandStatus
+from .cache import ResponseCache, MISSING, make_key
+from .calendar import CalendarCache
 
 
 class ArrClientError(Exception):
@@ -36,6 +38,10 @@ class Client:
     This class and its subclasses are defined as dataclasses for the
     convenience of autogenerated dunder methods a la attrs.  It's actually
     a proper object class with methods, not data.
+
+    If ``lookup_cache`` is supplied, responses to the (slow) metadata lookup
+    endpoints are cached there.  If ``calendar_cache`` is supplied, calendar
+    queries with both start & end dates are served from there.
     """
 
     host: str
@@ -46,6 +52,12 @@ class Client:
     tls: bool = False
     verify_ssl: bool = True
     user_agent: str = f"{__title__}.Client/{__version__} (Python)"
+    lookup_cache: Optional[ResponseCache] = field(
+        default=None, compare=False, repr=False
+    )
+    calendar_cache: Optional[CalendarCache] = field(
+        default=None, compare=False, repr=False
+    )
 
     def _request(
         self,
@@ -106,6 +118,24 @@ class Client:
 
         return response
 
+    def _cached_request(
+        self,
+        cache: Optional[ResponseCache],
+        uri: str,
+        query: Optional[Mapping[str, str]] = None,
+    ) -> Any:
+        """Handle a GET request to API, serving it from ``cache`` if possible.
+        """
+        if cache is None:
+            return self._request(uri, query=query)
+
+        key = make_key(uri, query)
+        response = cache.get(key)
+        if response is MISSING:
+            response = self._request(uri, query=query)
+            cache.put(key, response)
+        return response
+
     def _post_command(self, name: str, **kwargs) -> CommandStatus:
         """POST a request to /{base_path}/command.
 
@@ -0,0 +1,346 @@
+"""Decoding JSON array responses into columns, for analytics.
+
+Analyses over the whole library or history (e.g. sizes by quality, grabs by
+series) need a few fields of every row, not hundreds of thousands of model
+instances.  A ColumnBatch decodes only the fields asked for, straight from
+the JSON objects into one column per field:
+
+    * int, float & bool fields, into ``array.array``
+    * datetime fields, into an array of POSIX timestamps; date fields, into
+      an array of ordinals (date.toordinal())
+    * str & enum fields, dictionary-encoded: an array of codes into a list of
+      the distinct strings
+
+Fields are named by the model attribute, with dots for nested models, e.g.
+"quality.quality.id"; the model's type hints give each column its type.
+Missing (null) values are flagged in the column's ``valid`` mask.
+
+If NumPy is installed, a batch can be converted to a structured array.
+"""
+import array
+import dataclasses
+import enum
+import math
+from datetime import date, datetime
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+)
+
+from . import utils
+from .models import Base
+from .radarr import RadarrClient
+from .sonarr import SonarrClient
+import downloadcarr.radarr.models as radarr_models
+import downloadcarr.sonarr.models as sonarr_models
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+
+#  Models of the JSON objects returned by each endpoint (history: its records)
+SONARR_RESOURCES: Mapping[str, Type[Base]] = {
+    "episode": sonarr_models.Episode,
+    "episodefile": sonarr_models.EpisodeFile,
+    "history": sonarr_models.Download,
+    "series": sonarr_models.Series,
+}
+
+RADARR_RESOURCES: Mapping[str, Type[Base]] = {
+    "movie": radarr_models.Movie,
+    "history": radarr_models.Download,
+}
+
+#  array.array typecode of each column type
+TYPECODES = {bool: "b", int: "q", float: "d", datetime: "d", date: "q"}
+
+
+def timestamp(value: str) -> float:
+    """POSIX timestamp of a JSON datetime.  The API means datetimes without
+    "Z" as UTC too, so they aren't taken as local time.
+    """
+    if not value.endswith("Z"):
+        value += "Z"
+    return utils.datetime_fromisoformat(value).timestamp()
+
+
+#  Conversion of JSON values for each column type
+CONVERTERS: Dict[type, Callable[[Any], Any]] = {
+    bool: int,
+    int: int,
+    float: float,
+    datetime: timestamp,
+    date: lambda value: date.fromisoformat(value).toordinal(),
+}
+
+#  Value stored for nulls in numeric columns
+MISSING = {"b": 0, "q": 0, "d": math.nan}
+
+
+def field_type(cls: Type[Base], name: str) -> type:
+    """Type of a (dotted) field of a model, Optional removed."""
+    attr_type: Any = cls
+    for attr in name.split("."):
+        try:
+            fields = {field.name: field.type for field in dataclasses.fields(attr_type)}
+        except TypeError:
+            raise ValueError(f"{cls.__name__}.{name}: {attr_type} isn't a model")
+        if attr not in fields:
+            raise ValueError(f"{cls.__name__} has no field {name}")
+        attr_type = fields[attr]
+        if getattr(attr_type, "__origin__", None) is Union:
+            #  Optional[T]
+            (attr_type,) = (
+                arg for arg in attr_type.__args__ if arg is not utils.NoneType
+            )
+    return attr_type
+
+
+class Column:
+    """Numeric column: values in ``values`` (an ``array.array``).
+
+    ``valid`` is None while every value is present; once one is missing, a
+    bytearray flagging (with 1) the values present.
+    """
+
+    def __init__(self, name: str, type_: type):
+        self.name = name
+        self.type = type_
+        self.values: "array.array[Any]" = array.array(TYPECODES[type_])
+        self._convert = CONVERTERS[type_]
+        self.valid: Optional[bytearray] = None
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, index: int) -> Any:
+        if self.valid is not None and not self.valid[index]:
+            return None
+        value = self.values[index]
+        if self.type is bool:
+            return bool(value)
+        if self.type is datetime:
+            return datetime.fromtimestamp(value, utils.UTC)
+        if self.type is date:
+            return date.fromordinal(value)
+        return value
+
+    def __iter__(self) -> Iterator[Any]:
+        return (self[index] for index in range(len(self)))
+
+    def append(self, value: Any) -> None:
+        if value is None:
+            if self.valid is None:
+                self.valid = bytearray(b"\x01") * len(self.values)
+            self.valid.append(0)
+            self.values.append(MISSING[self.values.typecode])
+            return
+        self.values.append(self._convert(value))
+        if self.valid is not None:
+            self.valid.append(1)
+
+
+class DictColumn:
+    """Dictionary-encoded string column: ``codes`` (an ``array.array``) index
+    the distinct strings in ``categories``, with -1 for missing values.
+    """
+
+    def __init__(self, name: str, type_: type = str):
+        self.name = name
+        self.type = type_
+        self.codes = array.array("i")
+        self.categories: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, index: int) -> Optional[str]:
+        code = self.codes[index]
+        return None if code < 0 else self.categories[code]
+
+    def __iter__(self) -> Iterator[Optional[str]]:
+        return (self[index] for index in range(len(self)))
+
+    @property
+    def valid(self) -> Optional[bytearray]:
+        if -1 not in self.codes:
+            return None
+        return bytearray(code >= 0 for code in self.codes)
+
+    def append(self, value: Optional[str]) -> None:
+        if value is None:
+            self.codes.append(-1)
+            return
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.categories)
+            self.categories.append(value)
+        self.codes.append(code)
+
+    def counts(self) -> Dict[str, int]:
+        """Number of occurrences of each string."""
+        counts = [0] * len(self.categories)
+        for code in self.codes:
+            if code >= 0:
+                counts[code] += 1
+        return dict(zip(self.categories, counts))
+
+
+AnyColumn = Union[Column, DictColumn]
+
+
+def make_column(cls: Type[Base], name: str) -> AnyColumn:
+    type_ = field_type(cls, name)
+    if type_ is str or (isinstance(type_, type) and issubclass(type_, enum.Enum)):
+        return DictColumn(name, type_)
+    if type_ in TYPECODES:
+        return Column(name, type_)
+    raise ValueError(f"{cls.__name__}.{name}: can't make a column of {type_}")
+
+
+class ColumnBatch:
+    """Columns of the ``fields`` of ``cls`` models, decoded from JSON objects
+    (as returned by the API) added with extend().
+    """
+
+    def __init__(self, cls: Type[Base], fields: Sequence[str]):
+        self.cls = cls
+        self.columns: Dict[str, AnyColumn] = {
+            name: make_column(cls, name) for name in fields
+        }
+        self._paths = [
+            (tuple(name.split(".")), column) for name, column in self.columns.items()
+        ]
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()), ()))
+
+    def __getitem__(self, name: str) -> AnyColumn:
+        return self.columns[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.columns
+
+    def extend(self, results: Iterable[Mapping[str, Any]]) -> int:
+        """Decode the fields of each JSON object, returning the number added.
+        """
+        count = 0
+        for result in results:
+            for path, column in self._paths:
+                value: Any = result
+                for attr in path:
+                    value = value.get(attr)
+                    if value is None:
+                        break
+                column.append(value)
+            count += 1
+        return count
+
+    def rows(self) -> Iterator[Tuple[Any, ...]]:
+        """Values of each row, in the order of the fields."""
+        return zip(*self.columns.values())
+
+    def to_numpy(self):
+        """NumPy structured array of the columns.
+
+        Dictionary-encoded columns hold their codes (look them up in the
+        column's ``categories``); missing numeric values hold 0 (NaN for
+        floats & datetimes).  Requires NumPy.
+        """
+        if numpy is None:
+            raise ImportError("ColumnBatch.to_numpy() requires numpy")
+        dtypes = []
+        for name, column in self.columns.items():
+            if isinstance(column, DictColumn):
+                dtypes.append((name, numpy.int32))
+            else:
+                dtype = numpy.dtype(column.values.typecode)
+                dtypes.append((name, numpy.bool_ if column.type is bool else dtype))
+        result = numpy.empty(len(self), dtype=dtypes)
+        for name, column in self.columns.items():
+            values = column.codes if isinstance(column, DictColumn) else column.values
+            result[name] = numpy.frombuffer(values, dtype=values.typecode)
+        return result
+
+
+def decode_columns(
+    cls: Type[Base], results: Iterable[Mapping[str, Any]], fields: Sequence[str]
+) -> ColumnBatch:
+    """Decode the ``fields`` of JSON objects of ``cls`` into columns."""
+    batch = ColumnBatch(cls, fields)
+    batch.extend(results)
+    return batch
+
+
+def resource_model(client, resource: str) -> Type[Base]:
+    if isinstance(client, SonarrClient):
+        resources = SONARR_RESOURCES
+    elif isinstance(client, RadarrClient):
+        resources = RADARR_RESOURCES
+    else:
+        resources = {}
+    try:
+        return resources[resource]
+    except KeyError:
+        raise ValueError(f"No columnar decoding of {resource!r} for {client}")
+
+
+def fetch_columns(
+    client,
+    resource: str,
+    fields: Sequence[str],
+    query: Optional[Mapping[str, Any]] = None,
+    batch: Optional[ColumnBatch] = None,
+) -> ColumnBatch:
+    """GET ``resource`` (e.g. "episode", "movie") from a SonarrClient/
+    RadarrClient, decoding ``fields`` of the response into columns, without
+    creating models.  Rows are added to ``batch`` if supplied.
+    """
+    if batch is None:
+        batch = ColumnBatch(resource_model(client, resource), fields)
+    results = client._request(resource, query=query)
+    if isinstance(results, dict):
+        #  Page of records
+        results = results["records"]
+    batch.extend(results)
+    return batch
+
+
+def fetch_history_columns(
+    client,
+    fields: Sequence[str],
+    pageSize: int = 1000,
+    max_pages: Optional[int] = None,
+) -> ColumnBatch:
+    """Page through the history of a SonarrClient/RadarrClient, newest first,
+    decoding ``fields`` of its records into columns one page at a time.
+    """
+    batch = ColumnBatch(resource_model(client, "history"), fields)
+    page = 1
+    while max_pages is None or page <= max_pages:
+        query = {
+            "page": str(page),
+            "pageSize": str(pageSize),
+            "sortKey": "date",
+            "sortDir": "desc",
+        }
+        result = client._request("history", query=query)
+        if not batch.extend(result["records"]):
+            break
+        if page * pageSize >= result["totalRecords"]:
+            break
+        page += 1
+    return batch
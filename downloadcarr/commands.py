@@ -0,0 +1,651 @@
+"""Tracking *arr commands to completion.
+
+Commands (refresh, rescan, search...) are queued by the server and run
+asynchronously; the CommandStatus returned when posting one merely says it
+was queued.  Rather than each caller polling /command/{id} in its own loop,
+a CommandWaiter tracks any number of commands, updating all of them from a
+single /command request per tick.
+"""
+import heapq
+import itertools
+import threading
+import time
+import concurrent.futures
+from concurrent.futures import Future
+from datetime import datetime
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from .client import ArrClientError, ArrHttpError
+from .models import CommandStatus
+
+
+#  Command states from which there's no further progress
+FINISHED_STATES = frozenset({"completed", "failed", "aborted", "cancelled", "orphaned"})
+
+CommandRef = Union[CommandStatus, int]
+
+
+def command_id(command: CommandRef) -> int:
+    return command if isinstance(command, int) else command.id
+
+
+def command_duration(status: CommandStatus) -> Optional[float]:
+    """Run time of a finished command in seconds, if the server reports it.
+    """
+    if status.duration is not None:
+        return status.duration.total_seconds()
+    started = status.started or status.startedOn
+    if status.ended is not None and isinstance(started, datetime):
+        return (status.ended - started).total_seconds()
+    return None
+
+
+class CommandWaiter:
+    """Tracks commands posted to a SonarrClient/RadarrClient to completion.
+
+    Each tick, all tracked commands are updated from one call to
+    ``client.get_all_commands_status()``; commands that have dropped out of
+    that list are queried individually.  Tracked commands resolve a Future
+    with their final CommandStatus, whatever state they finish in.
+
+    The polling interval adapts to the commands being tracked: it starts at
+    a quarter of the (moving) average command duration observed so far,
+    within [``min_interval``, ``max_interval``], and grows by ``backoff``
+    after every tick that finds nothing finished.
+
+    Polling runs on a background thread between start() & stop() (or within
+    a ``with`` block); otherwise wait() polls in the calling thread.  Status
+    updates obtained elsewhere (e.g. pushed by the server) may be fed in via
+    update().
+    """
+
+    def __init__(
+        self,
+        client,
+        min_interval: float = 0.5,
+        max_interval: float = 30.0,
+        backoff: float = 1.5,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.client = client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.clock = clock
+        self.polls = 0
+
+        self._futures: Dict[int, "Future[CommandStatus]"] = {}
+        self._watched: Dict[int, float] = {}
+        self._average: Optional[float] = None
+        self._interval = min_interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "CommandWaiter":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    @property
+    def pending(self) -> Tuple[int, ...]:
+        """IDs of commands being tracked."""
+        with self._lock:
+            return tuple(self._futures)
+
+    @property
+    def interval(self) -> float:
+        """Seconds until the next poll."""
+        return self._interval
+
+    @property
+    def average_duration(self) -> Optional[float]:
+        """Moving average of observed command durations, in seconds."""
+        return self._average
+
+    def watch(
+        self,
+        command: CommandRef,
+        callback: Optional[Callable[[CommandStatus], None]] = None,
+    ) -> "Future[CommandStatus]":
+        """Track a command, returning a Future resolved with its final status.
+
+        ``callback``, if supplied, is called with the final status (not if
+        the Future fails).
+        """
+        commandId = command_id(command)
+        with self._lock:
+            future = self._futures.get(commandId)
+            if future is None:
+                future = Future()
+                self._futures[commandId] = future
+                self._watched[commandId] = self.clock()
+            self._interval = self._base_interval()
+
+        if callback is not None:
+            done = callback
+
+            def resolved(f: "Future[CommandStatus]") -> None:
+                if not f.cancelled() and f.exception() is None:
+                    done(f.result())
+
+            future.add_done_callback(resolved)
+        if isinstance(command, CommandStatus):
+            self.update([command])
+        return future
+
+    def update(self, statuses: Iterable[CommandStatus]) -> int:
+        """Resolve tracked commands that have finished.
+
+        Returns the number of commands resolved.
+        """
+        resolved = []
+        with self._lock:
+            for status in statuses:
+                if status.state not in FINISHED_STATES:
+                    continue
+                future = self._futures.pop(status.id, None)
+                if future is None:
+                    continue
+                watched = self._watched.pop(status.id)
+                duration = command_duration(status)
+                if duration is None:
+                    duration = self.clock() - watched
+                self._observe(duration)
+                resolved.append((future, status))
+
+        #  Outside the lock, since it runs callbacks
+        for future, status in resolved:
+            future.set_result(status)
+        return len(resolved)
+
+    def poll(self) -> int:
+        """Update all tracked commands from the server, once.
+
+        Returns the number of commands resolved.
+        """
+        if not self.pending:
+            return 0
+
+        statuses = self.client.get_all_commands_status()
+        self.polls += 1
+        resolved = self.update(statuses)
+
+        listed = {status.id for status in statuses}
+        for commandId in self.pending:
+            if commandId in listed:
+                continue
+            try:
+                status = self.client.get_command_status(commandId)
+            except ArrHttpError as err:
+                if err.args[0] != "404":
+                    raise
+                self._fail(commandId, err)
+                resolved += 1
+            else:
+                resolved += self.update([status])
+
+        with self._lock:
+            if resolved:
+                self._interval = self._base_interval()
+            else:
+                self._interval = min(self._interval * self.backoff, self.max_interval)
+        return resolved
+
+    def wait(
+        self, commands: Iterable[CommandRef], timeout: Optional[float] = None
+    ) -> Tuple[CommandStatus, ...]:
+        """Block until ``commands`` finish, returning their final statuses.
+
+        Raises TimeoutError if they haven't finished within ``timeout`` seconds.
+        """
+        futures = [self.watch(command) for command in commands]
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while not all(future.done() for future in futures):
+            if not self.running:
+                self.poll()
+                if all(future.done() for future in futures):
+                    break
+            delay = self._interval
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    msg = f"wait(): commands not finished within {timeout}s"
+                    raise TimeoutError(msg)
+                delay = min(delay, remaining)
+            if self.running:
+                concurrent.futures.wait(futures, timeout=delay)
+            else:
+                time.sleep(delay)
+
+        return tuple(future.result() for future in futures)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Poll on a background thread until stop() is called."""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except ArrClientError:
+                #  Transient server trouble; keep tracking, but back off
+                with self._lock:
+                    self._interval = min(
+                        self._interval * self.backoff, self.max_interval
+                    )
+            except Exception as err:
+                #  Not transient (e.g. an undecodable status); don't leave
+                #  waiters hanging
+                for commandId in self.pending:
+                    self._fail(commandId, err)
+            self._stop.wait(self._interval)
+
+    def _fail(self, commandId: int, err: Exception) -> None:
+        with self._lock:
+            future = self._futures.pop(commandId, None)
+            self._watched.pop(commandId, None)
+        if future is not None:
+            future.set_exception(err)
+
+    def _observe(self, duration: float) -> None:
+        if self._average is None:
+            self._average = duration
+        else:
+            self._average += 0.2 * (duration - self._average)
+
+    def _base_interval(self) -> float:
+        if self._average is None:
+            return self.min_interval
+        return min(max(self._average / 4, self.min_interval), self.max_interval)
+
+
+#  CommandStatusBody attributes identifying what a command acts upon
+TARGET_FIELDS = (
+    "seriesId",
+    "seriesIds",
+    "episodeId",
+    "episodeIds",
+    "movieId",
+    "movieIds",
+    "seasonNumber",
+    "listId",
+)
+
+#  Default caps on concurrently running commands, by command name
+DEFAULT_LIMITS = {
+    "RefreshSeries": 2,
+    "RescanSeries": 2,
+    "SeriesSearch": 2,
+    "SeasonSearch": 2,
+    "EpisodeSearch": 2,
+    "RefreshMovie": 2,
+    "MoviesSearch": 2,
+}
+
+CommandKey = Tuple[str, Tuple[Tuple[str, Any], ...]]
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(sorted(value))
+    return value
+
+
+def command_key(name: str, params: Mapping[str, Any]) -> CommandKey:
+    """Identify a command by name and parameters, such that duplicate
+    commands have equal keys.
+    """
+    return (
+        name.casefold(),
+        tuple(sorted((param, _normalize(value)) for param, value in params.items())),
+    )
+
+
+def status_key(status: CommandStatus) -> CommandKey:
+    """Key of a command reported by the server, from the target parameters
+    in its body.
+    """
+    params = {}
+    if status.body is not None:
+        for param in TARGET_FIELDS:
+            value = getattr(status.body, param)
+            if value is not None and value != ():
+                params[param] = value
+    return command_key(status.name, params)
+
+
+class _Scheduled:
+    """Command submitted to a CommandScheduler."""
+
+    def __init__(self, key: CommandKey, name: str, params: Dict[str, Any]):
+        self.key = key
+        self.name = name
+        self.params = params
+        self.priority = 0
+        self.future: "Future[CommandStatus]" = Future()
+        self.running = False
+
+
+class CommandScheduler:
+    """Deduplicating, throttling front end for posting commands.
+
+    A command submitted while an identical command (same name & parameters)
+    is queued here, or queued or running on the server, is coalesced with
+    it rather than posted again.  At most ``limits[name]`` commands of each
+    kind submitted here run at once (unlimited for kinds not in ``limits``);
+    the rest wait here, highest ``priority`` first, until a running one
+    finishes.
+
+    Completion is tracked by ``waiter`` (by default, a new CommandWaiter on
+    the same client), which must be polling - start() & stop() the
+    scheduler, or use it as a context manager, to run the waiter's thread.
+
+    Commands running on the server are listed with one request, at most
+    once every ``sync_interval`` seconds (never, if it's None).
+    """
+
+    def __init__(
+        self,
+        client,
+        waiter: Optional[CommandWaiter] = None,
+        limits: Optional[Mapping[str, int]] = None,
+        sync_interval: Optional[float] = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.client = client
+        self.waiter = waiter if waiter is not None else CommandWaiter(client)
+        limits = DEFAULT_LIMITS if limits is None else limits
+        self.limits = {name.casefold(): limit for name, limit in limits.items()}
+        self.sync_interval = sync_interval
+        self.clock = clock
+        self.posted = 0
+        self.coalesced = 0
+
+        self._scheduled: Dict[CommandKey, _Scheduled] = {}
+        self._queue: List[Tuple[int, int, _Scheduled]] = []
+        self._sequence = itertools.count()
+        self._running: Dict[str, int] = {}
+        self._server: Dict[CommandKey, CommandStatus] = {}
+        self._synced: Optional[float] = None
+        self._lock = threading.RLock()
+
+    def __enter__(self) -> "CommandScheduler":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        self.waiter.start()
+
+    def stop(self) -> None:
+        self.waiter.stop()
+
+    @property
+    def queued(self) -> int:
+        """Number of commands waiting to be posted."""
+        with self._lock:
+            return sum(not s.running for s in self._scheduled.values())
+
+    def running(self, name: str) -> int:
+        """Number of commands of a kind submitted here & still running."""
+        with self._lock:
+            return self._running.get(name.casefold(), 0)
+
+    def submit(
+        self, name: str, priority: int = 0, **params: Any
+    ) -> "Future[CommandStatus]":
+        """Schedule a command, returning a Future resolved with its final
+        status (or that of the command it was coalesced with).
+        """
+        key = command_key(name, params)
+        server = self._sync()
+
+        with self._lock:
+            scheduled = self._scheduled.get(key)
+            if scheduled is not None:
+                self.coalesced += 1
+                if not scheduled.running and priority > scheduled.priority:
+                    self._enqueue(scheduled, priority)
+                return scheduled.future
+
+            scheduled = _Scheduled(key, name, params)
+            self._scheduled[key] = scheduled
+            status = server.get(key)
+            if status is None:
+                self._enqueue(scheduled, priority)
+            else:
+                self.coalesced += 1
+                kind = name.casefold()
+                self._running[kind] = self._running.get(kind, 0) + 1
+                scheduled.running = True
+
+        if status is None:
+            self._dispatch()
+        else:
+            self._watch(scheduled, status)
+        return scheduled.future
+
+    def _enqueue(self, scheduled: _Scheduled, priority: int) -> None:
+        """Queue ``scheduled`` at ``priority``.  If it's already queued, its
+        old entry is left in the queue, to be skipped once it's popped.
+        """
+        scheduled.priority = priority
+        heapq.heappush(self._queue, (-priority, next(self._sequence), scheduled))
+
+    def _dispatch(self) -> None:
+        """Post queued commands, in priority order, while under limits."""
+        while True:
+            with self._lock:
+                scheduled = self._next()
+                if scheduled is None:
+                    return
+                kind = scheduled.name.casefold()
+                self._running[kind] = self._running.get(kind, 0) + 1
+                scheduled.running = True
+
+            try:
+                status = self.client._post_command(scheduled.name, **scheduled.params)
+            except Exception as err:
+                with self._lock:
+                    self._release(scheduled)
+                scheduled.future.set_exception(err)
+                continue
+
+            with self._lock:
+                self.posted += 1
+            self._watch(scheduled, status)
+
+    def _next(self) -> Optional[_Scheduled]:
+        """Pop the highest priority queued command whose kind isn't at its
+        limit.
+        """
+        blocked = []
+        found = None
+        while self._queue:
+            item = heapq.heappop(self._queue)
+            scheduled = item[2]
+            if scheduled.running or -item[0] != scheduled.priority:
+                continue  # Stale entry
+            kind = scheduled.name.casefold()
+            limit = self.limits.get(kind)
+            if limit is None or self._running.get(kind, 0) < limit:
+                found = scheduled
+                break
+            blocked.append(item)
+        for item in blocked:
+            heapq.heappush(self._queue, item)
+        return found
+
+    def _watch(self, scheduled: _Scheduled, status: CommandStatus) -> None:
+        def done(future: "Future[CommandStatus]") -> None:
+            with self._lock:
+                self._release(scheduled)
+            err = future.exception()
+            if err is not None:
+                scheduled.future.set_exception(err)
+            else:
+                scheduled.future.set_result(future.result())
+            self._dispatch()
+
+        self.waiter.watch(status).add_done_callback(done)
+
+    def _release(self, scheduled: _Scheduled) -> None:
+        kind = scheduled.name.casefold()
+        self._running[kind] -= 1
+        self._scheduled.pop(scheduled.key, None)
+        self._server.pop(scheduled.key, None)
+
+    def _sync(self) -> Dict[CommandKey, CommandStatus]:
+        """Commands queued or running on the server, by key."""
+        if self.sync_interval is None:
+            return {}
+        now = self.clock()
+        if self._synced is None or now - self._synced >= self.sync_interval:
+            statuses = self.client.get_all_commands_status()
+            with self._lock:
+                self._synced = now
+                self._server = {
+                    status_key(status): status
+                    for status in statuses
+                    if status.state not in FINISHED_STATES
+                }
+        with self._lock:
+            return dict(self._server)
+
+
+class SearchBatcher:
+    """Batches IDs for a search command over a short time window.
+
+    ``search`` is a method taking any number of IDs and posting a single
+    command, e.g. SonarrClient.search_episodes or RadarrClient.search_movies.
+    IDs added are collected until ``window`` seconds after the first of a
+    batch, or until ``max_size`` IDs have been collected, then searched for
+    in one command.  Every caller adding to a batch gets a Future resolved
+    with the CommandStatus of the shared command.
+
+    IDs added together are always searched for together, even if there are
+    more than ``max_size`` of them.  Adding no IDs while no batch is pending
+    returns a Future already resolved with None.
+    """
+
+    def __init__(
+        self,
+        search: Callable[..., CommandStatus],
+        window: float = 2.0,
+        max_size: int = 100,
+    ):
+        self.search = search
+        self.window = window
+        self.max_size = max_size
+        self.batches = 0
+
+        self._ids: Dict[int, None] = {}
+        self._future: "Future[CommandStatus]" = Future()
+        self._generation = 0  # Of the pending batch, to ignore stale timers
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "SearchBatcher":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._expire()
+
+    @property
+    def pending(self) -> Tuple[int, ...]:
+        """IDs collected for the next batch."""
+        with self._lock:
+            return tuple(self._ids)
+
+    def add(self, *ids: int) -> "Future[CommandStatus]":
+        """Add IDs to the next batch, returning a Future resolved with the
+        CommandStatus of the command that searches for them.
+        """
+        with self._lock:
+            if not self._ids:
+                if not ids:
+                    empty: "Future[CommandStatus]" = Future()
+                    empty.set_result(None)  # type: ignore
+                    return empty
+                self._timer = threading.Timer(
+                    self.window, self._expire, args=(self._generation,)
+                )
+                self._timer.daemon = True
+                self._timer.start()
+            future = self._future
+            self._ids.update(dict.fromkeys(ids))
+            full = len(self._ids) >= self.max_size
+
+        if full:
+            self.flush()
+        return future
+
+    def flush(self) -> Optional[CommandStatus]:
+        """Search for the IDs collected so far now, if any.
+        """
+        return self._flush()
+
+    def _flush(self, generation: Optional[int] = None) -> Optional[CommandStatus]:
+        """Search for the pending batch, if any (and if it is still batch
+        ``generation``, when given).
+        """
+        with self._lock:
+            if not self._ids:
+                return None
+            if generation is not None and generation != self._generation:
+                return None
+            ids = tuple(self._ids)
+            future = self._future
+            self._ids = {}
+            self._future = Future()
+            self._generation += 1
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        try:
+            status = self.search(*ids)
+        except Exception as err:
+            future.set_exception(err)
+            raise
+        finally:
+            with self._lock:
+                self.batches += 1
+        future.set_result(status)
+        return status
+
+    def _expire(self, generation: Optional[int] = None) -> None:
+        try:
+            self._flush(generation)
+        except Exception:
+            pass  # Delivered to callers via their Future
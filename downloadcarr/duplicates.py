@@ -0,0 +1,173 @@
+"""Finding titles held by more than one *arr instance.
+
+Series are identified across instances by TVDB ID and movies by TMDB ID.  A
+DuplicateIndex maps each external ID to its copies by instance, so looking up
+an ID costs the same however big the combined library grows, and tracks the
+set of IDs with more than one copy as instance snapshots are replaced; a
+refreshed snapshot only touches the index entries of the titles it contains
+or used to contain.
+"""
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from .fleet import FleetResult
+
+
+ExternalId = Tuple[str, int]
+
+
+def external_id(item: Any) -> Optional[ExternalId]:
+    """("tvdb", tvdbId) of a Series or ("tmdb", tmdbId) of a Movie; None if
+    the item isn't matched to one.
+    """
+    if hasattr(item, "tvdbId"):
+        key = ("tvdb", item.tvdbId)
+    else:
+        key = ("tmdb", item.tmdbId)
+    return key if key[1] else None
+
+
+def size_on_disk(item: Any) -> int:
+    """Size of a Series/Movie on disk, summing season statistics if the series
+    has no total.
+    """
+    if item.sizeOnDisk is not None:
+        return item.sizeOnDisk
+    seasons = getattr(item, "seasons", ())
+    return sum(s.statistics.sizeOnDisk for s in seasons if s.statistics)
+
+
+@dataclass(frozen=True)
+class Copy:
+    """A title as held by one instance.
+
+    ``quality`` is the quality of the movie file (None for series, and
+    movies without a file).
+    """
+
+    instance: str
+    id: int
+    title: str
+    sizeOnDisk: int
+    qualityProfileId: Optional[int] = None
+    quality: Optional[str] = None
+
+    @classmethod
+    def from_item(cls, instance: str, item: Any) -> "Copy":
+        movieFile = getattr(item, "movieFile", None)
+        quality = movieFile.quality.quality.name if movieFile else None
+        return cls(
+            instance=instance,
+            id=item.id,
+            title=item.title,
+            sizeOnDisk=size_on_disk(item),
+            qualityProfileId=item.qualityProfileId or item.profileId,
+            quality=quality,
+        )
+
+
+@dataclass(frozen=True)
+class Duplicate:
+    """A title held by several instances, with its copies by instance name.
+    """
+
+    externalId: ExternalId
+    copies: Tuple[Copy, ...]
+
+    @property
+    def sizeOnDisk(self) -> int:
+        """Total size of all copies."""
+        return sum(copy.sizeOnDisk for copy in self.copies)
+
+    @property
+    def redundant(self) -> int:
+        """Size of all copies but the biggest."""
+        return self.sizeOnDisk - max(copy.sizeOnDisk for copy in self.copies)
+
+
+class DuplicateIndex:
+    """Thread-safe index of the titles of many instances by external ID.
+
+    Each instance's library is supplied as a snapshot, e.g. the result of
+    SonarrClient.get_all_series() or RadarrClient.get_movies(); a new
+    snapshot of an instance replaces its previous one.
+    """
+
+    def __init__(self) -> None:
+        self._copies: Dict[ExternalId, Dict[str, Copy]] = {}
+        self._keys: Dict[str, Set[ExternalId]] = {}
+        self._duplicates: Set[ExternalId] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Number of distinct titles."""
+        return len(self._copies)
+
+    def __contains__(self, externalId: ExternalId) -> bool:
+        return externalId in self._copies
+
+    @property
+    def instances(self) -> Tuple[str, ...]:
+        return tuple(self._keys)
+
+    def update(self, instance: str, items: Iterable[Any]) -> None:
+        """Replace the snapshot of ``instance`` with ``items``."""
+        copies = {}
+        for item in items:
+            key = external_id(item)
+            if key is not None:
+                copies[key] = Copy.from_item(instance, item)
+
+        with self._lock:
+            old = self._keys.get(instance, set())
+            for key in old - copies.keys():
+                self._discard(instance, key)
+            for key, copy in copies.items():
+                held = self._copies.setdefault(key, {})
+                held[instance] = copy
+                if len(held) > 1:
+                    self._duplicates.add(key)
+            self._keys[instance] = set(copies)
+
+    def update_all(self, result: FleetResult) -> None:
+        """Update from the library snapshots of a Fleet call.  Instances that
+        failed keep their previous snapshot.
+        """
+        for r in result.succeeded:
+            self.update(r.instance, r.result)
+
+    def remove(self, instance: str) -> None:
+        """Drop the snapshot of ``instance``."""
+        with self._lock:
+            for key in self._keys.pop(instance, set()):
+                self._discard(instance, key)
+
+    def _discard(self, instance: str, key: ExternalId) -> None:
+        held = self._copies[key]
+        del held[instance]
+        if len(held) < 2:
+            self._duplicates.discard(key)
+        if not held:
+            del self._copies[key]
+
+    def lookup(self, externalId: ExternalId) -> Tuple[Copy, ...]:
+        """Copies of a title, in no particular order."""
+        with self._lock:
+            return tuple(self._copies.get(externalId, {}).values())
+
+    def duplicates(self) -> Tuple[Duplicate, ...]:
+        """Titles held by more than one instance, most redundant size first.
+        """
+        with self._lock:
+            duplicates = [
+                Duplicate(key, tuple(self._copies[key].values()))
+                for key in self._duplicates
+            ]
+        duplicates.sort(key=lambda d: (-d.redundant, d.externalId))
+        return tuple(duplicates)
+
+    @property
+    def redundant(self) -> int:
+        """Total size of the redundant copies of all duplicates."""
+        return sum(duplicate.redundant for duplicate in self.duplicates())
@@ -38,3 +38,45 @@ class ImportMode(enum.Enum):
 
     MOVE = "Move"
     COPY = "Copy"
+
+
+@enum.unique
+class QueueEventType(enum.Enum):
+    """Changes to a queue item observed by downloadcarr.queue.QueueWatcher
+    """
+
+    ADDED = "added"
+    PROGRESSED = "progressed"
+    STATUS_CHANGED = "statusChanged"
+    STALLED = "stalled"
+    REMOVED = "removed"
+
+
+@enum.unique
+class WebhookEventType(enum.Enum):
+    """``eventType`` of Sonarr/Radarr Connect webhook payloads
+    """
+
+    TEST = "Test"
+    GRAB = "Grab"
+    DOWNLOAD = "Download"
+    RENAME = "Rename"
+    HEALTH = "Health"
+    SERIES_ADD = "SeriesAdd"
+    SERIES_DELETE = "SeriesDelete"
+    EPISODE_FILE_DELETE = "EpisodeFileDelete"
+    MOVIE_ADDED = "MovieAdded"
+    MOVIE_DELETE = "MovieDelete"
+    MOVIE_FILE_DELETE = "MovieFileDelete"
+
+
+@enum.unique
+class PushAction(enum.Enum):
+    """``action`` of resource changes pushed over the SignalR feed
+    """
+
+    UNKNOWN = "unknown"
+    CREATED = "created"
+    UPDATED = "updated"
+    DELETED = "deleted"
+    SYNC = "sync"
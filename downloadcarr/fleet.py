@@ -0,0 +1,244 @@
+"""Running the same client methods across many *arr instances at once.
+
+Reports over a fleet of instances (e.g. split by resolution or region) are
+dominated by the slowest instance if the clients are called one after another.
+A Fleet calls every instance concurrently, gives each at most ``timeout``
+seconds from when its call starts, and returns whatever results it got, tagged
+by instance name, along with the errors of the instances that failed or timed
+out.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+)
+
+from .client import ArrConnectionError, Client
+from .radarr import RadarrClient
+from .sonarr import SonarrClient
+
+
+T = TypeVar("T")
+
+
+CLIENT_TYPES: Dict[str, Type[Client]] = {
+    "sonarr": SonarrClient,
+    "radarr": RadarrClient,
+}
+
+
+@dataclass(frozen=True)
+class Tagged(Generic[T]):
+    """Item of a result, tagged with the name of the instance it came from.
+    """
+
+    instance: str
+    item: T
+
+
+@dataclass(frozen=True)
+class InstanceResult:
+    """Outcome of a call on a single instance.
+
+    ``result`` is None if the call failed; ``elapsed`` is in seconds (the
+    timeout, if the call timed out).
+    """
+
+    instance: str
+    result: Any = None
+    error: Optional[Exception] = None
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass(frozen=True)
+class FleetResult:
+    """Per-instance outcomes of a call across a fleet, in fleet order."""
+
+    results: Tuple[InstanceResult, ...]
+
+    def __iter__(self) -> Iterator[InstanceResult]:
+        return iter(self.results)
+
+    def __getitem__(self, instance: str) -> InstanceResult:
+        for result in self.results:
+            if result.instance == instance:
+                return result
+        raise KeyError(instance)
+
+    @property
+    def succeeded(self) -> Tuple[InstanceResult, ...]:
+        return tuple(r for r in self.results if r.ok)
+
+    @property
+    def failed(self) -> Tuple[InstanceResult, ...]:
+        return tuple(r for r in self.results if not r.ok)
+
+    @property
+    def errors(self) -> Dict[str, Exception]:
+        return {r.instance: r.error for r in self.results if r.error is not None}
+
+    def items(self) -> Tuple[Tagged, ...]:
+        """Results of the successful instances merged into one sequence,
+        each item tagged with its instance.
+
+        Tuple/list results are flattened; any other result (e.g. a single
+        model) counts as one item.  None results are dropped.
+        """
+        merged: List[Tagged] = []
+        for r in self.succeeded:
+            if isinstance(r.result, (tuple, list)):
+                merged.extend(Tagged(r.instance, item) for item in r.result)
+            elif r.result is not None:
+                merged.append(Tagged(r.instance, r.result))
+        return tuple(merged)
+
+
+def client_from_config(config: Mapping[str, Any]) -> Tuple[str, Client]:
+    """Create a client from a config such as
+    ``{"type": "sonarr", "name": "sonarr-4k", "host": ..., "api_key": ...}``.
+
+    Keys other than ``type`` & ``name`` are passed to the client class.  The
+    name defaults to ``host:port``.
+    """
+    config = dict(config)
+    kind = config.pop("type")
+    try:
+        cls = CLIENT_TYPES[kind.casefold()]
+    except KeyError:
+        raise ValueError(f"client_from_config(): unknown type {kind!r}") from None
+    name = config.pop("name", None)
+    client = cls(**config)
+    return name or f"{client.host}:{client.port}", client
+
+
+class Fleet:
+    """Concurrent access to many SonarrClient/RadarrClient instances, by name.
+
+    Instances are called in parallel, up to ``max_workers`` at a time (by
+    default, all of them).  Each is given ``timeout`` seconds (None waits
+    indefinitely) from when its call starts; one still running then is
+    abandoned, and reported as failed with an ArrConnectionError, and the
+    next instance is started in its place, so that one slow instance can't
+    stall the rest.
+    """
+
+    def __init__(
+        self,
+        clients: Mapping[str, Client],
+        timeout: Optional[float] = 30.0,
+        max_workers: Optional[int] = None,
+    ):
+        self.clients = dict(clients)
+        self.timeout = timeout
+        self.max_workers = max_workers
+
+    @classmethod
+    def from_configs(cls, configs: Iterable[Mapping[str, Any]], **kwargs) -> "Fleet":
+        """Create a Fleet from client configs (see client_from_config())."""
+        clients: Dict[str, Client] = {}
+        for config in configs:
+            name, client = client_from_config(config)
+            if name in clients:
+                raise ValueError(f"from_configs(): duplicate instance {name!r}")
+            clients[name] = client
+        return cls(clients, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.clients)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.clients)
+
+    def __getitem__(self, instance: str) -> Client:
+        return self.clients[instance]
+
+    def subset(self, cls: Type[Client]) -> "Fleet":
+        """Fleet of the instances whose clients are of type ``cls``, e.g. to
+        call methods only Radarr has.
+        """
+        clients = {
+            name: client
+            for name, client in self.clients.items()
+            if isinstance(client, cls)
+        }
+        return Fleet(clients, timeout=self.timeout, max_workers=self.max_workers)
+
+    def call(self, method: str, *args, **kwargs) -> FleetResult:
+        """Call a client method by name on every instance."""
+        return self.map(lambda client: getattr(client, method)(*args, **kwargs))
+
+    def map(self, func: Callable[[Client], Any]) -> FleetResult:
+        """Call ``func(client)`` for every instance concurrently."""
+        if not self.clients:
+            return FleetResult(())
+
+        workers = self.max_workers or len(self.clients)
+        queued = list(self.clients)
+        running: Dict[str, float] = {}  # Start time, by instance
+        finished: Dict[str, InstanceResult] = {}
+        results: Dict[str, InstanceResult] = {}
+        condition = threading.Condition()
+
+        def run(name: str, start: float) -> None:
+            try:
+                result = func(self.clients[name])
+            except Exception as err:
+                elapsed = time.perf_counter() - start
+                outcome = InstanceResult(name, error=err, elapsed=elapsed)
+            else:
+                elapsed = time.perf_counter() - start
+                outcome = InstanceResult(name, result, elapsed=elapsed)
+            with condition:
+                finished[name] = outcome
+                condition.notify()
+
+        with condition:
+            while queued or running:
+                while queued and len(running) < workers:
+                    name = queued.pop(0)
+                    running[name] = time.perf_counter()
+                    thread = threading.Thread(target=run, args=(name, running[name]))
+                    thread.daemon = True
+                    thread.start()
+
+                delay = None
+                if self.timeout is not None:
+                    deadline = min(running.values()) + self.timeout
+                    delay = max(deadline - time.perf_counter(), 0)
+                condition.wait_for(lambda: bool(finished), timeout=delay)
+
+                for name, outcome in finished.items():
+                    if name in running:
+                        del running[name]
+                        results[name] = outcome
+                finished.clear()
+
+                if self.timeout is None:
+                    continue
+                now = time.perf_counter()
+                for name, start in list(running.items()):
+                    if now - start >= self.timeout:
+                        #  Abandon it, freeing its worker for the next
+                        del running[name]
+                        error = ArrConnectionError(name, "Timeout")
+                        results[name] = InstanceResult(
+                            name, error=error, elapsed=self.timeout
+                        )
+
+        return FleetResult(tuple(results[name] for name in self.clients))
@@ -0,0 +1,578 @@
+"""Local mirror of a Sonarr and/or Radarr library in SQLite.
+
+Reports that walk the whole library (every series with its episodes and
+files, every movie) cost thousands of requests against the server.  A Mirror
+holds the same data in a local SQLite database, loaded in bulk from the
+clients, and answers the same read methods as the clients (get_all_series(),
+get_episodes(), get_movies(), ...) from indexed tables.
+
+Each model is stored in its own table: the columns needed to join & filter
+(IDs, foreign IDs, external IDs, and a few fields useful in reports), plus the
+model encoded as JSON, from which it is decoded on the way out.  Nested
+models with tables of their own (a series' seasons, a movie's file) are
+stored there rather than in the JSON of their parent.
+
+The database is opened in WAL mode, so that reports opening the same file
+(in other processes, or with Mirrors of their own) can read while a loader is
+writing.
+"""
+import contextlib
+import json
+import sqlite3
+import threading
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from .bulk import map_concurrent
+from .client import ArrClientError
+from .enums import SortDirection, SortKey
+from .sonarr.models import Download as EpisodeDownload
+from .sonarr.models import Episode, EpisodeFile, Season, Series
+from .radarr.models import Download as MovieDownload
+from .radarr.models import Movie, MovieFile
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    id INTEGER PRIMARY KEY,
+    tvdbId INTEGER,
+    imdbId TEXT,
+    title TEXT NOT NULL,
+    monitored INTEGER NOT NULL,
+    qualityProfileId INTEGER,
+    sizeOnDisk INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS series_tvdbId ON series (tvdbId);
+CREATE INDEX IF NOT EXISTS series_imdbId ON series (imdbId);
+
+CREATE TABLE IF NOT EXISTS season (
+    seriesId INTEGER NOT NULL,
+    seasonNumber INTEGER NOT NULL,
+    monitored INTEGER NOT NULL,
+    sizeOnDisk INTEGER,
+    data TEXT NOT NULL,
+    PRIMARY KEY (seriesId, seasonNumber)
+);
+
+CREATE TABLE IF NOT EXISTS episode (
+    id INTEGER PRIMARY KEY,
+    seriesId INTEGER NOT NULL,
+    episodeFileId INTEGER NOT NULL,
+    seasonNumber INTEGER NOT NULL,
+    episodeNumber INTEGER NOT NULL,
+    tvDbEpisodeId INTEGER,
+    airDateUtc TEXT,
+    hasFile INTEGER NOT NULL,
+    monitored INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS episode_seriesId ON episode (seriesId);
+CREATE INDEX IF NOT EXISTS episode_episodeFileId ON episode (episodeFileId);
+CREATE INDEX IF NOT EXISTS episode_tvDbEpisodeId ON episode (tvDbEpisodeId);
+
+CREATE TABLE IF NOT EXISTS episodefile (
+    id INTEGER PRIMARY KEY,
+    seriesId INTEGER NOT NULL,
+    seasonNumber INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    dateAdded TEXT NOT NULL,
+    quality TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS episodefile_seriesId ON episodefile (seriesId);
+
+CREATE TABLE IF NOT EXISTS movie (
+    id INTEGER PRIMARY KEY,
+    tmdbId INTEGER NOT NULL,
+    imdbId TEXT,
+    title TEXT NOT NULL,
+    monitored INTEGER NOT NULL,
+    hasFile INTEGER NOT NULL,
+    qualityProfileId INTEGER NOT NULL,
+    sizeOnDisk INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS movie_tmdbId ON movie (tmdbId);
+CREATE INDEX IF NOT EXISTS movie_imdbId ON movie (imdbId);
+
+CREATE TABLE IF NOT EXISTS moviefile (
+    id INTEGER PRIMARY KEY,
+    movieId INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    dateAdded TEXT NOT NULL,
+    quality TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS moviefile_movieId ON moviefile (movieId);
+
+CREATE TABLE IF NOT EXISTS download (
+    kind TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    seriesId INTEGER,
+    episodeId INTEGER,
+    movieId INTEGER,
+    downloadId TEXT,
+    eventType TEXT NOT NULL,
+    date TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (kind, id)
+);
+CREATE INDEX IF NOT EXISTS download_seriesId ON download (seriesId);
+CREATE INDEX IF NOT EXISTS download_episodeId ON download (episodeId);
+CREATE INDEX IF NOT EXISTS download_movieId ON download (movieId);
+CREATE INDEX IF NOT EXISTS download_downloadId ON download (downloadId);
+"""
+
+
+Download = Union[EpisodeDownload, MovieDownload]
+
+
+def encode(model: Any, *exclude: str) -> str:
+    data = model.to_dict()
+    for key in exclude:
+        data.pop(key, None)
+    return json.dumps(data)
+
+
+class Mirror:
+    """Thread-safe SQLite mirror of a Sonarr and/or Radarr library.
+
+    ``path`` is the database file (by default, an in-memory database).  It
+    should only mirror one server of each kind.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.RLock()
+        self._depth = 0
+
+    def __enter__(self) -> "Mirror":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    @contextlib.contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Hold the mirror for a transaction, committed when the outermost
+        ``with`` block exits (rolled back if it raises).
+        """
+        with self._lock:
+            self._depth += 1
+            try:
+                yield self._conn
+            except BaseException:
+                self._depth -= 1
+                if not self._depth:
+                    self._conn.rollback()
+                raise
+            self._depth -= 1
+            if not self._depth:
+                self._conn.commit()
+
+    def query(self, sql: str, params: Sequence[Any] = ()) -> List[Tuple]:
+        """Run an arbitrary SELECT against the mirror's tables."""
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _select(self, sql: str, params: Sequence[Any] = ()) -> Iterator[Tuple]:
+        return iter(self.query(sql, params))
+
+    # Sonarr
+
+    def upsert_series(self, series: Iterable[Series]) -> int:
+        """Insert or replace series, with their seasons.  Returns the number
+        of series written.
+        """
+        rows = []
+        seasons = []
+        for s in series:
+            rows.append(
+                (
+                    s.id,
+                    s.tvdbId,
+                    s.imdbId,
+                    s.title,
+                    s.monitored,
+                    s.qualityProfileId or s.profileId,
+                    s.sizeOnDisk,
+                    encode(s, "seasons"),
+                )
+            )
+            for season in s.seasons:
+                stats = season.statistics
+                seasons.append(
+                    (
+                        s.id,
+                        season.seasonNumber,
+                        season.monitored,
+                        stats.sizeOnDisk if stats else None,
+                        encode(season),
+                    )
+                )
+
+        with self.transaction():
+            ids = [(row[0],) for row in rows]
+            self._conn.executemany("DELETE FROM season WHERE seriesId = ?", ids)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO series VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            self._conn.executemany("INSERT INTO season VALUES (?, ?, ?, ?, ?)", seasons)
+        return len(rows)
+
+    def upsert_episodes(self, episodes: Iterable[Episode]) -> int:
+        """Insert or replace episodes.  Nested series & episode files are not
+        stored with the episode.
+        """
+        rows = [
+            (
+                e.id,
+                e.seriesId,
+                e.episodeFileId,
+                e.seasonNumber,
+                e.episodeNumber,
+                e.tvDbEpisodeId,
+                e.airDateUtc.isoformat() if e.airDateUtc else None,
+                e.hasFile,
+                e.monitored,
+                encode(e, "series", "episodeFile"),
+            )
+            for e in episodes
+        ]
+        with self.transaction():
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO episode "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def upsert_episode_files(self, files: Iterable[EpisodeFile]) -> int:
+        rows = [
+            (
+                f.id,
+                f.seriesId,
+                f.seasonNumber,
+                f.size,
+                f.dateAdded.isoformat(),
+                f.quality.quality.name,
+                encode(f),
+            )
+            for f in files
+        ]
+        with self.transaction():
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO episodefile VALUES (?, ?, ?, ?, ?, ?, ?)", rows,
+            )
+        return len(rows)
+
+    def replace_episodes(
+        self, seriesId: int, episodes: Iterable[Episode], files: Iterable[EpisodeFile],
+    ) -> None:
+        """Replace all episodes & episode files of a series, so that those
+        deleted on the server are deleted here too.
+        """
+        with self.transaction():
+            self._conn.execute("DELETE FROM episode WHERE seriesId = ?", (seriesId,))
+            self._conn.execute(
+                "DELETE FROM episodefile WHERE seriesId = ?", (seriesId,)
+            )
+            self.upsert_episodes(episodes)
+            self.upsert_episode_files(files)
+
+    def delete_series(self, *seriesIds: int) -> None:
+        """Delete series, with their seasons, episodes & episode files."""
+        ids = [(seriesId,) for seriesId in seriesIds]
+        with self.transaction():
+            for table, column in (
+                ("series", "id"),
+                ("season", "seriesId"),
+                ("episode", "seriesId"),
+                ("episodefile", "seriesId"),
+            ):
+                self._conn.executemany(f"DELETE FROM {table} WHERE {column} = ?", ids)
+
+    def _series(self, where: str = "", params: Sequence[Any] = ()) -> List[Series]:
+        seasons: Dict[int, List[Any]] = {}
+        rows = self.query(f"SELECT id, data FROM series {where} ORDER BY id", params)
+        if not rows:
+            return []
+        #  Select seasons by the same filter, rather than binding every series
+        #  ID (SQLite before 3.32 allows at most 999 parameters)
+        for seriesId, data in self._select(
+            "SELECT seriesId, data FROM season "
+            f"WHERE seriesId IN (SELECT id FROM series {where}) "
+            "ORDER BY seriesId, seasonNumber",
+            params,
+        ):
+            seasons.setdefault(seriesId, []).append(json.loads(data))
+
+        series = []
+        for seriesId, data in rows:
+            decoded = json.loads(data)
+            decoded["seasons"] = seasons.get(seriesId, [])
+            series.append(Series.from_dict(decoded))
+        return series
+
+    def get_all_series(self) -> Tuple[Series, ...]:
+        return tuple(self._series())
+
+    def get_series(self, seriesId: int) -> Series:
+        series = self._series("WHERE id = ?", (seriesId,))
+        if not series:
+            raise ArrClientError(f"get_series(): {seriesId} not found")
+        return series[0]
+
+    def get_series_by_tvdb(self, tvdbId: int) -> Tuple[Series, ...]:
+        return tuple(self._series("WHERE tvdbId = ?", (tvdbId,)))
+
+    def get_seasons(self, seriesId: int) -> Tuple[Season, ...]:
+        return tuple(
+            Season.from_dict(json.loads(data))
+            for (data,) in self._select(
+                "SELECT data FROM season WHERE seriesId = ? ORDER BY seasonNumber",
+                (seriesId,),
+            )
+        )
+
+    def get_episodes(self, seriesId: int) -> Tuple[Episode, ...]:
+        return tuple(
+            Episode.from_dict(json.loads(data))
+            for (data,) in self._select(
+                "SELECT data FROM episode WHERE seriesId = ? "
+                "ORDER BY seasonNumber, episodeNumber",
+                (seriesId,),
+            )
+        )
+
+    def get_episode_files(self, seriesId: int) -> Tuple[EpisodeFile, ...]:
+        return tuple(
+            EpisodeFile.from_dict(json.loads(data))
+            for (data,) in self._select(
+                "SELECT data FROM episodefile WHERE seriesId = ? ORDER BY id",
+                (seriesId,),
+            )
+        )
+
+    # Radarr
+
+    def upsert_movies(self, movies: Iterable[Movie]) -> int:
+        """Insert or replace movies, with their files."""
+        rows = []
+        files = []
+        for m in movies:
+            rows.append(
+                (
+                    m.id,
+                    m.tmdbId,
+                    m.imdbId,
+                    m.title,
+                    m.monitored,
+                    m.hasFile,
+                    m.qualityProfileId,
+                    m.sizeOnDisk,
+                    encode(m, "movieFile"),
+                )
+            )
+            f = m.movieFile
+            if f is not None:
+                files.append(
+                    (
+                        f.id,
+                        m.id,
+                        f.size,
+                        f.dateAdded.isoformat(),
+                        f.quality.quality.name,
+                        encode(f),
+                    )
+                )
+
+        with self.transaction():
+            ids = [(row[0],) for row in rows]
+            self._conn.executemany("DELETE FROM moviefile WHERE movieId = ?", ids)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO movie VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows,
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO moviefile VALUES (?, ?, ?, ?, ?, ?)", files
+            )
+        return len(rows)
+
+    def delete_movies(self, *movieIds: int) -> None:
+        ids = [(movieId,) for movieId in movieIds]
+        with self.transaction():
+            self._conn.executemany("DELETE FROM movie WHERE id = ?", ids)
+            self._conn.executemany("DELETE FROM moviefile WHERE movieId = ?", ids)
+
+    def _movies(self, where: str = "", params: Sequence[Any] = ()) -> List[Movie]:
+        #  The file stored for a movie carries the movie's ID, which the file
+        #  nested in a Movie doesn't
+        rows = self.query(
+            "SELECT movie.data, moviefile.data FROM movie "
+            "LEFT JOIN moviefile ON moviefile.movieId = movie.id "
+            f"{where} ORDER BY movie.id",
+            params,
+        )
+        movies = []
+        for data, file in rows:
+            decoded = json.loads(data)
+            if file is not None:
+                decoded["movieFile"] = json.loads(file)
+            movies.append(Movie.from_dict(decoded))
+        return movies
+
+    def get_movies(self) -> Tuple[Movie, ...]:
+        return tuple(self._movies())
+
+    def get_movie(self, movieId: int) -> Movie:
+        movies = self._movies("WHERE movie.id = ?", (movieId,))
+        if not movies:
+            raise ArrClientError(f"get_movie(): {movieId} not found")
+        return movies[0]
+
+    def get_movies_by_tmdb(self, tmdbId: int) -> Tuple[Movie, ...]:
+        return tuple(self._movies("WHERE movie.tmdbId = ?", (tmdbId,)))
+
+    def get_movie_file(self, movieId: int) -> Optional[MovieFile]:
+        rows = self.query("SELECT data FROM moviefile WHERE movieId = ?", (movieId,))
+        return MovieFile.from_dict(json.loads(rows[0][0])) if rows else None
+
+    # History
+
+    def upsert_downloads(self, downloads: Iterable[Download]) -> int:
+        """Insert or replace history records of Sonarr and/or Radarr."""
+        rows = []
+        for d in downloads:
+            kind = "movie" if isinstance(d, MovieDownload) else "episode"
+            rows.append(
+                (
+                    kind,
+                    d.id,
+                    d.seriesId,
+                    d.episodeId,
+                    getattr(d, "movieId", None),
+                    d.downloadId,
+                    d.eventType,
+                    d.date.isoformat(),
+                    encode(d),
+                )
+            )
+        with self.transaction():
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO download VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def get_downloads(
+        self,
+        seriesId: Optional[int] = None,
+        episodeId: Optional[int] = None,
+        movieId: Optional[int] = None,
+        downloadId: Optional[str] = None,
+    ) -> Tuple[Download, ...]:
+        """History records matching all the IDs supplied, oldest first."""
+        filters = {
+            "seriesId": seriesId,
+            "episodeId": episodeId,
+            "movieId": movieId,
+            "downloadId": downloadId,
+        }
+        where = [f"{column} = ?" for column, v in filters.items() if v is not None]
+        params = [v for v in filters.values() if v is not None]
+        sql = "SELECT kind, data FROM download"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY date, kind, id"
+
+        downloads: List[Download] = []
+        for kind, data in self._select(sql, params):
+            cls = MovieDownload if kind == "movie" else EpisodeDownload
+            downloads.append(cls.from_dict(json.loads(data)))  # type: ignore
+        return tuple(downloads)
+
+
+def load_sonarr(
+    mirror: Mirror, client, max_workers: int = 8, retries: int = 2
+) -> Dict[str, int]:
+    """Load the whole library of a SonarrClient into ``mirror``, replacing
+    what it held, and return the number of rows written per table.
+
+    Episodes & episode files are fetched for all series concurrently.  If
+    any fetch fails, its error is raised without touching the mirror.
+    """
+    series = client.get_all_series()
+
+    def fetch(s: Series) -> Tuple[Tuple[Episode, ...], Tuple[EpisodeFile, ...]]:
+        return client.get_episodes(s.id), client.get_episode_files(s.id)
+
+    results = map_concurrent(fetch, series, max_workers=max_workers, retries=retries)
+    for result in results:
+        if not result.ok:
+            raise result.error  # type: ignore
+
+    counts = {"series": 0, "episode": 0, "episodefile": 0}
+    with mirror.transaction():
+        held = {row[0] for row in mirror.query("SELECT id FROM series")}
+        mirror.delete_series(*(held - {s.id for s in series}))
+        counts["series"] = mirror.upsert_series(series)
+        for result in results:
+            episodes, files = result.result
+            mirror.replace_episodes(result.item.id, episodes, files)
+            counts["episode"] += len(episodes)
+            counts["episodefile"] += len(files)
+    return counts
+
+
+def load_radarr(mirror: Mirror, client) -> Dict[str, int]:
+    """Load the whole library of a RadarrClient into ``mirror``, replacing
+    what it held, and return the number of rows written per table.
+    """
+    movies = client.get_movies()
+    with mirror.transaction():
+        held = {row[0] for row in mirror.query("SELECT id FROM movie")}
+        mirror.delete_movies(*(held - {m.id for m in movies}))
+        count = mirror.upsert_movies(movies)
+    return {"movie": count, "moviefile": sum(1 for m in movies if m.movieFile)}
+
+
+def load_history(
+    mirror: Mirror, client, pageSize: int = 250, max_pages: Optional[int] = None
+) -> int:
+    """Page through the history of a SonarrClient/RadarrClient, newest first,
+    into ``mirror``.  Returns the number of records written.
+    """
+    count = 0
+    page = 1
+    while max_pages is None or page <= max_pages:
+        history = client.get_history(
+            sortKey=SortKey.DATE,
+            page=page,
+            pageSize=pageSize,
+            sortDir=SortDirection.DESCENDING,
+        )
+        if not history.records:
+            break
+        count += mirror.upsert_downloads(history.records)
+        if page * pageSize >= history.totalRecords:
+            break
+        page += 1
+    return count
@@ -12,3 +12,10 @@ from .common import (
     UnmappedFolder,
     RootFolder,
 )
+from .webhook import (
+    WebhookSeries,
+    WebhookEpisode,
+    WebhookMovie,
+    WebhookRelease,
+    WebhookFile,
+)
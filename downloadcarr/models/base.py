@@ -128,7 +128,10 @@ def encode_date(val: date) -> str:
 
 def encode_time(val: time) -> str:
     encoded = val.replace(tzinfo=None).isoformat()
-    return encoded.rstrip("0")
+    if "." in encoded:
+        encoded = encoded.rstrip("0")
+
+    return encoded
 
 
 def encode_timedelta(val: timedelta) -> str:
@@ -136,8 +139,8 @@ def encode_timedelta(val: timedelta) -> str:
     hours, minutes = divmod(minutes, 60)
     encoded = f"{hours:02}:{minutes:02}:{seconds:02}"
     if val.microseconds != 0:
-        encoded += f".{val.microseconds:06}"
-    return encoded.rstrip("0")
+        encoded += f".{val.microseconds:06}".rstrip("0")
+    return encoded
 
 
 def encode_tuple(val: tuple) -> list:
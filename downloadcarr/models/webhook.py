@@ -0,0 +1,79 @@
+"""
+https://github.com/Sonarr/Sonarr/wiki/Webhook
+https://github.com/Radarr/Radarr/wiki/Webhook
+
+Webhook payloads carry abbreviated versions of the API models, with only
+enough to identify the objects concerned.
+"""
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Optional
+
+from .base import Base
+
+
+@dataclass(frozen=True)
+class WebhookSeries(Base):
+    """Attribute of Sonarr webhook payloads."""
+
+    id: int
+    title: str
+    path: Optional[str] = None
+    tvdbId: Optional[int] = None
+    tvMazeId: Optional[int] = None
+    imdbId: Optional[str] = None
+    type: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class WebhookEpisode(Base):
+    """Attribute of Sonarr webhook payloads."""
+
+    id: int
+    episodeNumber: int
+    seasonNumber: int
+    title: str
+    airDate: Optional[date] = None
+    airDateUtc: Optional[datetime] = None
+    quality: Optional[str] = None
+    qualityVersion: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class WebhookMovie(Base):
+    """Attribute of Radarr webhook payloads."""
+
+    id: int
+    title: str
+    releaseDate: Optional[date] = None
+    folderPath: Optional[str] = None
+    tmdbId: Optional[int] = None
+    imdbId: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class WebhookRelease(Base):
+    """Release grabbed.  Attribute of webhook payloads."""
+
+    quality: Optional[str] = None
+    qualityVersion: Optional[int] = None
+    releaseGroup: Optional[str] = None
+    releaseTitle: Optional[str] = None
+    indexer: Optional[str] = None
+    size: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class WebhookFile(Base):
+    """Episode/movie file imported, renamed or deleted.  Attribute of webhook
+    payloads.
+    """
+
+    id: int
+    relativePath: Optional[str] = None
+    path: Optional[str] = None
+    quality: Optional[str] = None
+    qualityVersion: Optional[int] = None
+    releaseGroup: Optional[str] = None
+    sceneName: Optional[str] = None
+    size: Optional[int] = None
@@ -0,0 +1,160 @@
+"""Streaming export & import of models as newline-delimited JSON.
+
+Each model is written as its to_dict() on a line of its own, as soon as it is
+produced, so archiving a library or a full history takes memory for one
+record (or one page of history) at a time rather than for the whole
+collection.  Reading yields models one line at a time via from_dict(), e.g.
+for replay into a Mirror in batches.
+
+Files whose names end in ``.gz`` are gzip-compressed, unless told otherwise;
+compressed files are recognized on reading whatever their name.
+"""
+import gzip
+import io
+import json
+import os
+from typing import IO, Any, Iterable, Iterator, Optional, Type, TypeVar, Union, cast
+
+from .enums import SortDirection, SortKey
+from .models import Base
+
+
+B = TypeVar("B", bound=Base)
+
+PathOrFile = Union[str, "os.PathLike[str]", IO[str]]
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def open_ndjson(
+    path: Union[str, "os.PathLike[str]"],
+    mode: str = "r",
+    compress: Optional[bool] = None,
+) -> IO[str]:
+    """Open an NDJSON file as text for reading ("r"), writing ("w") or
+    appending ("a").
+
+    ``compress`` defaults to whether the file name ends in ``.gz`` when
+    writing; when reading, to whether the file starts with the gzip magic.
+    """
+    if compress is None:
+        if mode == "r":
+            with open(path, "rb") as f:
+                compress = f.read(2) == GZIP_MAGIC
+        else:
+            compress = os.fspath(path).endswith(".gz")
+    if compress:
+        #  Text modes of gzip.open() always return a TextIOWrapper
+        return cast(IO[str], gzip.open(path, mode + "t", encoding="utf-8"))
+    return open(path, mode, encoding="utf-8", newline="\n")
+
+
+class NdjsonWriter:
+    """Writes models to ``file`` (a path, or a text file opened by the caller)
+    one per line.
+
+    A path is opened on construction and closed by close() (or at the end of
+    a ``with`` block); with ``append``, records are added to an existing file.
+    """
+
+    def __init__(
+        self, file: PathOrFile, compress: Optional[bool] = None, append: bool = False
+    ):
+        self.count = 0
+        if isinstance(file, io.IOBase) or hasattr(file, "write"):
+            self._file: IO[str] = file  # type: ignore
+            self._owned = False
+        else:
+            mode = "a" if append else "w"
+            self._file = open_ndjson(file, mode, compress)  # type: ignore
+            self._owned = True
+
+    def __enter__(self) -> "NdjsonWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def write(self, model: Base) -> None:
+        self._file.write(dumps(model))
+        self._file.write("\n")
+        self.count += 1
+
+    def write_all(self, models: Iterable[Base]) -> int:
+        """Write each model as it is produced, returning the number written."""
+        count = self.count
+        for model in models:
+            self.write(model)
+        return self.count - count
+
+    def close(self) -> None:
+        if self._owned:
+            self._file.close()
+        else:
+            self._file.flush()
+
+
+def dumps(model: Base) -> str:
+    """Compact JSON of a model, without newlines."""
+    return json.dumps(model.to_dict(), separators=(",", ":"))
+
+
+def dump(
+    models: Iterable[Base], file: PathOrFile, compress: Optional[bool] = None
+) -> int:
+    """Write ``models`` to ``file`` as they are produced, returning the number
+    written.
+    """
+    with NdjsonWriter(file, compress) as writer:
+        return writer.write_all(models)
+
+
+def load(cls: Type[B], file: PathOrFile) -> Iterator[B]:
+    """Lazily read ``cls`` models from ``file``, one line at a time.
+
+    Blank lines are skipped.  A line that isn't a valid ``cls`` raises
+    ValueError naming its line number.  A path is closed once exhausted.
+    """
+    if isinstance(file, io.IOBase) or hasattr(file, "read"):
+        yield from _load(cls, file)  # type: ignore
+        return
+    with open_ndjson(file) as f:  # type: ignore
+        yield from _load(cls, f)
+
+
+def _load(cls: Type[B], file: IO[str]) -> Iterator[B]:
+    for number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            yield cls.from_dict(json.loads(line))
+        except (ValueError, TypeError) as err:
+            raise ValueError(f"load(): line {number}: {err}") from err
+
+
+def decode_each(cls: Type[B], results: Iterable[Any]) -> Iterator[B]:
+    """Lazily decode JSON objects as returned by the API, so that only one
+    model at a time need be held while exporting a raw response.
+    """
+    for result in results:
+        yield cls.from_dict(result)
+
+
+def iter_history(
+    client, pageSize: int = 250, max_pages: Optional[int] = None
+) -> Iterator[Any]:
+    """Page through the history of a SonarrClient/RadarrClient, newest first,
+    yielding its records as each page arrives.
+    """
+    page = 1
+    while max_pages is None or page <= max_pages:
+        history = client.get_history(
+            sortKey=SortKey.DATE,
+            page=page,
+            pageSize=pageSize,
+            sortDir=SortDirection.DESCENDING,
+        )
+        yield from history.records
+        if not history.records or page * pageSize >= history.totalRecords:
+            return
+        page += 1
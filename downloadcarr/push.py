@@ -0,0 +1,509 @@
+"""Subscribing to the changes Sonarr/Radarr push over SignalR.
+
+Newer servers push every change to their resources (queue, commands, series,
+episodes, movies, ...) to the web UI over a SignalR websocket at
+``/signalr/messages``.  A PushSubscriber holds that connection open, decodes
+each message into a PushEvent, and keeps the queue & command statuses current
+from them, so that get_queue() & get_all_commands_status() are answered
+locally instead of polling the server.
+
+Only the JSON protocol of ASP.NET Core SignalR over websockets is spoken:
+messages are JSON objects, each terminated by a record separator.
+"""
+import dataclasses
+import json
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple, Type
+
+from .client import ArrClientError, ArrConnectionError
+from .enums import HttpMethod, PushAction
+from .mirror import Mirror
+from .models import CommandStatus
+from .models.base import make_decoder_generic, make_decoder_specific
+from .radarr import RadarrClient
+from .radarr.client import movie_dates
+from .sonarr import SonarrClient
+from .sonarr.client import episode_dates
+from .webhook import decode
+from .websocket import WebSocket, WebSocketClosed
+import downloadcarr.radarr.models as radarr_models
+import downloadcarr.sonarr.models as sonarr_models
+
+
+logger = logging.getLogger(__name__)
+
+
+RECORD_SEPARATOR = "\x1e"
+
+#  SignalR message types
+INVOCATION = 1
+PING = 6
+CLOSE = 7
+
+
+#  Models of the resources pushed, by resource name
+SONARR_MODELS: Mapping[str, Type] = {
+    "queue": sonarr_models.QueueItem,
+    "command": CommandStatus,
+    "series": sonarr_models.Series,
+    "episode": sonarr_models.Episode,
+}
+
+RADARR_MODELS: Mapping[str, Type] = {
+    "queue": radarr_models.QueueItem,
+    "command": CommandStatus,
+    "movie": radarr_models.Movie,
+}
+
+#  Attributes renamed by newer servers, by model: {name: newer name}
+RENAMED: Mapping[Type, Mapping[str, str]] = {
+    CommandStatus: {"state": "status", "startedOn": "started"},
+}
+
+#  Types decoded from JSON scalars (not objects or arrays)
+SCALARS = (bool, int, float, str)
+
+
+@dataclass(frozen=True)
+class PushEvent:
+    """Change to a server resource, e.g. ``name`` "queue" & ``action``
+    UPDATED.
+
+    ``resource`` is the JSON object pushed, if any; ``model`` is it decoded
+    (leniently, see decode_model()), or None if the resource isn't one
+    modelled here, or lacks attributes the model requires.
+    """
+
+    name: str
+    action: PushAction
+    resource: Optional[Mapping[str, Any]] = dataclasses.field(
+        default=None, compare=False, repr=False
+    )
+    model: Optional[Any] = None
+
+    @property
+    def id(self) -> Optional[int]:
+        if self.resource is None:
+            return None
+        return self.resource.get("id")
+
+
+def decode_field(attr_type: Any, value: Any) -> Any:
+    """Decode a JSON value as a model attribute of type ``attr_type``."""
+    if hasattr(attr_type, "__origin__"):
+        attr_type, decoder = make_decoder_generic(attr_type)
+    else:
+        decoder = make_decoder_specific(attr_type)
+    if attr_type in SCALARS:
+        values = value if isinstance(value, list) else [value]
+        if any(isinstance(item, (dict, list)) for item in values):
+            raise TypeError(f"Not a {attr_type.__name__}: {value!r}")
+    return decoder(attr_type, value)
+
+
+def decode_model(
+    cls: Type, resource: Optional[Mapping[str, Any]], current: Optional[Any] = None
+) -> Optional[Any]:
+    """Decode a pushed resource into ``cls``, or None if it doesn't fit.
+
+    Resources pushed by servers newer than the models are decoded leniently:
+    attributes are also looked up by their newer names, and those that don't
+    decode are skipped; missing ones are taken from ``current`` (the model
+    held for the resource) if supplied.
+    """
+    if resource is None:
+        return None
+    try:
+        return decode(cls, resource)
+    except (ValueError, KeyError, TypeError, AttributeError):
+        pass
+
+    resource = dict(resource)
+    for name, newer in RENAMED.get(cls, {}).items():
+        resource.setdefault(name, resource.get(newer))
+    fields = {}
+    for field in dataclasses.fields(cls):
+        value = resource.get(field.name)
+        if value is None:
+            continue
+        try:
+            fields[field.name] = decode_field(field.type, value)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            continue
+    try:
+        if current is not None:
+            return dataclasses.replace(current, **fields)
+        return cls(**fields)
+    except TypeError:
+        return None
+
+
+def parse_messages(
+    data: str, models: Optional[Mapping[str, Type]] = None
+) -> Tuple[List[Mapping[str, Any]], List[PushEvent]]:
+    """Split a websocket message into SignalR messages, returning them along
+    with the PushEvents of their ``receiveMessage`` invocations.  Resources
+    named in ``models`` are decoded into those.
+
+    Raises ValueError if a message isn't a JSON object; arguments & bodies
+    that aren't objects are skipped.
+    """
+    models = models or {}
+    messages: List[Mapping[str, Any]] = []
+    events = []
+    for record in data.split(RECORD_SEPARATOR):
+        if not record:
+            continue
+        message = json.loads(record)
+        if not isinstance(message, dict):
+            raise ValueError(f"parse_messages(): not a message: {record!r}")
+        messages.append(message)
+        if (
+            message.get("type") != INVOCATION
+            or message.get("target") != "receiveMessage"
+        ):
+            continue
+        for argument in message.get("arguments") or ():
+            if not isinstance(argument, dict):
+                continue
+            body = argument.get("body") or {}
+            if not isinstance(body, dict):
+                continue
+            try:
+                action = PushAction(body.get("action"))
+            except ValueError:
+                action = PushAction.UNKNOWN
+            name = argument.get("name")
+            if not isinstance(name, str):
+                continue
+            resource = body.get("resource")
+            if not isinstance(resource, dict):
+                resource = None
+            model = None
+            if name in models and resource is not None:
+                model = decode_model(models[name], resource)
+            events.append(PushEvent(name, action, resource, model))
+    return messages, events
+
+
+class PushSubscriber:
+    """Subscribes to the SignalR feed of a SonarrClient/RadarrClient.
+
+    The queue & command statuses are fetched once on connecting, then kept
+    current by the changes pushed; while connected, get_queue() &
+    get_all_commands_status() serve them as the client's methods would, and
+    otherwise ask the server.  Changes are applied by ID, decoded leniently
+    into the client's models (see decode_model()).  A command that still
+    doesn't fit is refetched by ID, and a queue item with the whole queue
+    (the server can't be asked for one); one that can't be refetched is
+    dropped.  A "sync" refetches everything.
+
+    Changes to series, episodes or movies invalidate the days of the client's
+    calendar cache holding them, and are applied to ``mirror`` if supplied.
+
+    Events are passed to callbacks registered with subscribe().  The feed is
+    read on a background thread between start() & stop() (or within a
+    ``with`` block), reconnecting after ``min_backoff`` seconds (doubling up
+    to ``max_backoff``) if the connection is lost.  The server pings
+    regularly, so no message within ``timeout`` seconds means it is gone.
+
+    A message that can't be decoded or applied (e.g. a refetch answered with
+    an HTTP error), or a callback that raises, is logged and counted in
+    ``errors``, and the feed is read on.  Only connection errors end the
+    connection.
+    """
+
+    def __init__(
+        self,
+        client,
+        mirror: Optional[Mirror] = None,
+        min_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        timeout: float = 60.0,
+    ):
+        self.client = client
+        self.mirror = mirror
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        if isinstance(client, SonarrClient):
+            self.models = SONARR_MODELS
+        elif isinstance(client, RadarrClient):
+            self.models = RADARR_MODELS
+        else:
+            self.models = {"command": CommandStatus}
+        self.connections = 0
+        self.received = 0
+        self.errors = 0
+
+        self._queue: Optional[Dict[int, Any]] = None
+        self._commands: Optional[Dict[int, CommandStatus]] = None
+        self._callbacks: List[Callable[[PushEvent], None]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._connected = threading.Event()
+        self._socket: Optional[WebSocket] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "PushSubscriber":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def connected(self) -> bool:
+        return self._connected.is_set()
+
+    def wait_connected(self, timeout: Optional[float] = None) -> bool:
+        """Block until connected (and synced), returning False on timeout."""
+        return self._connected.wait(timeout)
+
+    def subscribe(self, callback: Callable[[PushEvent], None]) -> None:
+        """Call ``callback`` with every event from now on."""
+        self._callbacks.append(callback)
+
+    def get_queue(self) -> Tuple[Any, ...]:
+        """The queue, as of the last change pushed; from the server while not
+        connected.
+        """
+        if self.connected:
+            with self._lock:
+                if self._queue is not None:
+                    return tuple(self._queue.values())
+        return self.client.get_queue()
+
+    def get_all_commands_status(self) -> Tuple[CommandStatus, ...]:
+        """Status of all commands, as of the last change pushed; from the
+        server while not connected.
+        """
+        if self.connected:
+            with self._lock:
+                if self._commands is not None:
+                    return tuple(self._commands.values())
+        return self.client.get_all_commands_status()
+
+    def get_command_status(self, command_id: int) -> CommandStatus:
+        """Status of a command, as of the last change pushed; from the server
+        while not connected, or if the command isn't held.
+        """
+        if self.connected:
+            with self._lock:
+                if self._commands is not None and command_id in self._commands:
+                    return self._commands[command_id]
+        return self.client.get_command_status(command_id)
+
+    def sync_queue(self) -> Tuple[Any, ...]:
+        """Refetch the queue from the server."""
+        queue = self.client.get_queue()
+        with self._lock:
+            self._queue = {item.id: item for item in queue}
+        return queue
+
+    def sync_commands(self) -> Tuple[CommandStatus, ...]:
+        """Refetch command statuses from the server."""
+        commands = self.client.get_all_commands_status()
+        with self._lock:
+            self._commands = {command.id: command for command in commands}
+        return commands
+
+    def connect(self) -> WebSocket:
+        """Negotiate a SignalR connection and open its websocket."""
+        client = self.client
+        signalr = dataclasses.replace(client, base_path="signalr")
+        negotiated = signalr._request(
+            "messages/negotiate", HttpMethod.POST, query={"negotiateVersion": "1"}
+        )
+        token = negotiated.get("connectionToken") or negotiated["connectionId"]
+
+        scheme = "wss" if client.tls else "ws"
+        url = (
+            f"{scheme}://{client.host}:{client.port}/signalr/messages"
+            f"?id={token}&access_token={client.api_key}"
+        )
+        socket = WebSocket(
+            url,
+            headers={"User-Agent": client.user_agent, "X-Api-Key": client.api_key},
+            timeout=self.timeout,
+            verify_ssl=client.verify_ssl,
+        )
+        socket.send(json.dumps({"protocol": "json", "version": 1}) + RECORD_SEPARATOR)
+        messages, _ = parse_messages(socket.recv())
+        if messages[:1] != [{}]:
+            socket.close()
+            raise ArrConnectionError(url, f"SignalR handshake failed: {messages}")
+        return socket
+
+    def receive(self, data: str) -> List[PushEvent]:
+        """Apply a websocket message received, returning its events."""
+        messages, events = parse_messages(data, self.models)
+        for message in messages:
+            if message.get("type") == CLOSE:
+                raise WebSocketClosed("receive()", message.get("error") or "Closed")
+            if message.get("type") == PING and self._socket is not None:
+                #  The server drops clients silent for 30s; it pings every 15s
+                self._socket.send(json.dumps({"type": PING}) + RECORD_SEPARATOR)
+
+        for event in events:
+            try:
+                self.apply(event)
+            except ArrConnectionError:
+                #  Server gone: reconnect (and resync) rather than read on
+                raise
+            except Exception:
+                self._error("Failed to apply %s", event)
+            for callback in self._callbacks:
+                try:
+                    callback(event)
+                except Exception:
+                    self._error("Callback %r failed on %s", callback, event)
+        with self._lock:
+            self.received += len(events)
+        return events
+
+    def _error(self, msg: str, *args: Any) -> None:
+        logger.exception(msg, *args)
+        with self._lock:
+            self.errors += 1
+
+    def apply(self, event: PushEvent) -> None:
+        if event.name == "queue":
+            self._apply_queue(event)
+        elif event.name == "command":
+            self._apply_command(event)
+        elif event.name in ("series", "episode", "movie"):
+            self._apply_library(event)
+
+    def _apply_queue(self, event: PushEvent) -> None:
+        if event.action is PushAction.SYNC or not self._apply_by_id(self._queue, event):
+            self.sync_queue()
+
+    def _apply_command(self, event: PushEvent) -> None:
+        if event.action is PushAction.SYNC:
+            self.sync_commands()
+        elif not self._apply_by_id(self._commands, event):
+            assert event.id is not None
+            command = self.client.get_command_status(event.id)
+            with self._lock:
+                if self._commands is not None:
+                    self._commands[event.id] = command
+
+    def _apply_by_id(self, items: Optional[Dict[int, Any]], event: PushEvent) -> bool:
+        """Update or delete the item pushed in ``items``, returning False (and
+        dropping the item held) if it doesn't fit the model.
+        """
+        if event.id is None:
+            return True
+        with self._lock:
+            if items is None:
+                return True
+            if event.action is PushAction.DELETED:
+                items.pop(event.id, None)
+                return True
+            model = event.model
+            if model is None and event.name in self.models:
+                current = items.get(event.id)
+                model = decode_model(self.models[event.name], event.resource, current)
+            if model is None:
+                items.pop(event.id, None)
+                return False
+            items[event.id] = model
+            return True
+
+    def _apply_library(self, event: PushEvent) -> None:
+        self._invalidate_calendar(event)
+        if self.mirror is None or event.id is None:
+            return
+
+        if event.action is PushAction.DELETED:
+            if event.name == "series":
+                self.mirror.delete_series(event.id)
+            elif event.name == "movie":
+                self.mirror.delete_movies(event.id)
+        elif event.name == "series":
+            series = event.model or self.client.get_series(event.id)
+            self.mirror.upsert_series([series])
+        elif event.name == "episode":
+            episode = event.model or self.client.get_episode(event.id)
+            self.mirror.upsert_episodes([episode])
+        elif event.name == "movie":
+            movie = event.model or self.client.get_movie(event.id)
+            self.mirror.upsert_movies([movie])
+
+    def _invalidate_calendar(self, event: PushEvent) -> None:
+        """Invalidate the calendar days of the episodes or movie changed, as
+        held and as pushed; all of them, if which isn't known.
+        """
+        cache = self.client.calendar_cache
+        if cache is None:
+            return
+        itemId, model = event.id, event.model
+        if itemId is None:
+            cache.clear()
+        elif event.name == "series":
+            cache.invalidate(lambda episode: episode.seriesId == itemId, episode_dates)
+        elif event.name == "episode":
+            days = episode_dates(model) if model is not None else ()
+            cache.invalidate(lambda episode: episode.id == itemId, episode_dates, days)
+        elif event.name == "movie":
+            days = movie_dates(model) if model is not None else ()
+            cache.invalidate(lambda movie: movie.id == itemId, movie_dates, days)
+
+    def start(self) -> None:
+        """Read the feed on a background thread until stop() is called."""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        socket = self._socket
+        if socket is not None:
+            socket.close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        backoff = self.min_backoff
+        while not self._stop.is_set():
+            try:
+                self._socket = self.connect()
+                if self._stop.is_set():
+                    break
+                #  Fetched after subscribing, so no change is missed between
+                self.sync_queue()
+                self.sync_commands()
+                self.connections += 1
+                self._connected.set()
+                backoff = self.min_backoff
+                while True:
+                    try:
+                        self.receive(self._socket.recv())
+                    except (ValueError, TypeError, AttributeError):
+                        #  Malformed message (not UTF-8, JSON, ...); skip it
+                        self._error("Failed to decode message")
+            except ArrClientError:
+                #  Lost the connection, or couldn't make one; try again later
+                pass
+            except Exception:
+                self._error("Reconnecting after unexpected error")
+            finally:
+                self._connected.clear()
+                with self._lock:
+                    self._queue = None
+                    self._commands = None
+                if self._socket is not None:
+                    self._socket.close()
+                    self._socket = None
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
@@ -0,0 +1,517 @@
+"""Watching the download queue for changes.
+
+A QueueWatcher polls get_queue() and compares each response with the last,
+emitting an event for each queue item added, removed, making progress,
+changing status or stalling.  Items are compared by key in a dict, so each
+poll costs time proportional to the size of the queue, and no more.
+
+A ThroughputEstimator derives download rates & ETAs from the same polls,
+rather than trusting those reported by the download client, and a
+StalledDetector finds the items that have stopped making progress and
+cleans them out of the queue.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+from .bulk import BulkItemResult, map_concurrent
+from .client import ArrClientError
+from .enums import Protocol, QueueEventType
+from .models import CommandStatus
+
+
+logger = logging.getLogger(__name__)
+
+
+QueueKey = Tuple[str, int]
+
+
+def queue_key(item: Any) -> QueueKey:
+    """Identify a QueueItem (Sonarr or Radarr).  Several queue items may
+    share a download, e.g. for a multi-episode release.
+    """
+    return (item.downloadId, item.id)
+
+
+def status_of(item: Any) -> Tuple[Any, ...]:
+    """Attributes of a queue item that make up its status."""
+    return (item.status, item.trackedDownloadStatus, item.statusMessages)
+
+
+def is_downloading(item: Any) -> bool:
+    return item.status.casefold() == "downloading"
+
+
+WARNING_STATUSES = ("warning", "error")
+
+
+def has_warning(item: Any) -> bool:
+    """True if the server reports trouble with a queue item, i.e. a warning
+    or error tracked download status.  Status messages alone aren't enough:
+    they are also reported for items that are merely informative.
+    """
+    return item.trackedDownloadStatus.casefold() in WARNING_STATUSES
+
+
+@dataclass(frozen=True)
+class QueueEvent:
+    """Change to a queue item between two polls.
+
+    ``previous`` is the item as of the previous poll (None if ADDED); for
+    REMOVED events, ``item`` is the item as last seen.
+    """
+
+    type: QueueEventType
+    item: Any
+    previous: Optional[Any] = None
+
+
+class QueueWatcher:
+    """Polls the queue of a SonarrClient/RadarrClient for changes.
+
+    An item whose ``sizeleft`` hasn't changed over ``stall_polls`` polls
+    while downloading is reported STALLED, once until it makes progress.
+
+    The polling interval is ``min_interval`` while items are downloading or
+    changing; while the queue is idle it grows by ``backoff`` per poll, up
+    to ``max_interval``.
+
+    Events are passed to callbacks registered with subscribe(), and are
+    returned by poll().  If ``estimator`` is supplied, every queue polled is
+    recorded there.  Polling runs on a background thread between
+    start() & stop() (or within a ``with`` block), or is driven by iterating
+    over events() in a coroutine.  A poll that fails unexpectedly (e.g. on a
+    response that can't be decoded), or a callback that raises, is logged
+    and counted in ``errors``, and polling carries on.
+    """
+
+    def __init__(
+        self,
+        client,
+        min_interval: float = 2.0,
+        max_interval: float = 60.0,
+        backoff: float = 2.0,
+        stall_polls: int = 10,
+        estimator: Optional["ThroughputEstimator"] = None,
+    ):
+        self.client = client
+        self.estimator = estimator
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.stall_polls = stall_polls
+        self.polls = 0
+        self.errors = 0
+
+        self.snapshot: Dict[QueueKey, Any] = {}
+        self._unchanged: Dict[QueueKey, int] = {}
+        self._callbacks: List[Callable[[QueueEvent], None]] = []
+        self._interval = min_interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "QueueWatcher":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    @property
+    def interval(self) -> float:
+        """Seconds until the next poll."""
+        return self._interval
+
+    def unchanged(self, item: Any) -> int:
+        """Number of consecutive polls over which ``item`` made no progress.
+        """
+        return self._unchanged.get(queue_key(item), 0)
+
+    def subscribe(self, callback: Callable[[QueueEvent], None]) -> None:
+        """Call ``callback`` with every event from now on."""
+        self._callbacks.append(callback)
+
+    def poll(self) -> List[QueueEvent]:
+        """Fetch the queue once, returning events since the previous poll.
+        """
+        return self.update(self.client.get_queue())
+
+    def update(self, queue: Iterable[Any]) -> List[QueueEvent]:
+        """Compare the queue with the previous snapshot, returning events.
+        """
+        queue = tuple(queue)
+        if self.estimator is not None:
+            self.estimator.record(queue)
+
+        with self._lock:
+            events = self._diff(queue)
+            self.polls += 1
+
+            active = any(is_downloading(item) for item in self.snapshot.values())
+            if events or active:
+                self._interval = self.min_interval
+            else:
+                self._interval = min(self._interval * self.backoff, self.max_interval)
+
+        for event in events:
+            for callback in self._callbacks:
+                try:
+                    callback(event)
+                except Exception:
+                    self._error("Callback %r failed on %s", callback, event)
+        return events
+
+    def _error(self, msg: str, *args: Any) -> None:
+        logger.exception(msg, *args)
+        with self._lock:
+            self.errors += 1
+
+    def _diff(self, queue: Iterable[Any]) -> List[QueueEvent]:
+        events = []
+        previous = self.snapshot
+        current = {}
+        unchanged = {}
+
+        for item in queue:
+            key = queue_key(item)
+            current[key] = item
+            old = previous.get(key)
+            if old is None:
+                events.append(QueueEvent(QueueEventType.ADDED, item))
+                continue
+
+            if status_of(item) != status_of(old):
+                events.append(QueueEvent(QueueEventType.STATUS_CHANGED, item, old))
+
+            if item.sizeleft != old.sizeleft:
+                events.append(QueueEvent(QueueEventType.PROGRESSED, item, old))
+            elif is_downloading(item):
+                count = self._unchanged.get(key, 0) + 1
+                unchanged[key] = count
+                if count == self.stall_polls:
+                    events.append(QueueEvent(QueueEventType.STALLED, item, old))
+
+        for key, old in previous.items():
+            if key not in current:
+                events.append(QueueEvent(QueueEventType.REMOVED, old, old))
+
+        self.snapshot = current
+        self._unchanged = unchanged
+        return events
+
+    async def events(self) -> AsyncIterator[QueueEvent]:
+        """Poll indefinitely, yielding events as they're observed.
+
+        Requests are made on the event loop's default executor, so as not to
+        block the loop.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                events = await loop.run_in_executor(None, self.poll)
+            except Exception as err:
+                if not isinstance(err, ArrClientError):
+                    self._error("Failed to poll the queue")
+                events = []
+                self._back_off()
+            for event in events:
+                yield event
+            await asyncio.sleep(self._interval)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Poll on a background thread until stop() is called."""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except ArrClientError:
+                #  Transient server trouble; keep watching, but back off
+                self._back_off()
+            except Exception:
+                self._error("Failed to poll the queue")
+                self._back_off()
+            self._stop.wait(self._interval)
+
+    def _back_off(self) -> None:
+        with self._lock:
+            self._interval = min(self._interval * self.backoff, self.max_interval)
+
+
+@dataclass(frozen=True)
+class Throughput:
+    """Estimated download rate (bytes per second) and time remaining of a
+    download, from the samples of its ``sizeleft`` recorded so far.
+
+    ``eta`` is None while no progress has been observed.
+    """
+
+    downloadId: str
+    protocol: Protocol
+    sizeleft: float
+    rate: float
+    eta: Optional[timedelta]
+    samples: int
+
+
+@dataclass(frozen=True)
+class ProtocolTotals:
+    """Aggregate throughput of the downloads using a protocol."""
+
+    protocol: Protocol
+    downloads: int
+    sizeleft: float
+    rate: float
+
+
+class _Download:
+    """Samples of a download's progress, and its smoothed rate."""
+
+    def __init__(self, protocol: Protocol, capacity: int):
+        self.protocol = protocol
+        self.samples: "deque[Tuple[float, float]]" = deque(maxlen=capacity)
+        self.rate: Optional[float] = None
+
+
+class ThroughputEstimator:
+    """Estimates download rates & ETAs from successive queue snapshots,
+    independently of the download client's own estimates.
+
+    The last ``capacity`` (time, sizeleft) samples of each download are kept
+    in a ring buffer.  The rate between consecutive samples is smoothed by an
+    exponentially weighted moving average with weight ``alpha`` for the
+    newest rate.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 32,
+        alpha: float = 0.3,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.capacity = capacity
+        self.alpha = alpha
+        self.clock = clock
+        self._downloads: Dict[str, _Download] = {}
+        self._lock = threading.Lock()
+
+    def record(self, queue: Iterable[Any], at: Optional[float] = None) -> None:
+        """Record a sample of each download in ``queue``; downloads no longer
+        queued are forgotten.
+        """
+        now = self.clock() if at is None else at
+        sizes: Dict[str, Tuple[Protocol, float]] = {}
+        for item in queue:
+            #  Items of a multi-episode download all report its size
+            sizes.setdefault(item.downloadId, (item.protocol, item.sizeleft))
+
+        with self._lock:
+            downloads = {}
+            for downloadId, (protocol, sizeleft) in sizes.items():
+                download = self._downloads.get(downloadId)
+                if download is None:
+                    download = _Download(protocol, self.capacity)
+                downloads[downloadId] = download
+                self._sample(download, now, sizeleft)
+            self._downloads = downloads
+
+    def _sample(self, download: _Download, now: float, sizeleft: float) -> None:
+        if download.samples:
+            then, before = download.samples[-1]
+            if now <= then:
+                return
+            rate = max(before - sizeleft, 0) / (now - then)
+            if download.rate is None:
+                download.rate = rate
+            else:
+                download.rate += self.alpha * (rate - download.rate)
+        download.samples.append((now, sizeleft))
+
+    def samples(self, downloadId: str) -> Tuple[Tuple[float, float], ...]:
+        """(time, sizeleft) samples recorded for a download, oldest first."""
+        with self._lock:
+            download = self._downloads.get(downloadId)
+            return tuple(download.samples) if download is not None else ()
+
+    def estimate(self, downloadId: str) -> Optional[Throughput]:
+        with self._lock:
+            download = self._downloads.get(downloadId)
+            if download is None:
+                return None
+            return self._estimate(downloadId, download)
+
+    def estimates(self) -> Dict[str, Throughput]:
+        """Estimates for every download, by downloadId."""
+        with self._lock:
+            return {
+                downloadId: self._estimate(downloadId, download)
+                for downloadId, download in self._downloads.items()
+            }
+
+    def _estimate(self, downloadId: str, download: _Download) -> Throughput:
+        sizeleft = download.samples[-1][1]
+        rate = download.rate or 0.0
+        eta = None
+        if rate > 0:
+            eta = timedelta(seconds=sizeleft / rate)
+        elif sizeleft == 0:
+            eta = timedelta(0)
+        return Throughput(
+            downloadId=downloadId,
+            protocol=download.protocol,
+            sizeleft=sizeleft,
+            rate=rate,
+            eta=eta,
+            samples=len(download.samples),
+        )
+
+    @property
+    def rate(self) -> float:
+        """Aggregate rate of all downloads, in bytes per second."""
+        return sum(estimate.rate for estimate in self.estimates().values())
+
+    def totals(self) -> Dict[Protocol, ProtocolTotals]:
+        """Aggregate throughput by protocol."""
+        totals: Dict[Protocol, ProtocolTotals] = {}
+        for estimate in self.estimates().values():
+            total = totals.get(estimate.protocol)
+            if total is None:
+                total = ProtocolTotals(estimate.protocol, 0, 0.0, 0.0)
+            totals[estimate.protocol] = ProtocolTotals(
+                protocol=estimate.protocol,
+                downloads=total.downloads + 1,
+                sizeleft=total.sizeleft + estimate.sizeleft,
+                rate=total.rate + estimate.rate,
+            )
+        return totals
+
+
+@dataclass(frozen=True)
+class Cleanup:
+    """Outcome of StalledDetector.clean().
+
+    ``removed`` are the queue items whose downloads were deleted; ``failed``
+    holds the results of deletions that raised errors.  ``search`` is the
+    status of the replacement search command, if one was issued.
+    """
+
+    removed: Tuple[Any, ...] = ()
+    failed: Tuple[BulkItemResult, ...] = ()
+    search: Optional[CommandStatus] = None
+
+
+class StalledDetector:
+    """Finds stalled items in the queue followed by a QueueWatcher.
+
+    An item is stalled if it has been downloading without progress over
+    ``stall_polls`` polls (by default, the watcher's own threshold), or if
+    ``warnings`` is True and it has a warning/error tracked download
+    status.
+    """
+
+    def __init__(
+        self,
+        watcher: QueueWatcher,
+        stall_polls: Optional[int] = None,
+        warnings: bool = True,
+    ):
+        self.watcher = watcher
+        self.stall_polls = stall_polls or watcher.stall_polls
+        self.warnings = warnings
+
+    def is_stalled(self, item: Any) -> bool:
+        if self.warnings and has_warning(item):
+            return True
+        return self.watcher.unchanged(item) >= self.stall_polls
+
+    def stalled(self) -> Tuple[Any, ...]:
+        """Stalled items as of the watcher's last poll."""
+        items = tuple(self.watcher.snapshot.values())
+        return tuple(item for item in items if self.is_stalled(item))
+
+    def clean(
+        self,
+        items: Optional[Iterable[Any]] = None,
+        blacklist: bool = False,
+        search: bool = True,
+        max_workers: int = 8,
+        retries: int = 2,
+    ) -> Cleanup:
+        """Delete the downloads of stalled items (or of ``items``) from the
+        queue concurrently, blacklisting the releases only if ``blacklist``
+        is True.
+
+        If ``search`` is True, a single search command is then issued for
+        the episodes/movies of all the items removed.
+        """
+        if items is None:
+            items = self.stalled()
+        items = tuple(items)
+        if not items:
+            return Cleanup()
+
+        #  Deleting a download removes all its queue items, so delete each
+        #  download once.
+        downloads: Dict[str, Any] = {}
+        for item in items:
+            downloads.setdefault(item.downloadId, item)
+
+        client = self.watcher.client
+        results = map_concurrent(
+            lambda item: client.delete_queue_item(item.id, blacklist=blacklist),
+            downloads.values(),
+            max_workers=max_workers,
+            retries=retries,
+        )
+        failed = tuple(result for result in results if not result.ok)
+        failed_downloads = {result.item.downloadId for result in failed}
+        removed = tuple(
+            item for item in items if item.downloadId not in failed_downloads
+        )
+
+        command = None
+        if search and removed:
+            command = search_replacements(client, removed)
+        return Cleanup(removed=removed, failed=failed, search=command)
+
+
+def search_replacements(client, items: Iterable[Any]) -> CommandStatus:
+    """Issue one search command for the episodes (Sonarr) or movies
+    (Radarr) of queue items.
+    """
+    items = tuple(items)
+    if all(hasattr(item, "episode") for item in items):
+        episodeIds = dict.fromkeys(item.episode.id for item in items)
+        return client.search_episodes(*episodeIds)
+    movieIds = dict.fromkeys(item.movie.id for item in items)
+    return client.search_movies(*movieIds)
@@ -3,12 +3,33 @@
 https://github.com/Radarr/Radarr/wiki/API
 """
 import json
+import itertools
 from datetime import date
-from typing import Tuple, Optional
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    MutableMapping,
+    Set,
+    Tuple,
+    Optional,
+    Union,
+)
 from dataclasses import dataclass
 
 from downloadcarr.__version__ import __version__, __title__
 from downloadcarr.client import Client, ArrClientError
+from downloadcarr.bulk import (
+    BulkAddReport,
+    BulkItemResult,
+    BulkSummary,
+    Checkpoint,
+    RateLimiter,
+    bulk_apply,
+    map_concurrent,
+    stopwatch,
+)
 from downloadcarr.models import (
     CommandStatus,
     DiskSpace,
@@ -27,7 +48,31 @@ from downloadcarr.enums import (
     HttpMethod,
     ImportMode,
 )
-from downloadcarr.utils import BOOL2JSON
+from downloadcarr.utils import BOOL2JSON, UTC
+
+
+def movie_key(movieId: Union[int, str]) -> str:
+    """Normalize a TMDb ID (int) or IMDb ID (str) to "tmdb:{id}"/"imdb:{id}".
+    """
+    if isinstance(movieId, int):
+        return f"tmdb:{movieId}"
+
+    source, _, value = movieId.rpartition(":")
+    if source in ("", "tmdb") and value.isdigit():
+        return f"tmdb:{int(value)}"
+    if source in ("", "imdb") and value.startswith("tt") and value[2:].isdigit():
+        return f"imdb:{value}"
+    raise ValueError(f"Not a TMDb or IMDb ID: {movieId!r}")
+
+
+def movie_dates(movie: Movie) -> Tuple[date, ...]:
+    """Dates (UTC) of a movie's cinema & physical releases, for CalendarCache.
+    """
+    return tuple(
+        release.astimezone(UTC).date()
+        for release in (movie.inCinemas, movie.physicalRelease)
+        if release is not None
+    )
 
 
 @dataclass(frozen=True)
@@ -50,7 +95,19 @@ class RadarrClient(Client):
 
         If start/end are not supplied, episodes airing today and tomorrow
         will be returned.
+
+        If the client has a ``calendar_cache`` and both start & end are
+        supplied, only the dates not held fresh in the cache are fetched.
         """
+        if self.calendar_cache is not None and start is not None and end is not None:
+            return self.calendar_cache.get(
+                start, end, self._fetch_calendar, movie_dates
+            )
+        return self._fetch_calendar(start, end)
+
+    def _fetch_calendar(
+        self, start: Optional[date] = None, end: Optional[date] = None
+    ) -> Tuple[Movie, ...]:
         query = {}
 
         if start is not None:
@@ -227,8 +284,12 @@ class RadarrClient(Client):
         profileId: int,
         path: Optional[str] = None,  # full path to the movie on disk
         searchForMovie: bool = False,
+        rootFolderPath: Optional[str] = None,
     ) -> Movie:
         """Add a new movie to your collection.
+
+        If neither ``path`` nor ``rootFolderPath`` is supplied, the movie is
+        added under the (single) configured root folder.
         """
         #  LIVETESTME
         #  NOTE: if you do not add the required params, then the movie addition
@@ -261,6 +322,8 @@ class RadarrClient(Client):
 
         if path is not None:
             data["path"] = path
+        elif rootFolderPath is not None:
+            data["rootFolderPath"] = rootFolderPath
         else:
             rootfolders = self.get_rootfolders()
             assert len(rootfolders) == 1
@@ -269,6 +332,170 @@ class RadarrClient(Client):
         result = self._request("movie", method=HttpMethod.POST, data=data)
         return Movie.from_dict(result)
 
+    def import_movies(
+        self,
+        ids: Iterable[Union[int, str]],
+        qualityProfileId: int,
+        profileId: int,
+        rootFolderPath: Optional[str] = None,
+        searchForMovie: bool = False,
+        checkpoint: Optional[str] = None,
+        cache: Optional[MutableMapping[str, Tuple[Movie, ...]]] = None,
+        max_workers: int = 8,
+        rate: Optional[float] = None,
+        batch_size: int = 100,
+        retries: int = 2,
+    ) -> BulkAddReport[Movie]:
+        """Add movies to your collection from a stream of TMDb IDs (int) and/or
+        IMDb IDs (str, e.g. "tt2094766").
+
+        IDs are consumed lazily, ``batch_size`` at a time.  IDs already in the
+        collection are skipped; the rest are looked up and added concurrently,
+        with at most ``max_workers`` requests in flight and (if supplied) at
+        most ``rate`` requests per second.  Lookup results are memoized in
+        ``cache``, which may be shared between runs.
+
+        If ``checkpoint`` (a file path) is supplied, IDs are recorded there as
+        each batch completes, and IDs recorded by an earlier run are skipped.
+        IDs that failed aren't recorded, so a resumed run retries them.
+
+        Report entries identify movies as "tmdb:{tmdbId}" or "imdb:{imdbId}".
+        Malformed IDs are reported as failed (with a ValueError), as given.
+        """
+        timings: Dict[str, float] = {}
+
+        with stopwatch(timings, "prepare"):
+            movies = self.get_movies()
+            tmdbIds = {movie.tmdbId for movie in movies}
+            imdbIds = {movie.imdbId for movie in movies if movie.imdbId}
+            del movies
+
+            if rootFolderPath is None:
+                rootfolders = self.get_rootfolders()
+                if len(rootfolders) != 1:
+                    msg = (
+                        "import_movies(): rootFolderPath is required "
+                        f"with {len(rootfolders)} root folders configured"
+                    )
+                    raise ValueError(msg)
+                rootFolderPath = rootfolders[0].path
+
+        log = Checkpoint(checkpoint) if checkpoint is not None else None
+        done = log.load() if log is not None else set()
+        limiter = RateLimiter(rate, burst=max_workers) if rate else None
+        found: MutableMapping[str, Tuple[Movie, ...]] = {} if cache is None else cache
+
+        def lookup(key: str) -> Tuple[Movie, ...]:
+            if key not in found:
+                source, value = key.split(":", 1)
+                if source == "tmdb":
+                    found[key] = self.lookup_movie_tmdb(int(value))
+                else:
+                    found[key] = self.lookup_movie_imdb(value)
+            return found[key]
+
+        def add(candidate: Tuple[str, Movie]) -> Movie:
+            key, movie = candidate
+            return self.add_movie(
+                movie,
+                qualityProfileId,
+                profileId,
+                searchForMovie=searchForMovie,
+                rootFolderPath=rootFolderPath,
+            )
+
+        added: List[Movie] = []
+        existing: List[str] = []
+        not_found: List[str] = []
+        failed: List[BulkItemResult] = []
+        resumed: List[str] = []
+        seen: Set[str] = set()
+
+        ids = iter(ids)
+        while True:
+            batch = tuple(itertools.islice(ids, batch_size))
+            if not batch:
+                break
+
+            completed = []
+            keys = []
+            for movieId in batch:
+                try:
+                    key = movie_key(movieId)
+                except ValueError as err:
+                    failed.append(BulkItemResult(item=movieId, error=err))
+                    continue
+                source, value = key.split(":", 1)
+                if key in seen:
+                    continue
+                seen.add(key)
+                if source == "tmdb":
+                    in_library = int(value) in tmdbIds
+                else:
+                    in_library = value in imdbIds
+
+                if key in done:
+                    resumed.append(key)
+                elif in_library:
+                    existing.append(key)
+                    completed.append(key)
+                else:
+                    keys.append(key)
+
+            with stopwatch(timings, "lookup"):
+                lookups = map_concurrent(
+                    lookup,
+                    keys,
+                    max_workers=max_workers,
+                    retries=retries,
+                    limiter=limiter,
+                )
+
+            candidates = []
+            for result in lookups:
+                if not result.ok:
+                    failed.append(result)
+                elif not result.result:
+                    not_found.append(result.item)
+                    completed.append(result.item)
+                elif result.result[0].tmdbId in tmdbIds:
+                    existing.append(result.item)
+                    completed.append(result.item)
+                else:
+                    movie = result.result[0]
+                    tmdbIds.add(movie.tmdbId)
+                    candidates.append((result.item, movie))
+
+            with stopwatch(timings, "add"):
+                adds = map_concurrent(
+                    add,
+                    candidates,
+                    max_workers=max_workers,
+                    retries=retries,
+                    limiter=limiter,
+                )
+
+            for addition in adds:
+                key, movie = addition.item
+                if addition.ok:
+                    added.append(addition.result)
+                    completed.append(key)
+                else:
+                    failed.append(addition)
+
+            if log is not None:
+                with stopwatch(timings, "checkpoint"):
+                    log.record(completed)
+
+        return BulkAddReport(
+            added=tuple(added),
+            existing=tuple(existing),
+            not_found=tuple(not_found),
+            failed=tuple(failed),
+            timings=timings,
+            resumed=tuple(resumed),
+        )
+
     def update_movie(self, movie: Movie) -> Movie:
         """Update an existing Movie.
         """
@@ -276,6 +503,30 @@ class RadarrClient(Client):
         result = self._request(f"movie/{movie.id}", method=HttpMethod.PUT, data=data)
         return Movie.from_dict(result)
 
+    def bulk_update_movies(
+        self,
+        transform: Callable[[Movie], Movie],
+        movies: Optional[Iterable[Movie]] = None,
+        max_workers: int = 8,
+        retries: int = 2,
+    ) -> BulkSummary[Movie]:
+        """Apply ``transform`` to many movies, and update the changed ones
+        concurrently.
+
+        If ``movies`` isn't supplied, every movie in the collection is selected.
+        Movies left unchanged by ``transform`` are skipped.
+        """
+        if movies is None:
+            movies = self.get_movies()
+
+        return bulk_apply(
+            self.update_movie,
+            transform,
+            movies,
+            max_workers=max_workers,
+            retries=retries,
+        )
+
     def delete_movie(
         self, movieId: int, deleteFiles: bool = False, addExclusion: bool = False,
     ) -> None:
@@ -297,7 +548,7 @@ class RadarrClient(Client):
         """Searches for new movies on trakt
         """
         query = {"term": term}
-        results = self._request("movie/lookup", query=query)
+        results = self._cached_request(self.lookup_cache, "movie/lookup", query)
         return tuple(Movie.from_dict(result) for result in results)
 
     def lookup_movie_tmdb(self, tmdbId: int) -> Tuple[Movie, ...]:
@@ -305,7 +556,7 @@ class RadarrClient(Client):
         """
         #  LIVETESTME
         query = {"tmdbId": str(tmdbId)}
-        results = self._request("movie/lookup", query=query)
+        results = self._cached_request(self.lookup_cache, "movie/lookup", query)
         return tuple(Movie.from_dict(result) for result in results)
 
     def lookup_movie_imdb(self, imdbId: str) -> Tuple[Movie, ...]:
@@ -313,7 +564,7 @@ class RadarrClient(Client):
         """
         #  LIVETESTME
         query = {"imdbId": imdbId}
-        results = self._request("movie/lookup", query=query)
+        results = self._cached_request(self.lookup_cache, "movie/lookup", query)
         return tuple(Movie.from_dict(result) for result in results)
 
     #  https://github.com/Radarr/Radarr/wiki/API:Queue
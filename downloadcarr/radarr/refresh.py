@@ -0,0 +1,177 @@
+"""Detecting which movies' files changed between runs.
+
+/movie returns every movie with its file, so jobs that process movie files
+(e.g. media analysis) can't tell which changed since they last ran without
+keeping state of their own.  A MovieFileTracker keeps a fingerprint of each
+movie's file (ID, size, date added & quality) in a SQLite table, persisted
+between runs, and reports only the movies whose fingerprint differs.
+"""
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .models import Movie
+
+
+Fingerprint = Tuple[int, int, str, int, int, int]
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS moviefile_fingerprint (
+    movieId INTEGER PRIMARY KEY,
+    fileId INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    dateAdded TEXT NOT NULL,
+    qualityId INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    real INTEGER NOT NULL
+);
+"""
+
+
+def fingerprint(movie: Movie) -> Optional[Fingerprint]:
+    """(file ID, size, date added, quality ID, revision version & real) of a
+    movie's file; None if the movie has no file.
+    """
+    f = movie.movieFile
+    if f is None:
+        return None
+    revision = f.quality.revision
+    return (
+        f.id,
+        f.size,
+        f.dateAdded.isoformat(),
+        f.quality.quality.id,
+        revision.version if revision else 0,
+        revision.real if revision else 0,
+    )
+
+
+@dataclass(frozen=True)
+class FileChanges:
+    """Movies whose files changed since the fingerprints were last stored.
+
+    ``added`` are movies with a file where there was none (including movies
+    new to the tracker); ``changed`` had a file with another fingerprint;
+    ``removed`` are the IDs of movies whose file (or the movie itself) is
+    gone.
+    """
+
+    added: Tuple[Movie, ...] = ()
+    changed: Tuple[Movie, ...] = ()
+    removed: Tuple[int, ...] = ()
+    unchanged: int = 0
+
+    @property
+    def movies(self) -> Tuple[Movie, ...]:
+        """Movies with a new or changed file, to be processed."""
+        return self.added + self.changed
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+
+class MovieFileTracker:
+    """Persistent fingerprints of movie files, by movie ID.
+
+    ``path`` is the SQLite database to keep them in (e.g. a Mirror's); by
+    default, an in-memory database that lasts as long as the tracker.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "MovieFileTracker":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def fingerprints(self) -> Dict[int, Fingerprint]:
+        """Stored fingerprints by movie ID."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT movieId, fileId, size, dateAdded, qualityId, version, real "
+                "FROM moviefile_fingerprint"
+            ).fetchall()
+        return {row[0]: tuple(row[1:]) for row in rows}  # type: ignore
+
+    def changes(self, movies: Iterable[Movie]) -> FileChanges:
+        """Compare ``movies`` (the whole library) with the stored
+        fingerprints, without storing anything.
+        """
+        stored = self.fingerprints()
+        added = []
+        changed = []
+        removed: List[int] = []
+        unchanged = 0
+        seen = set()
+        for movie in movies:
+            #  Movies read from the server always have an ID
+            if movie.id is None:
+                continue
+            seen.add(movie.id)
+            old = stored.get(movie.id)
+            new = fingerprint(movie)
+            if new == old:
+                unchanged += 1
+            elif new is None:
+                removed.append(movie.id)
+            elif old is None:
+                added.append(movie)
+            else:
+                changed.append(movie)
+        removed.extend(movieId for movieId in stored if movieId not in seen)
+        return FileChanges(
+            added=tuple(added),
+            changed=tuple(changed),
+            removed=tuple(sorted(removed)),
+            unchanged=unchanged,
+        )
+
+    def update(self, movies: Iterable[Movie], removed: Iterable[int] = ()) -> None:
+        """Store the fingerprints of ``movies``, and forget those of the
+        movies with IDs in ``removed``.
+
+        Movies without a file are forgotten too.
+        """
+        rows = []
+        gone = [(movieId,) for movieId in removed]
+        for movie in movies:
+            if movie.id is None:
+                continue
+            key = fingerprint(movie)
+            if key is None:
+                gone.append((movie.id,))
+            else:
+                rows.append((movie.id,) + key)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM moviefile_fingerprint WHERE movieId = ?", gone
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO moviefile_fingerprint "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def scan(self, movies: Iterable[Movie]) -> FileChanges:
+        """Report the changes in ``movies`` (the whole library), and store
+        them.
+
+        To store only once the changed movies have been processed, call
+        changes(), then update() with what was processed.
+        """
+        movies = tuple(movies)
+        changes = self.changes(movies)
+        self.update(changes.movies, changes.removed)
+        return changes
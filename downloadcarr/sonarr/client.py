@@ -3,12 +3,20 @@
 https://github.com/Sonarr/Sonarr/wiki/API
 """
 import json
-from typing import Tuple, Optional
+from typing import Any, Callable, Dict, Iterable, Tuple, Optional, Union
 from datetime import date
-from dataclasses import dataclass
+from dataclasses import dataclass, field, replace
 
 from downloadcarr.__version__ import __version__, __title__
 from downloadcarr.client import Client, ArrClientError
+from downloadcarr.cache import ResponseCache, MISSING
+from downloadcarr.bulk import (
+    BulkAddReport,
+    BulkSummary,
+    bulk_apply,
+    map_concurrent,
+    stopwatch,
+)
 from downloadcarr.enums import (
     HttpMethod,
     SortKey,
@@ -29,6 +37,10 @@ from .models import (
     QualityAllowedProfile,
     Release,
 )
+from .parser import parse_release_title
+from .ranking import ReleaseRanker
+from .cutoff import CutoffEngine, CutoffUnmet
+from .tags import TagIndex
 from downloadcarr.models import (
     CommandStatus,
     SystemBackup,
@@ -37,7 +49,27 @@ from downloadcarr.models import (
     RootFolder,
     encode_dict,
 )
-from downloadcarr.utils import BOOL2JSON
+from downloadcarr.utils import BOOL2JSON, UTC
+
+
+def episode_dates(episode: Episode) -> Tuple[date, ...]:
+    """Date (UTC) on which an episode airs, for CalendarCache."""
+    if episode.airDateUtc is not None:
+        return (episode.airDateUtc.astimezone(UTC).date(),)
+    if episode.airDate is not None:
+        return (episode.airDate,)
+    return ()
+
+
+def parse_key(param: str, value: str) -> str:
+    """Cache key for parsing a title or path.  Paths are keyed verbatim (on
+    case-sensitive filesystems, paths differing in case are different); in
+    titles only runs of whitespace are collapsed, since "+" and case may be
+    significant.
+    """
+    if param == "title":
+        value = " ".join(value.split())
+    return f"parse?{param}={value}"
 
 
 @dataclass(frozen=True)
@@ -47,10 +79,16 @@ class SonarrClient(Client):
     This class is defined as dataclasses for the convenience of autogenerated
     dunder methods a la attrs.  It's actually a proper object class with
     methods, not data.
+
+    If ``parse_cache`` is supplied, results of parsing titles/paths
+    (including failures to parse) are cached there.
     """
 
     port: int = 8989
     user_agent: str = f"{__title__}.SonarrClient/{__version__} (Python)"
+    parse_cache: Optional[ResponseCache] = field(
+        default=None, compare=False, repr=False
+    )
 
     #  https://github.com/Sonarr/Sonarr/wiki/Calendar
     def get_calendar(
@@ -60,8 +98,20 @@ class SonarrClient(Client):
 
         If start/end are not supplied, episodes airing today and tomorrow
         will be returned.
+
+        If the client has a ``calendar_cache`` and both start & end are
+        supplied, only the dates not held fresh in the cache are fetched.
         """
         #  GET http://$HOST:8989/api/calendar?start=2020-06-13T00%3A00%3A00.000Z&end=2020-06-19T00%3A00%3A00.000Z&unmonitored=false
+        if self.calendar_cache is not None and start is not None and end is not None:
+            return self.calendar_cache.get(
+                start, end, self._fetch_calendar, episode_dates
+            )
+        return self._fetch_calendar(start, end)
+
+    def _fetch_calendar(
+        self, start: Optional[date] = None, end: Optional[date] = None
+    ) -> Tuple[Episode, ...]:
         query = {}
 
         if start is not None:
@@ -335,6 +385,59 @@ class SonarrClient(Client):
         result = self._request("wanted/missing", query=query)
         return WantedMissing.from_dict(result)
 
+    def get_cutoff_unmet(
+        self,
+        series: Optional[Iterable[Series]] = None,
+        monitored_only: bool = True,
+        max_workers: int = 8,
+        retries: int = 2,
+    ) -> CutoffUnmet:
+        """Find episodes whose files don't meet the cutoff of their series'
+        quality profile, by fetching episodes & episode files concurrently
+        and comparing qualities locally.
+
+        If ``series`` isn't supplied, every series in the library is checked.
+        """
+        engine = CutoffEngine(self.get_quality_profiles())
+        if series is None:
+            series = self.get_all_series()
+        if monitored_only:
+            series = [s for s in series if s.monitored]
+
+        def fetch(
+            series: Series,
+        ) -> Tuple[Series, Tuple[Episode, ...], Tuple[EpisodeFile, ...]]:
+            return (
+                series,
+                self.get_episodes(series.id),
+                self.get_episode_files(series.id),
+            )
+
+        results = map_concurrent(
+            fetch, series, max_workers=max_workers, retries=retries
+        )
+        for result in results:
+            if not result.ok:
+                raise result.error  # type: ignore
+
+        return engine.evaluate(
+            (result.result for result in results), monitored_only=monitored_only
+        )
+
+    def search_cutoff_unmet(
+        self, batch_size: int = 50, **kwargs
+    ) -> Tuple[CommandStatus, ...]:
+        """Search for upgrades of every episode that doesn't meet its cutoff,
+        issuing one EpisodeSearch command per ``batch_size`` episodes.
+
+        Keyword arguments are passed through to get_cutoff_unmet().
+        """
+        unmet = self.get_cutoff_unmet(**kwargs)
+        return tuple(
+            self.search_episodes(*episodeIds)
+            for episodeIds in unmet.batches(batch_size)
+        )
+
     #  https://github.com/Sonarr/Sonarr/wiki/Queue
     def get_queue(self) -> Tuple[QueueItem, ...]:
         """Get currently downloading info.
@@ -365,12 +468,7 @@ class SonarrClient(Client):
         specific series and one or more episodes.
         """
         #  NEEDS EXAMPLE
-        query = {"title": title}
-        try:
-            result = self._request("parse", query=query)
-            return ParseResult.from_dict(result)
-        except json.JSONDecodeError:
-            return None
+        return self._parse("title", title)
 
     def parse_path(self, path: str) -> Optional[ParseResult]:
         """Returns the result of parsing a path.
@@ -379,12 +477,100 @@ class SonarrClient(Client):
         specific series and one or more episodes.
         """
         #  NEEDS EXAMPLE
-        query = {"path": path}
-        try:
-            result = self._request("parse", query=query)
-            return ParseResult.from_dict(result)
-        except json.JSONDecodeError:
+        return self._parse("path", path)
+
+    def parse_titles(
+        self,
+        titles: Iterable[str],
+        max_workers: int = 8,
+        retries: int = 2,
+        min_confidence: Optional[float] = None,
+    ) -> Tuple[Optional[ParseResult], ...]:
+        """Parse many titles concurrently; results are returned in input order.
+
+        Duplicate titles (after collapsing runs of whitespace) are parsed once.
+
+        If ``min_confidence`` is supplied, titles are first parsed locally
+        (see ``downloadcarr.sonarr.parser``); only those parsed with lower
+        confidence are sent to the server.  Locally parsed results aren't
+        matched to a series or episodes.
+        """
+        if min_confidence is None:
+            return self._parse_many("title", titles, max_workers, retries)
+
+        titles = tuple(titles)
+        local: Dict[str, Optional[ParseResult]] = {}
+        for title in titles:
+            if title not in local:
+                parsed = parse_release_title(title)
+                if parsed is not None and parsed.confidence >= min_confidence:
+                    local[title] = parsed.to_parse_result()
+                else:
+                    local[title] = None
+
+        remote = iter(
+            self._parse_many(
+                "title",
+                (title for title in titles if local[title] is None),
+                max_workers,
+                retries,
+            )
+        )
+        return tuple(local[title] or next(remote) for title in titles)
+
+    def parse_paths(
+        self, paths: Iterable[str], max_workers: int = 8, retries: int = 2
+    ) -> Tuple[Optional[ParseResult], ...]:
+        """Parse many paths concurrently; results are returned in input order.
+
+        Duplicate paths are parsed once.
+        """
+        return self._parse_many("path", paths, max_workers, retries)
+
+    def _parse(self, param: str, value: str) -> Optional[ParseResult]:
+        """Parse a title or path, via parse_cache if configured.
+        """
+        query = {param: value}
+        key = parse_key(param, value)
+        cache = self.parse_cache
+        result: Any = MISSING if cache is None else cache.get(key)
+
+        if result is MISSING:
+            try:
+                result = self._request("parse", query=query)
+            except json.JSONDecodeError:
+                # Unparseable; cache the negative result too.
+                result = None
+            if cache is not None:
+                cache.put(key, result)
+
+        if result is None:
             return None
+        return ParseResult.from_dict(result)
+
+    def _parse_many(
+        self, param: str, values: Iterable[str], max_workers: int, retries: int,
+    ) -> Tuple[Optional[ParseResult], ...]:
+        values = tuple(values)
+        keys = [parse_key(param, value) for value in values]
+        unique: Dict[str, str] = {}
+        for key, value in zip(keys, values):
+            unique.setdefault(key, value)
+
+        results = map_concurrent(
+            lambda value: self._parse(param, value),
+            unique.values(),
+            max_workers=max_workers,
+            retries=retries,
+        )
+
+        parsed = {}
+        for key, result in zip(unique, results):
+            if not result.ok:
+                raise result.error  # type: ignore
+            parsed[key] = result.result
+
+        return tuple(parsed[key] for key in keys)
 
     #  https://github.com/Sonarr/Sonarr/wiki/Profile
     def get_quality_profiles(self) -> Tuple[QualityAllowedProfile, ...]:
@@ -408,6 +594,14 @@ class SonarrClient(Client):
         results = self._request("release", query=query)
         return tuple(Release.from_dict(result) for result in results)
 
+    def get_best_release(
+        self, episodeId: int, ranker: ReleaseRanker
+    ) -> Optional[Release]:
+        """Search for releases of an episode, and return the best according
+        to ``ranker`` (or None if there are none).
+        """
+        return ranker.best(self.get_release(episodeId))
+
     def add_release(self, guid: str, indexerId: int) -> Tuple[Release, ...]:
         """Adds a previously searched release to the download client,
         if the release is still in Sonarr's search cache (30 minute cache).
@@ -487,8 +681,12 @@ class SonarrClient(Client):
         ignoreEpisodesWithFiles: bool = False,
         ignoreEpisodesWithoutFiles: bool = False,
         searchForMissingEpisodes: bool = False,
+        rootFolderPath: Optional[str] = None,
     ) -> Series:
         """Add a new series to your collection.
+
+        If neither ``path`` nor ``rootFolderPath`` is supplied, the series is
+        added under the (single) configured root folder.
         """
         #  POST http://$HOST:8989/api/series {"title":"Monty Python's Flying Circus","sortTitle":"monty pythons flying circus","seasonCount":4,"status":"ended","overview":"And now for something completely different: Monty Python's Flying Circus was simply the most influential comedy program television has ever seen. Five Englishmen, all working under the constraints of conventional TV shows such as The Frost Report (for which the five Englishmen wrote), gathered together with an expatriate American in the spring of 1969 to break the rules. The result, first airing on BBC-1 on October 5, 1969, has influenced countless future men and women in the media and comedy since.","network":"BBC Two","airTime":"22:00","images":[{"coverType":"banner","url":"https://artworks.thetvdb.com/banners/graphical/3412-g.jpg"},{"coverType":"poster","url":"https://artworks.thetvdb.com/banners/posters/75853-5.jpg"},{"coverType":"fanart","url":"https://artworks.thetvdb.com/banners/fanart/original/75853-4.jpg"}],"remotePoster":"https://artworks.thetvdb.com/banners/posters/75853-5.jpg","seasons":[{"seasonNumber":0,"monitored":false},{"seasonNumber":1,"monitored":true},{"seasonNumber":2,"monitored":true},{"seasonNumber":3,"monitored":true},{"seasonNumber":4,"monitored":true}],"year":1969,"profileId":"1","seasonFolder":true,"monitored":true,"useSceneNumbering":false,"runtime":30,"tvdbId":75853,"tvRageId":4522,"tvMazeId":694,"firstAired":"1969-10-05T05:00:00Z","seriesType":"standard","cleanTitle":"montypythonsflyingcircus","imdbId":"tt0063929","titleSlug":"monty-pythons-flying-circus","certification":"TV-14","genres":["Comedy"],"tags":[],"added":"0001-01-01T00:00:00Z","ratings":{"votes":1879,"value":9.6},"qualityProfileId":0,"episodeFileCount":0,"episodeCount":0,"isExisting":false,"rootFolderPath":"/tank/video/TV/","addOptions":{"ignoreEpisodesWithFiles":true,"ignoreEpisodesWithoutFiles":false,"searchForMissingEpisodes":false}}
 
@@ -520,6 +718,8 @@ class SonarrClient(Client):
 
         if path is not None:
             data["path"] = path
+        elif rootFolderPath is not None:
+            data["rootFolderPath"] = rootFolderPath
         else:
             rootfolders = self.get_rootfolders()
             assert len(rootfolders) == 1
@@ -528,6 +728,107 @@ class SonarrClient(Client):
         result = self._request("series", method=HttpMethod.POST, data=data)
         return Series.from_dict(result)
 
+    def bulk_add_series(
+        self,
+        terms: Iterable[str],
+        profile: Union[int, str],  # id or name of QualityAllowedProfile
+        rootFolderPath: Optional[str] = None,
+        ignoreEpisodesWithFiles: bool = False,
+        ignoreEpisodesWithoutFiles: bool = False,
+        searchForMissingEpisodes: bool = False,
+        max_workers: int = 8,
+        retries: int = 2,
+    ) -> BulkAddReport[Series]:
+        """Look up many search terms and add the best match for each to your
+        collection.
+
+        Lookups and adds are made concurrently.  The library, quality profiles
+        and root folders are fetched once per run; series already in the
+        library (by tvdbId) are skipped.  Terms of the form "tvdb:{tvdbId}"
+        for series already in the library are skipped without a lookup.
+        """
+        timings: Dict[str, float] = {}
+
+        with stopwatch(timings, "prepare"):
+            library = {series.tvdbId for series in self.get_all_series()}
+            profiles = self.get_quality_profiles()
+            byId = {p.id: p for p in profiles}
+            byName = {p.name: p for p in profiles}
+            found = (
+                byId.get(profile) if isinstance(profile, int) else byName.get(profile)
+            )
+            if found is None:
+                msg = f"bulk_add_series(): no quality profile {profile!r}"
+                raise ValueError(msg)
+            profileId = found.id
+
+            if rootFolderPath is None:
+                rootfolders = self.get_rootfolders()
+                if len(rootfolders) != 1:
+                    msg = (
+                        "bulk_add_series(): rootFolderPath is required "
+                        f"with {len(rootfolders)} root folders configured"
+                    )
+                    raise ValueError(msg)
+                rootFolderPath = rootfolders[0].path
+
+        existing = []
+        lookup_terms = []
+        for term in dict.fromkeys(terms):  # Dedupe, preserving order
+            tvdbId = term[len("tvdb:") :]
+            if term.startswith("tvdb:") and tvdbId.isdigit():
+                if int(tvdbId) in library:
+                    existing.append(term)
+                    continue
+            lookup_terms.append(term)
+
+        with stopwatch(timings, "lookup"):
+            lookups = map_concurrent(
+                self.lookup_series,
+                lookup_terms,
+                max_workers=max_workers,
+                retries=retries,
+            )
+
+        not_found = []
+        failed = []
+        candidates = []
+        for lookup in lookups:
+            if not lookup.ok:
+                failed.append(lookup)
+            elif not lookup.result:
+                not_found.append(lookup.item)
+            elif lookup.result[0].tvdbId in library:
+                existing.append(lookup.item)
+            else:
+                series = lookup.result[0]
+                library.add(series.tvdbId)
+                candidates.append(series)
+
+        def add(series: Series) -> Series:
+            return self.add_series(
+                series,
+                profileId,
+                ignoreEpisodesWithFiles=ignoreEpisodesWithFiles,
+                ignoreEpisodesWithoutFiles=ignoreEpisodesWithoutFiles,
+                searchForMissingEpisodes=searchForMissingEpisodes,
+                rootFolderPath=rootFolderPath,
+            )
+
+        with stopwatch(timings, "add"):
+            adds = map_concurrent(
+                add, candidates, max_workers=max_workers, retries=retries
+            )
+
+        failed.extend(result for result in adds if not result.ok)
+        return BulkAddReport(
+            added=tuple(result.result for result in adds if result.ok),
+            existing=tuple(existing),
+            not_found=tuple(not_found),
+            failed=tuple(failed),
+            timings=timings,
+        )
+
     def update_series(self, series: Series) -> Series:
         """Update an existing series.
         """
@@ -536,6 +837,30 @@ class SonarrClient(Client):
         result = self._request(f"series/{series.id}", method=HttpMethod.PUT, data=data)
         return Series.from_dict(result)
 
+    def bulk_update_series(
+        self,
+        transform: Callable[[Series], Series],
+        series: Optional[Iterable[Series]] = None,
+        max_workers: int = 8,
+        retries: int = 2,
+    ) -> BulkSummary[Series]:
+        """Apply ``transform`` to many series, and update the changed ones
+        concurrently.
+
+        If ``series`` isn't supplied, every series in the library is selected.
+        Series left unchanged by ``transform`` are skipped.
+        """
+        if series is None:
+            series = self.get_all_series()
+
+        return bulk_apply(
+            self.update_series,
+            transform,
+            series,
+            max_workers=max_workers,
+            retries=retries,
+        )
+
     def delete_series(self, seriesId: int, deleteFiles: bool = False) -> None:
         """Delete the series with the given ID.
         """
@@ -555,7 +880,7 @@ class SonarrClient(Client):
         """
         #  GET http://$HOST:8989/api/series/lookup?term=monty+python
         query = {"term": term.replace(" ", "+")}
-        results = self._request("series/lookup", query=query)
+        results = self._cached_request(self.lookup_cache, "series/lookup", query)
         return tuple(Series.from_dict(result) for result in results)
 
     #  https://github.com/Sonarr/Sonarr/wiki/System-Status
@@ -623,6 +948,79 @@ class SonarrClient(Client):
             msg = f"delete_tag() returned {result}"
             raise ArrClientError(msg)
 
+    def get_tag_index(self) -> TagIndex:
+        """Index all series in the library by tag.
+        """
+        return TagIndex(self.get_all_series(), self.get_tags())
+
+    def bulk_tag_series(
+        self,
+        tagIds: Iterable[int],
+        series: Optional[Iterable[Series]] = None,
+        index: Optional[TagIndex] = None,
+        max_workers: int = 8,
+        retries: int = 2,
+    ) -> BulkSummary[Series]:
+        """Add tags to many series, updating only series missing some of them.
+
+        If ``series`` isn't supplied, every series in ``index`` (or failing
+        that, the library) is selected.  If ``index`` is supplied, it's
+        updated with the series returned by the server.
+        """
+        add = tuple(tagIds)
+
+        def transform(series: Series) -> Series:
+            missing = tuple(tagId for tagId in add if tagId not in series.tags)
+            if not missing:
+                return series
+            return replace(series, tags=series.tags + tuple(dict.fromkeys(missing)))
+
+        return self._bulk_retag_series(transform, series, index, max_workers, retries)
+
+    def bulk_untag_series(
+        self,
+        tagIds: Iterable[int],
+        series: Optional[Iterable[Series]] = None,
+        index: Optional[TagIndex] = None,
+        max_workers: int = 8,
+        retries: int = 2,
+    ) -> BulkSummary[Series]:
+        """Remove tags from many series, updating only series carrying some
+        of them.
+
+        If ``series`` isn't supplied, every series in ``index`` (or failing
+        that, the library) is selected.  If ``index`` is supplied, it's
+        updated with the series returned by the server.
+        """
+        remove = frozenset(tagIds)
+
+        def transform(series: Series) -> Series:
+            if remove.isdisjoint(series.tags):
+                return series
+            tags = tuple(tagId for tagId in series.tags if tagId not in remove)
+            return replace(series, tags=tags)
+
+        return self._bulk_retag_series(transform, series, index, max_workers, retries)
+
+    def _bulk_retag_series(
+        self,
+        transform: Callable[[Series], Series],
+        series: Optional[Iterable[Series]],
+        index: Optional[TagIndex],
+        max_workers: int,
+        retries: int,
+    ) -> BulkSummary[Series]:
+        if series is None and index is not None:
+            series = index.series.values()
+
+        summary = self.bulk_update_series(
+            transform, series, max_workers=max_workers, retries=retries
+        )
+        if index is not None:
+            for result in summary.succeeded:
+                index.update(result.result)
+        return summary
+
     #  UNDOCUMENTED API
     #  GET http://$HOST:8989/api/blacklist?page=1&pageSize=15&sortKey=date&sortDir=desc
     #  GET http://$HOST:8989/api/health
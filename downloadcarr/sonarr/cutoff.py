@@ -0,0 +1,101 @@
+"""Local computation of episodes whose files don't meet their quality cutoff.
+
+An episode file meets the cutoff of its series' quality profile if its quality
+is at least as good as the cutoff quality, in profile order.  The ordinal of
+each quality is precomputed per profile as an array indexed by quality ID, so
+the whole library is evaluated with one comparison per episode file.
+"""
+import operator
+from array import array
+from dataclasses import dataclass
+from itertools import compress
+from typing import Dict, Iterable, Iterator, Tuple
+
+from downloadcarr.bulk import batched
+from .models import Episode, EpisodeFile, QualityAllowedProfile, Series
+from .ranking import QualityRanks
+
+
+@dataclass(frozen=True)
+class CutoffUnmet:
+    """Episodes with files below the cutoff of their quality profile.
+
+    ``evaluated`` is the number of episode files compared against a cutoff.
+    """
+
+    episodeIds: Tuple[int, ...]
+    evaluated: int
+
+    def __len__(self) -> int:
+        return len(self.episodeIds)
+
+    def batches(self, size: int = 50) -> Iterator[Tuple[int, ...]]:
+        """Episode IDs in batches of at most ``size``, e.g. for
+        SonarrClient.search_episodes().
+        """
+        return batched(self.episodeIds, size)
+
+
+class CutoffEngine:
+    """Evaluates quality cutoffs for a library against its quality profiles.
+    """
+
+    def __init__(self, profiles: Iterable[QualityAllowedProfile]):
+        self.ordinals: Dict[int, array] = {}
+        self.cutoffs: Dict[int, int] = {}
+        for profile in profiles:
+            ranks = QualityRanks.from_profile(profile)
+            table = array("h", [-1]) * (max(ranks.ordinals, default=0) + 1)
+            for qualityId, ordinal in ranks.ordinals.items():
+                table[qualityId] = ordinal
+            self.ordinals[profile.id] = table
+            self.cutoffs[profile.id] = ranks.cutoff
+
+    def ordinal(self, profileId: int, qualityId: int) -> int:
+        """Ordinal of a quality in a profile; -1 if not in the profile."""
+        table = self.ordinals[profileId]
+        return table[qualityId] if 0 <= qualityId < len(table) else -1
+
+    def evaluate(
+        self,
+        library: Iterable[Tuple[Series, Iterable[Episode], Iterable[EpisodeFile]]],
+        monitored_only: bool = True,
+    ) -> CutoffUnmet:
+        """Find episodes whose files don't meet the cutoff.
+
+        ``library`` yields each series with its episodes and episode files.
+        Unless ``monitored_only`` is False, unmonitored series and episodes
+        are ignored (as by Sonarr's own cutoff unmet list).
+        """
+        episodeIds = array("q")
+        qualities = array("h")
+        cutoffs = array("h")
+
+        for series, episodes, files in library:
+            if monitored_only and not series.monitored:
+                continue
+            profileId = series.qualityProfileId or series.profileId
+            if profileId not in self.ordinals:
+                msg = (
+                    f"evaluate(): {series.title} has unknown quality profile "
+                    f"{profileId}"
+                )
+                raise ValueError(msg)
+            cutoff = self.cutoffs[profileId]
+            file_qualities = {
+                file.id: self.ordinal(profileId, file.quality.quality.id)
+                for file in files
+            }
+            for episode in episodes:
+                if monitored_only and not episode.monitored:
+                    continue
+                quality = file_qualities.get(episode.episodeFileId)
+                if quality is None:
+                    # Missing, rather than below cutoff
+                    continue
+                episodeIds.append(episode.id)
+                qualities.append(quality)
+                cutoffs.append(cutoff)
+
+        unmet = compress(episodeIds, map(operator.lt, qualities, cutoffs))
+        return CutoffUnmet(episodeIds=tuple(unmet), evaluated=len(episodeIds))
@@ -0,0 +1,335 @@
+"""Local (offline) parser for scene-style TV release names.
+
+Most release names follow a handful of conventions, e.g.
+    Series.Title.S02E05.1080p.WEB-DL-GROUP
+    Series Title - 2x05 - Episode Title [HDTV-720p]
+    [Group] Series Title - 105 [1080p]
+
+which can be parsed with precompiled regexes far faster than a round trip to
+Sonarr's /parse endpoint.  The local parser reports a confidence score, so
+callers can fall back to the server for release names it isn't sure about.
+
+Unlike /parse, the local parser knows nothing about the library, so it can't
+match releases to a Series or Episodes.
+"""
+import re
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+from .models import (
+    ParsedEpisodeInfo,
+    ParseResult,
+    Quality,
+    QualityRevision,
+    Revision,
+    SeriesTitleInfo,
+)
+
+
+SEPARATORS = re.compile(r"[._ ]+")
+
+#  Season/episode numbering, e.g. S02E05, S02E05E06, S02E05-E06, S02E05-06, 2x05,
+#  S02 (full).  "-NN" isn't followed by p/i, not to take S02E05-720p for a range
+STANDARD = re.compile(
+    r"^(?P<title>.+?)[-._ ]+\(?"
+    r"S(?P<season>\d{1,2})"
+    r"(?P<episodes>E\d{1,3}(?:[-._ ]?E\d{1,3}|-\d{1,3}(?![pi]))*)(?![0-9])",
+    re.IGNORECASE,
+)
+CROSS = re.compile(
+    r"^(?P<title>.+?)[-._ ]+(?P<season>\d{1,2})x"
+    r"(?P<episodes>\d{2,3}(?:-?x?\d{2,3})*)(?![0-9])",
+    re.IGNORECASE,
+)
+FULL_SEASON = re.compile(
+    r"^(?P<title>.+?)[-._ ]+S(?P<season>\d{1,2})(?![0-9E])", re.IGNORECASE
+)
+#  Anime-style absolute numbering, e.g. "[Group] Series Title - 105 [1080p]"
+ABSOLUTE = re.compile(
+    r"^\[(?P<group>[^\]]+)\][-._ ]*(?P<title>.+?)[-._ ]+-[-._ ]+"
+    r"(?P<absolute>\d{2,4})(?:v\d)?(?![0-9])"
+)
+DAILY = re.compile(r"(?<![0-9])(?:19|20)\d{2}[-._ ]\d{2}[-._ ]\d{2}(?![0-9])")
+
+EPISODE_NUMBER = re.compile(r"\d{1,3}")
+YEAR = re.compile(r"^(?P<title>.+?) (?P<year>(?:19|20)\d{2})$")
+PARENTHESIZED_YEAR = re.compile(r"^(?P<title>.+?) ?\((?P<year>(?:19|20)\d{2})\)$")
+
+RESOLUTION = re.compile(
+    r"(?<![a-z0-9])"
+    r"(?:(?P<res>2160|1080|720|576|480)[pi]|(?P<uhd>4k|uhd))"
+    r"(?![a-z0-9])",
+    re.IGNORECASE,
+)
+SOURCE = re.compile(
+    r"(?<![a-z0-9])(?:"
+    r"(?P<rawhd>raw[-._ ]?hd)"
+    r"|(?P<bluray>blu[-._ ]?ray|bdrip|brrip|bd(?:25|50|remux))"
+    r"|(?P<web>web[-._ ]?dl|webrip|web|amzn|nf|hulu|dsnp|itunes)"
+    r"|(?P<television>hdtv|pdtv|sdtv|dsr|tvrip)"
+    r"|(?P<dvd>dvd(?:rip|r|9|5)?)"
+    r")(?![a-z0-9])",
+    re.IGNORECASE,
+)
+PROPER = re.compile(r"(?<![a-z0-9])(?:proper|repack|rerip)(?![a-z0-9])", re.IGNORECASE)
+REAL = re.compile(r"(?<![A-Za-z0-9])REAL(?![A-Za-z0-9])")
+#  File extensions of media, and of the files releases are downloaded with
+EXTENSIONS = r"\.(?:mkv|mp4|avi|m4v|wmv|ts|nzb|torrent)"
+RELEASE_GROUP = re.compile(
+    r"(?<!web)(?<!blu)-(?P<group>[a-z0-9]+)(?:\[[^\]]*\])?" f"(?:{EXTENSIONS})?$",
+    re.IGNORECASE,
+)
+RELEASE_HASH = re.compile(r"\[(?P<hash>[0-9A-F]{8})\]")
+EXTENSION = re.compile(f"{EXTENSIONS}$", re.IGNORECASE)
+
+
+def _quality(id: int, name: str, source: str, resolution: int) -> Quality:
+    return Quality(id=id, name=name, source=source, resolution=resolution)
+
+
+#  Sonarr quality definitions, keyed by (source, resolution)
+QUALITIES: Dict[Tuple[str, int], Quality] = {
+    ("television", 480): _quality(1, "SDTV", "television", 480),
+    ("dvd", 480): _quality(2, "DVD", "dvd", 480),
+    ("bluray", 480): _quality(2, "DVD", "dvd", 480),
+    ("web", 480): _quality(8, "WEBDL-480p", "web", 480),
+    ("television", 720): _quality(4, "HDTV-720p", "television", 720),
+    ("web", 720): _quality(5, "WEBDL-720p", "web", 720),
+    ("bluray", 720): _quality(6, "Bluray-720p", "bluray", 720),
+    ("television", 1080): _quality(9, "HDTV-1080p", "television", 1080),
+    ("televisionRaw", 1080): _quality(10, "Raw-HD", "televisionRaw", 1080),
+    ("web", 1080): _quality(3, "WEBDL-1080p", "web", 1080),
+    ("bluray", 1080): _quality(7, "Bluray-1080p", "bluray", 1080),
+    ("television", 2160): _quality(16, "HDTV-2160p", "television", 2160),
+    ("web", 2160): _quality(18, "WEBDL-2160p", "web", 2160),
+    ("bluray", 2160): _quality(19, "Bluray-2160p", "bluray", 2160),
+}
+UNKNOWN = _quality(0, "Unknown", "unknown", 0)
+
+#  Resolution assumed when a release names its source but not its resolution
+DEFAULT_RESOLUTIONS = {
+    "television": 480,
+    "dvd": 480,
+    "web": 480,
+    "bluray": 720,
+    "televisionRaw": 1080,
+}
+
+REVISIONS = {
+    (version, real): Revision(version=version, real=real)
+    for version in (1, 2)
+    for real in (0, 1)
+}
+
+
+@dataclass(frozen=True)
+class LocalParse:
+    """Result of parsing a release name locally.
+
+    ``confidence`` ranges from 0 (a guess) to 1 (every expected component of
+    the release name was recognized).
+    """
+
+    info: ParsedEpisodeInfo
+    confidence: float
+
+    def to_parse_result(self) -> ParseResult:
+        """Shape as returned by /parse for a release not matched to a series.
+        """
+        return ParseResult(
+            parsedEpisodeInfo=self.info, episodes=(), title=self.info.releaseTitle
+        )
+
+
+def parse_quality(title: str) -> Tuple[QualityRevision, bool, bool]:
+    """Parse source/resolution and proper/repack flags from a release name.
+
+    Returns the QualityRevision, and whether source & resolution were found.
+    """
+    match = SOURCE.search(title)
+    source = match.lastgroup if match else None
+    if source == "rawhd":
+        source = "televisionRaw"
+
+    match = RESOLUTION.search(title)
+    has_resolution = match is not None
+    resolution = None
+    if match:
+        resolution = 2160 if match.group("uhd") else int(match.group("res"))
+        if resolution == 576:
+            resolution = 480
+
+    if source is not None:
+        resolution = resolution or DEFAULT_RESOLUTIONS[source]
+        quality = QUALITIES.get((source, resolution), UNKNOWN)
+    elif resolution is not None:
+        # Like Sonarr, assume HDTV when only the resolution is given
+        quality = QUALITIES[("television", resolution)]
+    else:
+        quality = UNKNOWN
+
+    version = 2 if PROPER.search(title) else 1
+    real = 1 if REAL.search(title) else 0
+    revision = QualityRevision(
+        quality=quality, revision=REVISIONS[(version, real)], proper=version > 1
+    )
+    return revision, source is not None, has_resolution
+
+
+def parse_series_title(title: str) -> SeriesTitleInfo:
+    """Series title, and its year if any, e.g. "Archer 2009" or "Show (2019)".
+
+    A year in parentheses annotates the title rather than being part of it,
+    so is left out of the title.
+    """
+    title = SEPARATORS.sub(" ", title).strip(" -")
+    match = PARENTHESIZED_YEAR.match(title)
+    if match:
+        without_year = match.group("title").strip(" -")
+        return SeriesTitleInfo(
+            title=without_year,
+            titleWithoutYear=without_year,
+            year=int(match.group("year")),
+        )
+    match = YEAR.match(title)
+    if match:
+        without_year = match.group("title").strip(" -")
+        return SeriesTitleInfo(
+            title=title, titleWithoutYear=without_year, year=int(match.group("year"))
+        )
+    return SeriesTitleInfo(title=title, titleWithoutYear=title, year=0)
+
+
+def parse_release_title(title: str) -> Optional[LocalParse]:
+    """Parse a release name locally.
+
+    Returns None if the release name doesn't follow any known convention.
+    """
+    name = EXTENSION.sub("", title.strip())
+
+    season = 0
+    episodes: Tuple[int, ...] = ()
+    absolute: Tuple[int, ...] = ()
+    full_season = False
+    group = None
+    confidence = 0.5
+
+    match = STANDARD.match(name) or CROSS.match(name)
+    if match:
+        season = int(match.group("season"))
+        numbering = match.group("episodes")
+        episodes = tuple(int(n) for n in EPISODE_NUMBER.findall(numbering))
+        if len(episodes) == 2 and "-" in numbering:
+            # S01E01-E03 is a range, not a pair
+            episodes = tuple(range(episodes[0], episodes[1] + 1))
+    else:
+        match = ABSOLUTE.match(name)
+        if match:
+            absolute = (int(match.group("absolute")),)
+            group = match.group("group")
+        else:
+            match = FULL_SEASON.match(name)
+            if not match:
+                return None
+            season = int(match.group("season"))
+            full_season = True
+            # Season packs have more exotic naming conventions
+            confidence -= 0.2
+
+    series_title = match.group("title")
+    if DAILY.search(series_title):
+        # Daily shows need airdate matching; leave them to the server
+        return None
+
+    quality, has_source, has_resolution = parse_quality(name)
+    confidence += 0.2 * has_source + 0.15 * has_resolution
+
+    if group is None:
+        group_match = RELEASE_GROUP.search(name)
+        if group_match:
+            group = group_match.group("group")
+    if group is not None:
+        confidence += 0.15
+
+    hash_match = RELEASE_HASH.search(name)
+    title_info = parse_series_title(series_title)
+    if not title_info.title:
+        return None
+
+    info = ParsedEpisodeInfo(
+        releaseTitle=title,
+        seriesTitle=title_info.title,
+        seriesTitleInfo=title_info,
+        quality=quality,
+        seasonNumber=season,
+        episodeNumbers=episodes,
+        absoluteEpisodeNumbers=absolute,
+        language="english",
+        fullSeason=full_season,
+        special=season == 0 and not absolute,
+        releaseHash=hash_match.group("hash") if hash_match else "",
+        isDaily=False,
+        isAbsoluteNumbering=bool(absolute),
+        isPossibleSpecialEpisode=False,
+        releaseGroup=group,
+    )
+    return LocalParse(info=info, confidence=min(confidence, 1.0))
+
+
+@dataclass(frozen=True)
+class ParserBenchmark:
+    """Accuracy of the local parser relative to recorded /parse responses,
+    and its throughput.
+
+    ``accuracy`` maps each compared attribute of ParsedEpisodeInfo to the
+    fraction of recorded responses the local parser agreed with.
+    """
+
+    total: int
+    parsed: int
+    accuracy: Dict[str, float]
+    elapsed: float
+
+    @property
+    def rate(self) -> float:
+        """Release names parsed per second."""
+        if self.elapsed <= 0:
+            return 0.0
+        return self.total / self.elapsed
+
+
+BENCHMARK_FIELDS = {
+    "seriesTitle": lambda info: info.seriesTitle.casefold(),
+    "seasonNumber": lambda info: info.seasonNumber,
+    "episodeNumbers": lambda info: tuple(info.episodeNumbers),
+    "absoluteEpisodeNumbers": lambda info: tuple(info.absoluteEpisodeNumbers),
+    "quality": lambda info: info.quality.quality.id,
+    "proper": lambda info: (info.quality.revision or REVISIONS[(1, 0)]).version,
+    "releaseGroup": lambda info: (info.releaseGroup or "").casefold(),
+}
+
+
+def benchmark(recorded: Iterable[ParseResult]) -> ParserBenchmark:
+    """Compare the local parser against responses recorded from /parse.
+    """
+    expected = [result.parsedEpisodeInfo for result in recorded]
+
+    start = time.perf_counter()
+    parsed = [parse_release_title(info.releaseTitle) for info in expected]
+    elapsed = time.perf_counter() - start
+
+    agree = dict.fromkeys(BENCHMARK_FIELDS, 0)
+    for info, local in zip(expected, parsed):
+        if local is None:
+            continue
+        for attr, get in BENCHMARK_FIELDS.items():
+            agree[attr] += get(info) == get(local.info)
+
+    total = len(expected)
+    return ParserBenchmark(
+        total=total,
+        parsed=sum(local is not None for local in parsed),
+        accuracy={attr: n / total if total else 0.0 for attr, n in agree.items()},
+        elapsed=elapsed,
+    )
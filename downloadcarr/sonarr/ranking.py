@@ -0,0 +1,137 @@
+"""Local ranking of releases returned by /release.
+
+Sonarr's own release selection happens server-side, when it grabs a release.
+To choose among the releases returned by SonarrClient.get_release() instead,
+a ReleaseRanker scores each release with a tuple of integers, comparable in a
+single pass; the lookup tables it needs are built once per quality profile.
+"""
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Optional, Tuple
+
+from .models import QualityAllowedProfile, Release
+
+
+@dataclass(frozen=True)
+class QualityRanks:
+    """Ordinal of each quality in a quality profile.
+
+    Qualities are ordered as in ``QualityAllowedProfile.items``, from worst
+    to best; qualities missing from the profile have ordinal -1.
+    """
+
+    profileId: int
+    ordinals: Dict[int, int]
+    allowed: FrozenSet[int]
+    cutoff: int
+
+    @classmethod
+    def from_profile(cls, profile: QualityAllowedProfile) -> "QualityRanks":
+        ordinals = {item.quality.id: n for n, item in enumerate(profile.items)}
+        return cls(
+            profileId=profile.id,
+            ordinals=ordinals,
+            allowed=frozenset(
+                item.quality.id for item in profile.items if item.allowed
+            ),
+            cutoff=ordinals.get(profile.cutoff.id, -1),
+        )
+
+    def ordinal(self, qualityId: int) -> int:
+        return self.ordinals.get(qualityId, -1)
+
+    def meets_cutoff(self, qualityId: int) -> bool:
+        return self.ordinal(qualityId) >= self.cutoff
+
+
+#  Components of the key returned by ReleaseRanker.score(), most significant
+#  first.  Every component is an int; larger is better.
+RANK_KEY_FIELDS = (
+    "approved",
+    "allowed",
+    "quality",
+    "revision",
+    "preferredGroup",
+    "sizeInRange",
+    "resolution",
+    "age",
+)
+
+RankKey = Tuple[int, int, int, int, int, int, int, int]
+
+
+class ReleaseRanker:
+    """Scores releases for a quality profile.
+
+    Releases are ranked by, in order of significance:
+      - approval (no rejections) by Sonarr
+      - quality allowed by the profile
+      - quality, in profile order
+      - revision (proper/repack, then REAL)
+      - release group, in order of ``preferred_groups``
+      - size per minute within ``size_limits`` for the quality
+      - resolution
+      - age (newer is better)
+
+    ``size_limits`` maps quality IDs to (minimum, maximum) size in MB per
+    minute of ``runtime``; sizes are only checked if both are known.
+    """
+
+    def __init__(
+        self,
+        profile: QualityAllowedProfile,
+        preferred_groups: Iterable[str] = (),
+        runtime: Optional[int] = None,
+        size_limits: Optional[Mapping[int, Tuple[float, float]]] = None,
+    ):
+        self.ranks = QualityRanks.from_profile(profile)
+        groups = list(preferred_groups)
+        self.group_weights = {
+            group.casefold(): len(groups) - n for n, group in enumerate(groups)
+        }
+        self.runtime = runtime
+        self.size_limits = dict(size_limits or {})
+
+    def score(self, release: Release) -> RankKey:
+        """Sort key for ``release``; a higher key is a better release.
+        """
+        quality = release.quality
+        qualityId = quality.quality.id
+        revision = quality.revision
+        return (
+            int(release.approved and not release.rejections),
+            int(qualityId in self.ranks.allowed),
+            self.ranks.ordinal(qualityId),
+            revision.version * 2 + revision.real if revision else 2,
+            self.group_weights.get((release.releaseGroup or "").casefold(), 0),
+            int(self._size_in_range(release)),
+            quality.quality.resolution or 0,
+            -release.age,
+        )
+
+    def score_all(self, releases: Iterable[Release]) -> Tuple[RankKey, ...]:
+        return tuple(self.score(release) for release in releases)
+
+    def rank(self, releases: Iterable[Release]) -> List[Release]:
+        """Releases sorted best first."""
+        return sorted(releases, key=self.score, reverse=True)
+
+    def best(self, releases: Iterable[Release]) -> Optional[Release]:
+        """Best of ``releases`` (the first, in case of a tie), or None if
+        there are none.
+        """
+        best = None
+        best_key = None
+        for release in releases:
+            key = self.score(release)
+            if best_key is None or key > best_key:
+                best, best_key = release, key
+        return best
+
+    def _size_in_range(self, release: Release) -> bool:
+        limits = self.size_limits.get(release.quality.quality.id)
+        episodes = len(release.episodeNumbers)
+        if limits is None or not self.runtime or not episodes:
+            return True
+        minimum, maximum = limits
+        per_minute = release.size / 2 ** 20 / (self.runtime * episodes)
+        return minimum <= per_minute <= maximum
@@ -0,0 +1,140 @@
+"""Refreshing episodes only for series that changed.
+
+Fetching the episodes & episode files of every series costs two requests per
+series, but /series already returns a summary of each: episode & file counts,
+size on disk, airing dates, the last metadata sync, and statistics per season.
+An EpisodeRefresher compares these summaries with those seen on the previous
+refresh, and only fetches the episodes of series whose summary changed.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from downloadcarr.bulk import BulkItemResult, map_concurrent
+from downloadcarr.mirror import Mirror
+from .models import Episode, EpisodeFile, Series
+
+
+SUMMARY_FIELDS = (
+    "episodeCount",
+    "episodeFileCount",
+    "totalEpisodeCount",
+    "sizeOnDisk",
+    "lastInfoSync",
+    "previousAiring",
+    "nextAiring",
+)
+
+
+def summary(series: Series) -> Tuple[Any, ...]:
+    """Fields of a series that change when its episodes or files do."""
+    fields = tuple(getattr(series, name) for name in SUMMARY_FIELDS)
+    seasons = tuple((s.seasonNumber, s.statistics) for s in series.seasons)
+    return fields + (seasons,)
+
+
+def series_id(series: Series) -> int:
+    """ID of a series read from the server or a mirror, which always has one."""
+    assert series.id is not None, series
+    return series.id
+
+
+@dataclass(frozen=True)
+class Refresh:
+    """Outcome of EpisodeRefresher.refresh().
+
+    ``episodes`` & ``files`` hold what was fetched for each changed series,
+    by series ID.  Series whose fetch failed are in ``failed``, and are
+    retried on the next refresh.
+    """
+
+    series: Tuple[Series, ...]
+    changed: Tuple[int, ...]
+    removed: Tuple[int, ...]
+    episodes: Dict[int, Tuple[Episode, ...]]
+    files: Dict[int, Tuple[EpisodeFile, ...]]
+    failed: Tuple[BulkItemResult, ...] = ()
+
+
+class EpisodeRefresher:
+    """Keeps episodes & episode files of a SonarrClient's library current,
+    fetching them only for series whose summary changed.
+
+    If ``mirror`` is supplied, refreshed data is written there, and the
+    summaries of the series it already holds are taken as the last seen, so
+    a restart doesn't trigger a full sweep.
+    """
+
+    def __init__(
+        self,
+        client,
+        mirror: Optional[Mirror] = None,
+        max_workers: int = 8,
+        retries: int = 2,
+    ):
+        self.client = client
+        self.mirror = mirror
+        self.max_workers = max_workers
+        self.retries = retries
+        self.summaries: Dict[int, Tuple[Any, ...]] = {}
+        if mirror is not None:
+            self.summaries = {series_id(s): summary(s) for s in mirror.get_all_series()}
+
+    def changed(self, series: Iterable[Series]) -> Tuple[Series, ...]:
+        """Series whose summary differs from the last seen (or is new)."""
+        return tuple(
+            s for s in series if self.summaries.get(series_id(s)) != summary(s)
+        )
+
+    def refresh(self) -> Refresh:
+        """Fetch all series, then the episodes & files of those changed."""
+        series = self.client.get_all_series()
+        changed = self.changed(series)
+        changedIds = {series_id(s) for s in changed}
+        removed = tuple(sorted(self.summaries.keys() - {series_id(s) for s in series}))
+
+        def fetch(s: Series) -> Tuple[Tuple[Episode, ...], Tuple[EpisodeFile, ...]]:
+            seriesId = series_id(s)
+            return (
+                self.client.get_episodes(seriesId),
+                self.client.get_episode_files(seriesId),
+            )
+
+        results = map_concurrent(
+            fetch, changed, max_workers=self.max_workers, retries=self.retries
+        )
+        episodes: Dict[int, Tuple[Episode, ...]] = {}
+        files: Dict[int, Tuple[EpisodeFile, ...]] = {}
+        for result in results:
+            if result.ok:
+                seriesId = series_id(result.item)
+                episodes[seriesId], files[seriesId] = result.result
+        failed = tuple(result for result in results if not result.ok)
+
+        if self.mirror is not None:
+            with self.mirror.transaction():
+                self.mirror.delete_series(*removed)
+                #  Only store the summary of series whose episodes are current
+                self.mirror.upsert_series(
+                    s
+                    for s in series
+                    if series_id(s) in episodes or series_id(s) not in changedIds
+                )
+                for seriesId in episodes:
+                    self.mirror.replace_episodes(
+                        seriesId, episodes[seriesId], files[seriesId]
+                    )
+
+        for seriesId in removed:
+            del self.summaries[seriesId]
+        for s in changed:
+            if series_id(s) in episodes:
+                self.summaries[series_id(s)] = summary(s)
+
+        return Refresh(
+            series=series,
+            changed=tuple(series_id(s) for s in changed),
+            removed=removed,
+            episodes=episodes,
+            files=files,
+            failed=failed,
+        )
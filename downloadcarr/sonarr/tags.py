@@ -0,0 +1,116 @@
+"""Inverted index of Sonarr series by tag.
+
+Each tag maps to a bitset (a Python int) with bit N set if the series with ID
+N carries the tag, so queries combining several tags are a handful of
+big-integer operations rather than scans over the library.
+"""
+from typing import Dict, Iterable, Mapping, Optional, Tuple, Union
+
+from .models import Series, Tag
+
+
+TagRef = Union[int, str]
+
+
+def bitset(ids: Iterable[int]) -> int:
+    bits = 0
+    for id in ids:
+        bits |= 1 << id
+    return bits
+
+
+def members(bits: int) -> Tuple[int, ...]:
+    """IDs of the bits set in ``bits``, in ascending order."""
+    ids = []
+    while bits:
+        lowest = bits & -bits
+        ids.append(lowest.bit_length() - 1)
+        bits ^= lowest
+    return tuple(ids)
+
+
+class TagIndex:
+    """Index of series IDs by tag ID.
+
+    Tags may be referred to by ID, or by label if ``tags`` are supplied
+    (e.g. from SonarrClient.get_tags()).
+    """
+
+    def __init__(self, series: Iterable[Series], tags: Iterable[Tag] = ()):
+        self.series: Dict[int, Series] = {}
+        self.labels: Dict[str, int] = {tag.label.casefold(): tag.id for tag in tags}
+        self.universe = 0
+        self._bits: Dict[int, int] = {}
+        for s in series:
+            self.update(s)
+
+    def __len__(self) -> int:
+        return len(self.series)
+
+    def update(self, series: Series) -> None:
+        """Add ``series`` to the index, or reindex it if its tags changed.
+
+        Series without an ID (not yet added to Sonarr) are ignored.
+        """
+        if series.id is None:
+            return
+        bit = 1 << series.id
+        old = self.series.get(series.id)
+        if old is not None:
+            for tagId in old.tags:
+                self._bits[tagId] &= ~bit
+        for tagId in series.tags:
+            self._bits[tagId] = self._bits.get(tagId, 0) | bit
+        self.series[series.id] = series
+        self.universe |= bit
+
+    def remove(self, seriesId: int) -> None:
+        """Drop a series from the index, if present."""
+        old = self.series.pop(seriesId, None)
+        if old is None:
+            return
+        bit = 1 << seriesId
+        for tagId in old.tags:
+            self._bits[tagId] &= ~bit
+        self.universe &= ~bit
+
+    def tag_id(self, tag: TagRef) -> int:
+        if isinstance(tag, int):
+            return tag
+        try:
+            return self.labels[tag.casefold()]
+        except KeyError:
+            raise ValueError(f"tag_id(): unknown tag {tag!r}") from None
+
+    def bits(self, tag: TagRef) -> int:
+        """Bitset of the IDs of series carrying ``tag``."""
+        return self._bits.get(self.tag_id(tag), 0)
+
+    def counts(self) -> Mapping[int, int]:
+        """Number of series carrying each tag, by tag ID."""
+        return {tagId: bin(bits).count("1") for tagId, bits in self._bits.items()}
+
+    def query(
+        self,
+        all_of: Iterable[TagRef] = (),
+        any_of: Optional[Iterable[TagRef]] = None,
+        none_of: Iterable[TagRef] = (),
+    ) -> Tuple[int, ...]:
+        """IDs of series carrying every tag in ``all_of``, at least one tag in
+        ``any_of`` (if supplied), and no tag in ``none_of``.
+        """
+        bits = self.universe
+        for tag in all_of:
+            bits &= self.bits(tag)
+        if any_of is not None:
+            union = 0
+            for tag in any_of:
+                union |= self.bits(tag)
+            bits &= union
+        for tag in none_of:
+            bits &= ~self.bits(tag)
+        return members(bits)
+
+    def select(self, seriesIds: Iterable[int]) -> Tuple[Series, ...]:
+        """Series with the given IDs."""
+        return tuple(self.series[seriesId] for seriesId in seriesIds)
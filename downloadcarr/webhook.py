@@ -0,0 +1,327 @@
+"""Receiving Sonarr/Radarr Connect webhooks to keep local state current.
+
+Sonarr & Radarr can POST a JSON payload to a webhook on grab, import, rename,
+delete etc.  A WebhookReceiver is a small HTTP server accepting them, which
+decodes each payload into a WebhookEvent and passes it to a handler.
+
+Payloads only identify the series, episodes or movie concerned, so a
+WebhookSync handler refetches just those from the server, and applies them
+to a Mirror, a TagIndex and the client's calendar cache, instead of polling
+the whole library to notice changes.
+"""
+import base64
+import dataclasses
+import hmac
+import http.server
+import json
+import threading
+import urllib.parse
+from dataclasses import dataclass
+from datetime import date
+from typing import (
+    Any,
+    Callable,
+    Iterable,
+    Mapping,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    cast,
+)
+
+from .enums import WebhookEventType
+from .mirror import Mirror
+from .models import (
+    Base,
+    WebhookEpisode,
+    WebhookFile,
+    WebhookMovie,
+    WebhookRelease,
+    WebhookSeries,
+)
+from .radarr.client import movie_dates
+from .sonarr.client import episode_dates
+from .sonarr.models import Episode
+from .sonarr.tags import TagIndex
+
+
+B = TypeVar("B", bound=Base)
+
+
+#  Events after which a series' episodes or a movie's file may have changed
+FILE_EVENTS = (
+    WebhookEventType.DOWNLOAD,
+    WebhookEventType.RENAME,
+    WebhookEventType.SERIES_ADD,
+    WebhookEventType.EPISODE_FILE_DELETE,
+    WebhookEventType.MOVIE_ADDED,
+    WebhookEventType.MOVIE_FILE_DELETE,
+)
+
+
+def decode(cls: Type[B], data: Optional[Mapping[str, Any]]) -> Optional[B]:
+    """Decode a payload object into a model, ignoring attributes the model
+    doesn't define (which vary by server version).
+    """
+    if data is None:
+        return None
+    #  Models are all dataclasses, though Base itself isn't one
+    names = {field.name for field in dataclasses.fields(cast(Any, cls))}
+    return cls.from_dict({k: v for k, v in data.items() if k in names})
+
+
+@dataclass(frozen=True)
+class WebhookEvent:
+    """Decoded webhook payload of Sonarr (``series``, ``episodes``) or Radarr
+    (``movie``).
+
+    ``file`` is the episode/movie file imported, renamed or deleted.
+    ``payload`` is the JSON object as received.
+    """
+
+    eventType: WebhookEventType
+    series: Optional[WebhookSeries] = None
+    episodes: Tuple[WebhookEpisode, ...] = ()
+    movie: Optional[WebhookMovie] = None
+    release: Optional[WebhookRelease] = None
+    file: Optional[WebhookFile] = None
+    isUpgrade: bool = False
+    downloadId: Optional[str] = None
+    payload: Mapping[str, Any] = dataclasses.field(
+        default_factory=dict, compare=False, repr=False
+    )
+
+
+def parse_event(payload: Mapping[str, Any]) -> Optional[WebhookEvent]:
+    """Decode a webhook payload; None if its eventType isn't known."""
+    try:
+        eventType = WebhookEventType(payload["eventType"])
+    except ValueError:
+        return None
+
+    return WebhookEvent(
+        eventType=eventType,
+        series=decode(WebhookSeries, payload.get("series")),
+        episodes=tuple(
+            decode(WebhookEpisode, episode)  # type: ignore
+            for episode in payload.get("episodes") or ()
+        ),
+        movie=decode(WebhookMovie, payload.get("movie")),
+        release=decode(WebhookRelease, payload.get("release")),
+        file=decode(
+            WebhookFile, payload.get("episodeFile") or payload.get("movieFile")
+        ),
+        isUpgrade=payload.get("isUpgrade", False),
+        downloadId=payload.get("downloadId"),
+        payload=payload,
+    )
+
+
+class WebhookSync:
+    """Webhook handler applying events to local state.
+
+    On import, rename or file deletion, the series concerned is refetched with
+    its episodes & episode files (or the movie, with its file), and written to
+    ``mirror`` & ``tags`` if supplied; deleted series & movies are dropped
+    from them.  The days of the client's calendar cache holding the series'
+    episodes or the movie, before and after the change, are invalidated.
+    Grab, health & test events change nothing held locally.
+
+    ``client`` is a SonarrClient or RadarrClient, matching the server sending
+    the webhooks.  Events are applied one at a time.
+    """
+
+    def __init__(
+        self, client, mirror: Optional[Mirror] = None, tags: Optional[TagIndex] = None,
+    ):
+        self.client = client
+        self.mirror = mirror
+        self.tags = tags
+        self.applied = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, event: WebhookEvent) -> None:
+        self.apply(event)
+
+    def apply(self, event: WebhookEvent) -> None:
+        """Apply an event; one missing the series/movie it concerns is skipped.
+        """
+        series, movie = event.series, event.movie
+        with self._lock:
+            if event.eventType is WebhookEventType.SERIES_DELETE:
+                if series is None:
+                    return
+                self._delete_series(series.id)
+            elif event.eventType is WebhookEventType.MOVIE_DELETE:
+                if movie is None:
+                    return
+                self._delete_movie(movie.id)
+            elif event.eventType in FILE_EVENTS and series is not None:
+                self._refresh_series(series.id)
+            elif event.eventType in FILE_EVENTS and movie is not None:
+                self._refresh_movie(movie.id)
+            else:
+                return
+            self.applied += 1
+
+    def _refresh_series(self, seriesId: int) -> None:
+        series = self.client.get_series(seriesId)
+        if self.tags is not None:
+            self.tags.update(series)
+        episodes = ()
+        if self.mirror is not None or self.client.calendar_cache is not None:
+            episodes = self.client.get_episodes(seriesId)
+        if self.mirror is not None:
+            files = self.client.get_episode_files(seriesId)
+            with self.mirror.transaction():
+                self.mirror.upsert_series([series])
+                self.mirror.replace_episodes(seriesId, episodes, files)
+        self._invalidate_series(seriesId, episodes)
+
+    def _refresh_movie(self, movieId: int) -> None:
+        movie = self.client.get_movie(movieId)
+        if self.mirror is not None:
+            self.mirror.upsert_movies([movie])
+        self._invalidate_movie(movieId, movie_dates(movie))
+
+    def _delete_series(self, seriesId: int) -> None:
+        if self.tags is not None:
+            self.tags.remove(seriesId)
+        if self.mirror is not None:
+            self.mirror.delete_series(seriesId)
+        self._invalidate_series(seriesId)
+
+    def _delete_movie(self, movieId: int) -> None:
+        if self.mirror is not None:
+            self.mirror.delete_movies(movieId)
+        self._invalidate_movie(movieId)
+
+    def _invalidate_series(
+        self, seriesId: int, episodes: Iterable[Episode] = ()
+    ) -> None:
+        """Invalidate the calendar days of a series' episodes, as held and as
+        refetched (``episodes``).
+        """
+        cache = self.client.calendar_cache
+        if cache is not None:
+            days = [day for episode in episodes for day in episode_dates(episode)]
+            cache.invalidate(
+                lambda episode: episode.seriesId == seriesId, episode_dates, days
+            )
+
+    def _invalidate_movie(self, movieId: int, days: Iterable[date] = ()) -> None:
+        cache = self.client.calendar_cache
+        if cache is not None:
+            cache.invalidate(lambda movie: movie.id == movieId, movie_dates, days)
+
+
+class WebhookReceiver:
+    """HTTP server accepting webhook POSTs on ``path``, calling ``handler``
+    with each decoded event.
+
+    If ``username`` is supplied, requests must carry matching HTTP basic
+    authentication (as configured for the webhook in Sonarr/Radarr).
+    Events are handled on the server's request threads; if the handler
+    raises, the request is answered with status 500.
+
+    The server runs on a background thread between start() & stop() (or
+    within a ``with`` block).  ``port`` 0 picks a free port, available as
+    ``receiver.port`` once started.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[WebhookEvent], None],
+        host: str = "",
+        port: int = 0,
+        path: str = "/",
+        username: Optional[str] = None,
+        password: str = "",
+    ):
+        self.handler = handler
+        self.host = host
+        self.port = port
+        self.path = path
+        self.authorization: Optional[str] = None
+        if username is not None:
+            credentials = f"{username}:{password}".encode()
+            self.authorization = "Basic " + base64.b64encode(credentials).decode()
+        self.received = 0
+        self.errors = 0
+
+        self._lock = threading.Lock()
+        self._server: Optional[http.server.ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "WebhookReceiver":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        receiver = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                self.send_response(receiver.receive(self))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args) -> None:
+                pass
+
+        self._server = http.server.ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+        self._server = None
+        self._thread = None
+
+    def receive(self, request: http.server.BaseHTTPRequestHandler) -> int:
+        """Handle a webhook request, returning the HTTP status to answer."""
+        if urllib.parse.urlsplit(request.path).path != self.path:
+            return 404
+        if self.authorization is not None:
+            authorization = request.headers.get("Authorization") or ""
+            #  Constant-time comparison, not to leak the credentials by timing
+            if not hmac.compare_digest(
+                authorization.encode(), self.authorization.encode()
+            ):
+                return 401
+
+        length = int(request.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(request.rfile.read(length))
+            event = parse_event(payload)
+        except (ValueError, KeyError, TypeError):
+            return 400
+
+        with self._lock:
+            self.received += 1
+        if event is None:
+            return 200
+        try:
+            self.handler(event)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            return 500
+        return 200
@@ -0,0 +1,210 @@
+"""Minimal WebSocket client (RFC 6455) over stdlib sockets.
+
+Just enough for the SignalR feed of Sonarr/Radarr: text messages, with
+fragmentation, ping/pong & close handled; no extensions or subprotocols.
+"""
+import base64
+import hashlib
+import os
+import socket
+import ssl
+import struct
+import urllib.parse
+from typing import BinaryIO, Mapping, Optional, Tuple
+
+from .client import ArrConnectionError
+
+
+GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+
+class WebSocketClosed(ArrConnectionError):
+    pass
+
+
+def accept_key(key: str) -> str:
+    """Sec-WebSocket-Accept expected in response to Sec-WebSocket-Key."""
+    digest = hashlib.sha1((key + GUID).encode()).digest()
+    return base64.b64encode(digest).decode()
+
+
+def encode_frame(opcode: int, payload: bytes, mask: bool = True) -> bytes:
+    """Encode a single final frame.  Clients must mask their frames; servers
+    must not.
+    """
+    header = bytearray([0x80 | opcode])
+    length = len(payload)
+    mask_bit = 0x80 if mask else 0
+    if length < 126:
+        header.append(mask_bit | length)
+    elif length < 1 << 16:
+        header.append(mask_bit | 126)
+        header += struct.pack("!H", length)
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack("!Q", length)
+    if mask:
+        key = os.urandom(4)
+        header += key
+        payload = bytes(b ^ key[i % 4] for i, b in enumerate(payload))
+    return bytes(header) + payload
+
+
+def read_exactly(stream: BinaryIO, size: int) -> bytes:
+    data = stream.read(size)
+    if len(data) < size:
+        raise WebSocketClosed("read_exactly()", "Connection closed")
+    return data
+
+
+def read_frame(stream: BinaryIO) -> Tuple[bool, int, bytes]:
+    """Read a frame, returning (final, opcode, unmasked payload)."""
+    first, second = read_exactly(stream, 2)
+    length = second & 0x7F
+    if length == 126:
+        (length,) = struct.unpack("!H", read_exactly(stream, 2))
+    elif length == 127:
+        (length,) = struct.unpack("!Q", read_exactly(stream, 8))
+    key = read_exactly(stream, 4) if second & 0x80 else None
+    payload = read_exactly(stream, length)
+    if key is not None:
+        payload = bytes(b ^ key[i % 4] for i, b in enumerate(payload))
+    return bool(first & 0x80), first & 0x0F, payload
+
+
+class WebSocket:
+    """Client connection to a ``ws://`` or ``wss://`` URL."""
+
+    def __init__(
+        self,
+        url: str,
+        headers: Optional[Mapping[str, str]] = None,
+        timeout: Optional[float] = 30.0,
+        verify_ssl: bool = True,
+    ):
+        self.url = url
+        parsed = urllib.parse.urlsplit(url)
+        tls = parsed.scheme == "wss"
+        host = parsed.hostname or "localhost"
+        port = parsed.port or (443 if tls else 80)
+        target = parsed.path or "/"
+        if parsed.query:
+            target += "?" + parsed.query
+
+        try:
+            sock = socket.create_connection((host, port), timeout=timeout)
+            if tls:
+                if verify_ssl:
+                    context = ssl.create_default_context()
+                else:
+                    context = ssl._create_unverified_context()
+                sock = context.wrap_socket(sock, server_hostname=host)
+        except OSError as err:
+            raise ArrConnectionError(url, str(err))
+        self._sock = sock
+        self._stream = sock.makefile("rb")
+        self.closed = False
+        try:
+            self._handshake(f"{host}:{port}", target, headers or {})
+        except socket.timeout:
+            self.close()
+            raise ArrConnectionError(url, "Timeout")
+        except OSError as err:
+            self.close()
+            raise ArrConnectionError(url, str(err))
+
+    def _handshake(self, host: str, target: str, headers: Mapping[str, str]) -> None:
+        key = base64.b64encode(os.urandom(16)).decode()
+        lines = [
+            f"GET {target} HTTP/1.1",
+            f"Host: {host}",
+            "Upgrade: websocket",
+            "Connection: Upgrade",
+            f"Sec-WebSocket-Key: {key}",
+            "Sec-WebSocket-Version: 13",
+        ]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        self._sock.sendall(("\r\n".join(lines) + "\r\n\r\n").encode())
+
+        status = self._stream.readline().decode("latin-1")
+        response = {}
+        while True:
+            line = self._stream.readline().decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            response[name.strip().lower()] = value.strip()
+
+        if status.split()[1:2] != ["101"]:
+            self.close()
+            raise ArrConnectionError(self.url, f"Handshake failed: {status.strip()}")
+        if response.get("sec-websocket-accept") != accept_key(key):
+            self.close()
+            raise ArrConnectionError(self.url, "Handshake failed: bad accept key")
+
+    def __enter__(self) -> "WebSocket":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def send(self, text: str) -> None:
+        self._send(OP_TEXT, text.encode())
+
+    def _send(self, opcode: int, payload: bytes) -> None:
+        try:
+            self._sock.sendall(encode_frame(opcode, payload))
+        except OSError as err:
+            raise WebSocketClosed(self.url, str(err))
+
+    def recv(self) -> str:
+        """Next text message, answering pings meanwhile.
+
+        Raises WebSocketClosed once the connection is closed (by either end),
+        or if no frame arrives within the timeout, after which the connection
+        is unusable.
+        """
+        fragments = []
+        while True:
+            try:
+                final, opcode, payload = read_frame(self._stream)
+            except socket.timeout:
+                self.close()
+                raise WebSocketClosed(self.url, "Timeout")
+            except (OSError, ValueError, WebSocketClosed):
+                #  ValueError: the stream was closed by another thread
+                self.close()
+                raise WebSocketClosed(self.url, "Connection closed")
+            if opcode == OP_PING:
+                self._send(OP_PONG, payload)
+            elif opcode == OP_PONG:
+                pass
+            elif opcode == OP_CLOSE:
+                self.close()
+                raise WebSocketClosed(self.url, "Closed by server")
+            else:
+                fragments.append(payload)
+                if final:
+                    return b"".join(fragments).decode()
+
+    def close(self) -> None:
+        """Close the connection; safe to call from another thread, to
+        interrupt recv().
+        """
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._sock.sendall(encode_frame(OP_CLOSE, struct.pack("!H", 1000)))
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._stream.close()
+        self._sock.close()
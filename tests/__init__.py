@@ -1,6 +1,7 @@
 """
 """
 import http.server
+import json
 import socket
 import threading
 from urllib.parse import urlparse, parse_qs
@@ -248,3 +249,201 @@ def mock_error_server(
     yield server
     server.shutdown()
     server.server_close()
+
+
+def make_mock_routes_server(routes: dict, host: str = "localhost", port: int = 0):
+    """Create a threaded HTTP server that responds on several URIs at once.
+
+    ``routes`` maps (``HttpMethod``, path) to either a response body, or a
+    callable taking (query dict, request body bytes) and returning the
+    response body.  A callable may instead return an int, which is sent as
+    an HTTP error code.
+
+    Every request received is recorded in ``server.requests`` as a tuple of
+    (method name, path, query dict, request body bytes).
+    """
+
+    def do_http_response(self):
+        parsed_uri = urlparse(self.path)
+        query = parse_qs(parsed_uri.query)
+        length = int(self.headers.get("content-length") or 0)
+        data = self.rfile.read(length) if length else b""
+        self.server.requests.append((self.command, parsed_uri.path, query, data))
+
+        route = self.routes.get((HttpMethod[self.command], parsed_uri.path))
+        if route is None:
+            self.send_error(404)
+            return
+
+        body = route(query, data) if callable(route) else route
+        if isinstance(body, int):
+            self.send_error(body)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-type", "application/json")
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    MockRequestHandler = type(
+        "MockRequestHandler",
+        (http.server.BaseHTTPRequestHandler,),
+        {
+            "routes": routes,
+            "_do": do_http_response,
+            "do_GET": lambda self: self._do(),
+            "do_POST": lambda self: self._do(),
+            "do_PUT": lambda self: self._do(),
+            "do_DELETE": lambda self: self._do(),
+            "log_message": lambda self, *args: None,
+        },
+    )
+
+    server = http.server.ThreadingHTTPServer((host, port), MockRequestHandler)
+    server.requests = []  # type: ignore
+    return server
+
+
+def mock_routes_server(routes: dict, host: str = "localhost", port: int = 0):
+    server = make_mock_routes_server(routes, host=host, port=port)
+
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True  # stop Python from biting ctrl-C
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_mock_signalr_server(routes: dict, host: str = "localhost", port: int = 0):
+    """Create a routes server (see ``make_mock_routes_server()``) that also
+    stands in for the SignalR feed of Sonarr/Radarr at /signalr/messages.
+
+    Negotiation is answered with connection token "token", and websocket
+    clients completing the SignalR handshake are held open.  Messages are
+    sent to all of them with ``server.send(text)`` (bytes are sent as is), or
+    ``server.push(name, action, resource)`` for a resource change, and
+    ``server.drop()`` disconnects them.  ``server.wait_clients(n)`` waits
+    until ``n`` clients have connected since the server started.  Text
+    messages received from clients are recorded in ``server.received``.
+    """
+    from downloadcarr import websocket
+
+    routes = dict(routes)
+    routes[(HttpMethod.POST, "/signalr/messages/negotiate")] = json.dumps(
+        {
+            "negotiateVersion": 1,
+            "connectionId": "id",
+            "connectionToken": "token",
+            "availableTransports": [
+                {"transport": "WebSockets", "transferFormats": ["Text", "Binary"]}
+            ],
+        }
+    )
+    server = make_mock_routes_server(routes, host=host, port=port)
+    server.received = []  # type: ignore
+    server.clients = []  # type: ignore
+    server.connections = 0  # type: ignore
+    condition = threading.Condition()
+    handler_class = server.RequestHandlerClass
+
+    def do_GET(self):
+        if self.headers.get("Upgrade", "").lower() != "websocket":
+            return self._do()
+        parsed_uri = urlparse(self.path)
+        query = parse_qs(parsed_uri.query)
+        self.server.requests.append(("GET", parsed_uri.path, query, b""))
+        if parsed_uri.path != "/signalr/messages" or query.get("id") != ["token"]:
+            self.send_error(404)
+            return
+
+        key = self.headers["Sec-WebSocket-Key"]
+        self.send_response(101)
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", websocket.accept_key(key))
+        self.end_headers()
+        self.wfile.flush()
+        self.close_connection = True
+
+        while True:
+            try:
+                final, opcode, payload = websocket.read_frame(self.rfile)
+            except (OSError, websocket.WebSocketClosed):
+                break
+            if opcode == websocket.OP_CLOSE:
+                break
+            text = payload.decode()
+            with condition:
+                server.received.append(text)
+            if '"protocol"' in text:
+                #  SignalR handshake; the client may be sent messages as soon
+                #  as it is answered
+                with condition:
+                    server.clients.append(self)
+                send_frame(self, "{}\x1e")
+                with condition:
+                    server.connections += 1
+                    condition.notify_all()
+        with condition:
+            if self in server.clients:
+                server.clients.remove(self)
+
+    def send_frame(handler, text):
+        payload = text if isinstance(text, bytes) else text.encode()
+        frame = websocket.encode_frame(websocket.OP_TEXT, payload, mask=False)
+        try:
+            handler.connection.sendall(frame)
+        except OSError:
+            pass
+
+    def send(text):
+        with condition:
+            clients = list(server.clients)
+        for handler in clients:
+            send_frame(handler, text)
+
+    def push(name, action, resource=None):
+        body = {"action": action}
+        if resource is not None:
+            body["resource"] = resource
+        message = {
+            "type": 1,
+            "target": "receiveMessage",
+            "arguments": [{"name": name, "body": body}],
+        }
+        send(json.dumps(message) + "\x1e")
+
+    def drop():
+        with condition:
+            clients = list(server.clients)
+            server.clients.clear()
+        for handler in clients:
+            try:
+                handler.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def wait_clients(count, timeout=5):
+        with condition:
+            return condition.wait_for(lambda: server.connections >= count, timeout)
+
+    handler_class.do_GET = do_GET
+    server.daemon_threads = True
+    server.send = send  # type: ignore
+    server.push = push  # type: ignore
+    server.drop = drop  # type: ignore
+    server.wait_clients = wait_clients  # type: ignore
+    return server
+
+
+def mock_signalr_server(routes: dict, host: str = "localhost", port: int = 0):
+    server = make_mock_signalr_server(routes, host=host, port=port)
+
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True  # stop Python from biting ctrl-C
+    thread.start()
+    yield server
+    server.drop()
+    server.shutdown()
+    server.server_close()
@@ -4,7 +4,7 @@ from pathlib import Path
 
 from downloadcarr.radarr import RadarrClient
 
-from .. import mock_server
+from .. import mock_server, mock_routes_server, ROOTFOLDER
 
 
 CLIENT = RadarrClient("localhost", "MYKEY")
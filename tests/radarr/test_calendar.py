@@ -4,12 +4,16 @@ https://github.com/Radarr/Radarr/wiki/API:Calendar
 """
 from datetime import date
 from dataclasses import replace
+import json
 
 import pytest
 
 from downloadcarr.radarr import models
+from downloadcarr.radarr.client import movie_dates
+from downloadcarr.calendar import CalendarCache
+from downloadcarr.enums import HttpMethod
 
-from . import CALENDAR, mock_server, CLIENT
+from . import CALENDAR, mock_server, mock_routes_server, CLIENT
 
 
 @pytest.fixture
@@ -46,3 +50,35 @@ def test_get_calendar_params(calendar_server_params):
     assert isinstance(response, tuple)
     assert len(response) == 1
     assert isinstance(response[0], models.Movie)
+
+
+@pytest.fixture
+def calendar_routes_server():
+    yield from mock_routes_server({(HttpMethod.GET, "/api/calendar"): CALENDAR})
+
+
+def test_get_calendar_cached(calendar_routes_server):
+    """RadarrClient.get_calendar() with a CalendarCache only fetches dates it
+    doesn't hold, and returns a movie released on several dates once.
+    """
+    client = replace(
+        CLIENT, port=calendar_routes_server.server_port, calendar_cache=CalendarCache(),
+    )
+    #  In cinemas 2017-01-25, physical release 2017-01-27
+    response = client.get_calendar(date(2017, 1, 26), date(2017, 2, 1))
+    assert [movie.id for movie in response] == [12]
+    response = client.get_calendar(date(2017, 1, 20), date(2017, 2, 1))
+    assert [movie.id for movie in response] == [12]
+    assert isinstance(response[0], models.Movie)
+
+    queries = [query for _, _, query, _ in calendar_routes_server.requests]
+    assert queries == [
+        {"start": ["2017-01-26"], "end": ["2017-02-01"]},
+        {"start": ["2017-01-20"], "end": ["2017-01-26"]},
+    ]
+
+
+def test_movie_dates() -> None:
+    movie = models.Movie.from_dict(json.loads(CALENDAR)[0])
+    assert movie_dates(movie) == (date(2017, 1, 25), date(2017, 1, 27))
+    assert movie_dates(replace(movie, inCinemas=None)) == (date(2017, 1, 27),)
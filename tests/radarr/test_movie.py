@@ -14,6 +14,7 @@ import downloadcarr.radarr.models as models
 from downloadcarr.enums import HttpMethod
 from downloadcarr.utils import UTC
 from downloadcarr.client import ArrClientError
+from downloadcarr.radarr.client import movie_key
 
 from . import (
     CALENDAR,
@@ -23,7 +24,9 @@ from . import (
     MOVIELOOKUP,
     HISTORY,
     QUEUE,
+    ROOTFOLDER,
     mock_server,
+    mock_routes_server,
     CLIENT,
 )
 
@@ -682,3 +685,115 @@ def test_lookup_movie_imdb(lookup_movie_imdb_server):
     assert isinstance(response, tuple)
     assert len(response) == 1
     assert isinstance(response[0], models.Movie)
+
+
+@pytest.fixture
+def bulk_update_movies_server():
+    def echo(query, body):
+        return body.decode()
+
+    routes = {(HttpMethod.PUT, f"/api/movie/{movieId}"): echo for movieId in range(6)}
+    yield from mock_routes_server(routes)
+
+
+def test_bulk_update_movies(bulk_update_movies_server):
+    """Test RadarrClient.bulk_update_movies()
+    """
+    client = replace(CLIENT, port=bulk_update_movies_server.server_port)
+    original = models.Movie.from_dict(json.loads(MOVIES)[0])
+    movies = [replace(original, id=i, monitored=bool(i % 3)) for i in range(6)]
+
+    summary = client.bulk_update_movies(lambda m: replace(m, monitored=False), movies)
+    assert [r.item.id for r in summary.succeeded] == [1, 2, 4, 5]
+    assert [r.item.id for r in summary.skipped] == [0, 3]
+    for result in summary.succeeded:
+        assert isinstance(result.result, models.Movie)
+        assert result.result.monitored is False
+    assert summary.requests == 4
+
+
+def test_movie_key() -> None:
+    """Test normalization of IDs for RadarrClient.import_movies()"""
+    assert movie_key(121856) == "tmdb:121856"
+    assert movie_key("121856") == "tmdb:121856"
+    assert movie_key("tmdb:121856") == "tmdb:121856"
+    assert movie_key("tt2094766") == "imdb:tt2094766"
+    assert movie_key("imdb:tt2094766") == "imdb:tt2094766"
+    with pytest.raises(ValueError):
+        movie_key("Assassin's Creed")
+    with pytest.raises(ValueError):
+        movie_key("imdb:121856")
+
+
+@pytest.fixture
+def import_movies_server():
+    failing = {"7"}
+
+    def lookup(query, body):
+        if "imdbId" in query:
+            tmdbId = 1000
+        else:
+            tmdbId = query["tmdbId"][0]
+            if tmdbId in failing:
+                return 503
+            if tmdbId == "999":
+                return "[]"
+
+        movies = json.loads(MOVIELOOKUP)
+        movies[0]["tmdbId"] = int(tmdbId)
+        return json.dumps(movies)
+
+    routes = {
+        (HttpMethod.GET, "/api/movie"): MOVIES,
+        (HttpMethod.GET, "/api/movie/lookup"): lookup,
+        (HttpMethod.GET, "/api/rootfolder"): ROOTFOLDER,
+        (HttpMethod.POST, "/api/movie"): MOVIEPOST,
+    }
+    for server in mock_routes_server(routes):
+        server.failing = failing
+        yield server
+
+
+def test_import_movies(import_movies_server, tmp_path):
+    """Test RadarrClient.import_movies(), resuming from checkpoint
+    """
+    client = replace(CLIENT, port=import_movies_server.server_port)
+    checkpoint = str(tmp_path / "checkpoint")
+    ids = [121856, "tt2094766", 5, "6", "tmdb:5", 999, 7, "bogus", "tt0000001"]
+
+    report = client.import_movies(
+        ids, 1, 1, checkpoint=checkpoint, batch_size=3, rate=1000, retries=0
+    )
+    assert report.existing == ("tmdb:121856", "imdb:tt2094766")
+    assert report.not_found == ("tmdb:999",)
+    assert len(report.added) == 3
+    for movie in report.added:
+        assert isinstance(movie, models.Movie)
+    assert [result.item for result in report.failed] == ["bogus", "tmdb:7"]
+    assert isinstance(report.failed[0].error, ValueError)
+    assert report.resumed == ()
+    assert set(report.timings) == {"prepare", "lookup", "add", "checkpoint"}
+
+    with open(checkpoint) as f:
+        assert sorted(f.read().split()) == [
+            "imdb:tt0000001",
+            "imdb:tt2094766",
+            "tmdb:121856",
+            "tmdb:5",
+            "tmdb:6",
+            "tmdb:999",
+        ]
+
+    # Resume after fixing the failure
+    import_movies_server.failing.clear()
+    import_movies_server.requests.clear()
+    report = client.import_movies(ids, 1, 1, checkpoint=checkpoint)
+    assert len(report.added) == 1
+    assert [result.item for result in report.failed] == ["bogus"]
+    assert len(report.resumed) == 6
+    lookups = [
+        query
+        for method, path, query, data in import_movies_server.requests
+        if path == "/api/movie/lookup"
+    ]
+    assert lookups == [{"tmdbId": ["7"]}]
@@ -0,0 +1,75 @@
+"""Tests for movie file change detection, downloadcarr.radarr.refresh
+"""
+import json
+from dataclasses import replace
+
+from downloadcarr.radarr.refresh import FileChanges, MovieFileTracker, fingerprint
+import downloadcarr.radarr.models as models
+
+from . import MOVIES, QUEUE
+
+
+MOVIE_ = replace(models.Movie.from_dict(json.loads(MOVIES)[0]), id=50)
+#  Movie with a file
+FILED_ = models.QueueItem.from_dict(json.loads(QUEUE)[0]).movie
+
+
+def movie(movieId, **kwargs):
+    """FILED_ with another ID, and file attributes replaced by ``kwargs``"""
+    file = replace(FILED_.movieFile, **kwargs)
+    return replace(FILED_, id=movieId, movieFile=file)
+
+
+def test_fingerprint() -> None:
+    assert fingerprint(MOVIE_) is None
+    assert fingerprint(FILED_) == (
+        4,
+        2948099499,
+        "2019-08-16T08:52:55.490036+00:00",
+        3,
+        1,
+        0,
+    )
+    assert fingerprint(movie(1, size=1)) != fingerprint(FILED_)
+
+
+def test_scan() -> None:
+    with MovieFileTracker() as tracker:
+        changes = tracker.scan([movie(1), movie(2), MOVIE_])
+        assert [m.id for m in changes.added] == [1, 2]
+        assert changes.changed == ()
+        assert changes.unchanged == 1
+        assert list(tracker.fingerprints()) == [1, 2]
+
+        changes = tracker.scan([movie(1), movie(2), MOVIE_])
+        assert not changes
+        assert changes == FileChanges(unchanged=3)
+
+        #  Upgraded file, deleted file, deleted movie, new movie
+        upgraded = movie(1, id=99)
+        changes = tracker.scan([upgraded, replace(MOVIE_, id=2), movie(3)])
+        assert changes.changed == (upgraded,)
+        assert [m.id for m in changes.movies] == [3, 1]
+        assert changes.removed == (2,)
+        assert sorted(tracker.fingerprints()) == [1, 3]
+        assert tracker.fingerprints()[1][0] == 99
+
+
+def test_changes_update() -> None:
+    """changes() stores nothing until update()"""
+    with MovieFileTracker() as tracker:
+        changes = tracker.changes([movie(1), movie(2)])
+        assert len(changes.movies) == 2
+        assert tracker.fingerprints() == {}
+
+        tracker.update(changes.movies[:1])
+        assert [m.id for m in tracker.changes([movie(1), movie(2)]).added] == [2]
+
+
+def test_persisted(tmp_path) -> None:
+    path = str(tmp_path / "fingerprints.db")
+    with MovieFileTracker(path) as tracker:
+        tracker.scan([movie(1)])
+    with MovieFileTracker(path) as tracker:
+        assert not tracker.scan([movie(1)])
+        assert tracker.scan([movie(1, size=5)]).changed
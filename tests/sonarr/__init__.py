@@ -7,6 +7,7 @@ from downloadcarr.sonarr import SonarrClient
 from .. import (
     mock_server,
     mock_error_server,
+    mock_routes_server,
     COMMANDS,
     COMMAND,
     DISKSPACE,
@@ -3,11 +3,16 @@
 https://github.com/Sonarr/Sonarr/wiki/Calendar
 """
 from dataclasses import replace
+from datetime import date
+import json
 
 import pytest
 
-from . import CALENDAR, mock_server, CLIENT
+from . import CALENDAR, mock_server, mock_routes_server, CLIENT
 from downloadcarr.sonarr import models
+from downloadcarr.sonarr.client import episode_dates
+from downloadcarr.calendar import CalendarCache
+from downloadcarr.enums import HttpMethod
 
 
 @pytest.fixture
@@ -26,3 +31,42 @@ def test_get_calendar(calendar_server):
     assert isinstance(response, tuple)
     assert len(response) == 1
     assert isinstance(response[0], models.Episode)
+
+
+@pytest.fixture
+def calendar_routes_server():
+    yield from mock_routes_server({(HttpMethod.GET, "/api/calendar"): CALENDAR})
+
+
+def test_get_calendar_cached(calendar_routes_server):
+    """SonarrClient.get_calendar() with a CalendarCache only fetches dates it
+    doesn't hold.
+    """
+    client = replace(
+        CLIENT, port=calendar_routes_server.server_port, calendar_cache=CalendarCache(),
+    )
+    #  Episode airs 2014-01-27 UTC
+    response = client.get_calendar(date(2014, 1, 20), date(2014, 1, 28))
+    assert len(response) == 1
+    assert isinstance(response[0], models.Episode)
+
+    assert client.get_calendar(date(2014, 1, 24), date(2014, 1, 27)) == ()
+    response = client.get_calendar(date(2014, 1, 27), date(2014, 2, 3))
+    assert [episode.id for episode in response] == [14402]
+
+    queries = [query for _, _, query, _ in calendar_routes_server.requests]
+    assert queries == [
+        {"start": ["2014-01-20"], "end": ["2014-01-28"]},
+        {"start": ["2014-01-28"], "end": ["2014-02-03"]},
+    ]
+
+    #  Without both start & end, the cache isn't used
+    client.get_calendar()
+    assert len(calendar_routes_server.requests) == 3
+
+
+def test_episode_dates() -> None:
+    episode = models.Episode.from_dict(json.loads(CALENDAR)[0])
+    assert episode_dates(episode) == (date(2014, 1, 27),)
+    assert episode_dates(replace(episode, airDateUtc=None)) == (date(2014, 1, 26),)
+    assert episode_dates(replace(episode, airDateUtc=None, airDate=None)) == ()
@@ -0,0 +1,160 @@
+"""Tests for local cutoff unmet computation, downloadcarr.sonarr.cutoff
+"""
+import json
+from dataclasses import replace
+
+import pytest
+
+import downloadcarr.sonarr.models as models
+from downloadcarr.sonarr.cutoff import CutoffEngine, CutoffUnmet
+from downloadcarr.enums import HttpMethod
+
+from . import (
+    ALLSERIES,
+    EPISODES,
+    EPISODEFILES,
+    PROFILE,
+    COMMAND,
+    CLIENT,
+    mock_routes_server,
+)
+
+
+PROFILES = tuple(
+    models.QualityAllowedProfile.from_dict(profile) for profile in json.loads(PROFILE)
+)
+SERIES_ = models.Series.from_dict(json.loads(ALLSERIES)[0])
+EPISODE_ = models.Episode.from_dict(json.loads(EPISODES)[0])
+EPISODEFILE_ = models.EpisodeFile.from_dict(json.loads(EPISODEFILES)[0])
+
+
+def make_file(id, qualityId) -> models.EpisodeFile:
+    quality = models.QualityRevision(quality=models.Quality(id=qualityId))
+    return replace(EPISODEFILE_, id=id, quality=quality)
+
+
+def make_library():
+    #  HD 720p profile; cutoff is HDTV-720p
+    hd = replace(SERIES_, id=1, qualityProfileId=2)
+    hd_files = (
+        make_file(10, 1),  # SDTV
+        make_file(11, 6),  # Bluray-720p
+        make_file(12, 4),  # HDTV-720p
+        make_file(13, 99),  # Not in profile
+    )
+    hd_episodes = (
+        replace(EPISODE_, id=100, episodeFileId=10),
+        replace(EPISODE_, id=101, episodeFileId=11),
+        replace(EPISODE_, id=102, episodeFileId=12),
+        replace(EPISODE_, id=103, episodeFileId=13),
+        replace(EPISODE_, id=104, episodeFileId=0),  # Missing
+        replace(EPISODE_, id=105, episodeFileId=10, monitored=False),
+    )
+    #  SD profile; cutoff is SDTV
+    sd = replace(SERIES_, id=2, qualityProfileId=1)
+    sd_files = (make_file(20, 1),)
+    sd_episodes = (replace(EPISODE_, id=200, episodeFileId=20),)
+    #  Unmonitored series
+    off = replace(SERIES_, id=3, qualityProfileId=2, monitored=False)
+    off_episodes = (replace(EPISODE_, id=300, episodeFileId=10),)
+
+    return [
+        (hd, hd_episodes, hd_files),
+        (sd, sd_episodes, sd_files),
+        (off, off_episodes, hd_files),
+    ]
+
+
+def test_ordinal() -> None:
+    engine = CutoffEngine(PROFILES)
+    assert set(engine.ordinals) == {1, 2, 3, 4}
+    assert engine.cutoffs == {1: 0, 2: 3, 3: 4, 4: 3}
+    assert engine.ordinal(2, 1) == 0
+    assert engine.ordinal(2, 7) == 9
+    assert engine.ordinal(2, 99) == -1
+    assert engine.ordinal(2, -1) == -1
+
+
+def test_evaluate() -> None:
+    engine = CutoffEngine(PROFILES)
+    unmet = engine.evaluate(make_library())
+    assert isinstance(unmet, CutoffUnmet)
+    assert unmet.episodeIds == (100, 103)
+    assert unmet.evaluated == 5
+    assert len(unmet) == 2
+
+    unmet = engine.evaluate(make_library(), monitored_only=False)
+    assert unmet.episodeIds == (100, 103, 105, 300)
+    assert unmet.evaluated == 7
+
+
+def test_evaluate_unknown_profile() -> None:
+    engine = CutoffEngine(PROFILES)
+    series = replace(SERIES_, qualityProfileId=99, profileId=None)
+    with pytest.raises(ValueError):
+        engine.evaluate([(series, (), ())])
+
+
+def test_batches() -> None:
+    unmet = CutoffUnmet(episodeIds=tuple(range(7)), evaluated=10)
+    assert list(unmet.batches(3)) == [(0, 1, 2), (3, 4, 5), (6,)]
+    assert list(unmet.batches()) == [tuple(range(7))]
+    with pytest.raises(ValueError):
+        list(unmet.batches(0))
+
+
+@pytest.fixture
+def library_server():
+    library = {series.id: (series, eps, files) for series, eps, files in make_library()}
+
+    def by_series(index):
+        def respond(query, body):
+            seriesId = int(query["seriesId"][0])
+            return json.dumps(
+                [item.to_dict() for item in library[seriesId][index]], default=str
+            )
+
+        return respond
+
+    yield from mock_routes_server(
+        {
+            (HttpMethod.GET, "/api/profile"): PROFILE,
+            (HttpMethod.GET, "/api/series"): json.dumps(
+                [series.to_dict() for series, _, _ in library.values()], default=str
+            ),
+            (HttpMethod.GET, "/api/episode"): by_series(1),
+            (HttpMethod.GET, "/api/episodefile"): by_series(2),
+            (HttpMethod.POST, "/api/command"): COMMAND,
+        }
+    )
+
+
+def test_get_cutoff_unmet(library_server):
+    """Test API calls for SonarrClient.get_cutoff_unmet()
+    """
+    client = replace(CLIENT, port=library_server.server_port)
+    unmet = client.get_cutoff_unmet()
+    assert unmet.episodeIds == (100, 103)
+
+    #  Unmonitored series aren't fetched
+    fetched = {
+        query["seriesId"][0]
+        for method, path, query, data in library_server.requests
+        if path == "/api/episode"
+    }
+    assert fetched == {"1", "2"}
+
+
+def test_search_cutoff_unmet(library_server):
+    """Test API calls for SonarrClient.search_cutoff_unmet()
+    """
+    client = replace(CLIENT, port=library_server.server_port)
+    response = client.search_cutoff_unmet(batch_size=1)
+    assert len(response) == 2
+    commands = [
+        json.loads(data)
+        for method, path, query, data in library_server.requests
+        if path == "/api/command"
+    ]
+    assert [command["episodeIds"] for command in commands] == [[100], [103]]
+    assert all(command["name"] == "EpisodeSearch" for command in commands)
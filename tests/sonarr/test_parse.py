@@ -8,9 +8,11 @@ from dataclasses import replace
 import pytest
 
 import downloadcarr.sonarr.models as models
-from downloadcarr.sonarr.client import SonarrClient
+from downloadcarr.sonarr.client import SonarrClient, parse_key
+from downloadcarr.cache import ResponseCache
+from downloadcarr.enums import HttpMethod
 
-from . import PARSE, mock_server, CLIENT
+from . import PARSE, mock_server, mock_routes_server, CLIENT
 
 
 def test_series_title_info() -> None:
@@ -118,3 +120,65 @@ def test_parse_path_empty(parse_path_empty_server):
     client = replace(CLIENT, port=parse_path_empty_server.server_port)
     response = client.parse_path("Path")
     assert response is None
+
+
+@pytest.fixture
+def parse_many_server():
+    def parse(query, body):
+        if query.get("title") == ["Garbage"]:
+            return ""
+        return PARSE
+
+    yield from mock_routes_server({(HttpMethod.GET, "/api/parse"): parse})
+
+
+def test_parse_titles(parse_many_server):
+    """Test API call for SonarrClient.parse_titles()
+    """
+    client = replace(CLIENT, port=parse_many_server.server_port)
+    titles = [
+        "Series Title S01E01 720p HDTV-Sonarr",
+        "Garbage",
+        "Series  Title S01E01 720p HDTV-Sonarr ",
+        "Garbage",
+        "series title s01e01 720p hdtv-sonarr",
+    ]
+    response = client.parse_titles(titles)
+    assert len(response) == 5
+    assert isinstance(response[0], models.ParseResult)
+    assert response[0] is response[2]
+    assert response[1] is None
+    assert response[3] is None
+    #  Case may be significant
+    assert response[4] is not response[0]
+    assert len(parse_many_server.requests) == 3
+
+
+def test_parse_paths_cached(parse_many_server):
+    """SonarrClient.parse_paths() serves repeats from parse_cache,
+    including negative results.
+    """
+    cache = ResponseCache()
+    client = replace(CLIENT, port=parse_many_server.server_port, parse_cache=cache)
+    assert client.parse_title("Garbage") is None
+
+    #  Paths differing in case may be different series
+    response = client.parse_paths(["/tv/Path", "/tv/path", "/tv/Path"])
+    assert isinstance(response[0], models.ParseResult)
+    assert len(parse_many_server.requests) == 3
+
+    assert client.parse_titles(["Garbage", "/tv/path"])[0] is None
+    assert isinstance(client.parse_path("/tv/Path"), models.ParseResult)
+    assert isinstance(client.parse_path("/TV/Path"), models.ParseResult)
+    assert len(parse_many_server.requests) == 5
+
+    stats = cache.stats()
+    assert stats.entries == 5
+    assert stats.hits == 2
+
+
+def test_parse_key() -> None:
+    key = parse_key("title", " Show+  S01E01 DD+5.1 ")
+    assert key == "parse?title=Show+ S01E01 DD+5.1"
+    assert parse_key("title", "Show S01E01") != parse_key("title", "show s01e01")
+    assert parse_key("path", "/tv/Show  Name") == "parse?path=/tv/Show  Name"
@@ -0,0 +1,196 @@
+"""Tests for local release name parser, downloadcarr.sonarr.parser
+"""
+import json
+from dataclasses import replace
+
+import pytest
+
+import downloadcarr.sonarr.models as models
+from downloadcarr.sonarr import parser
+from downloadcarr.enums import HttpMethod
+
+from . import PARSE, mock_routes_server, CLIENT
+
+
+@pytest.mark.parametrize(
+    "title, seriesTitle, seasonNumber, episodeNumbers, quality, releaseGroup",
+    [
+        (
+            "Series.Title.S01E01.720p.HDTV-Sonarr",
+            "Series Title",
+            1,
+            (1,),
+            "HDTV-720p",
+            "Sonarr",
+        ),
+        (
+            "Show.Name.S02E05.1080p.WEB-DL-GRP",
+            "Show Name",
+            2,
+            (5,),
+            "WEBDL-1080p",
+            "GRP",
+        ),
+        (
+            "Show.Name.S02E05E06.2160p.BluRay.x265-GRP.mkv",
+            "Show Name",
+            2,
+            (5, 6),
+            "Bluray-2160p",
+            "GRP",
+        ),
+        (
+            "Show.Name.S01E01-E03.720p.WEBRip-GRP",
+            "Show Name",
+            1,
+            (1, 2, 3),
+            "WEBDL-720p",
+            "GRP",
+        ),
+        (
+            "Show Name - 2x05 - Episode Title [HDTV-720p]",
+            "Show Name",
+            2,
+            (5,),
+            "HDTV-720p",
+            None,
+        ),
+        ("Show.Name.S03E10.DVDRip.XviD-GRP", "Show Name", 3, (10,), "DVD", "GRP"),
+        ("Show.Name.S03E10.1080p.WEB-DL", "Show Name", 3, (10,), "WEBDL-1080p", None),
+        ("Show.S01E01-02.720p.HDTV-GRP", "Show", 1, (1, 2), "HDTV-720p", "GRP"),
+        ("Show.S01E01-E03.720p", "Show", 1, (1, 2, 3), "HDTV-720p", None),
+        ("Show.S01E01-720p.HDTV-GRP", "Show", 1, (1,), "HDTV-720p", "GRP"),
+        ("Show.S01E01.720p.HDTV-GRP.srt", "Show", 1, (1,), "HDTV-720p", None),
+    ],
+)
+def test_parse_release_title(
+    title, seriesTitle, seasonNumber, episodeNumbers, quality, releaseGroup
+) -> None:
+    parsed = parser.parse_release_title(title)
+    assert isinstance(parsed, parser.LocalParse)
+    info = parsed.info
+    assert isinstance(info, models.ParsedEpisodeInfo)
+    assert info.releaseTitle == title
+    assert info.seriesTitle == seriesTitle
+    assert info.seasonNumber == seasonNumber
+    assert info.episodeNumbers == episodeNumbers
+    assert info.quality.quality.name == quality
+    assert info.releaseGroup == releaseGroup
+    assert info.fullSeason is False
+    assert info.isAbsoluteNumbering is False
+
+
+def parse(title: str) -> parser.LocalParse:
+    parsed = parser.parse_release_title(title)
+    assert parsed is not None
+    return parsed
+
+
+def test_parse_release_title_proper() -> None:
+    info = parse("Show.S01E01.REAL.PROPER.720p.HDTV-GRP").info
+    assert info.quality.proper is True
+    assert info.quality.revision == models.Revision(version=2, real=1)
+
+    info = parse("Show.S01E01.720p.HDTV-GRP").info
+    assert info.quality.proper is False
+    assert info.quality.revision == models.Revision(version=1, real=0)
+
+
+def test_parse_release_title_year() -> None:
+    info = parse("Archer.2009.S05E01.720p.HDTV-GRP").info
+    assert info.seriesTitleInfo.title == "Archer 2009"
+    assert info.seriesTitleInfo.titleWithoutYear == "Archer"
+    assert info.seriesTitleInfo.year == 2009
+
+    info = parse("Show Name (2019) S01E01 720p HDTV-GRP").info
+    assert info.seriesTitle == "Show Name"
+    assert info.seriesTitleInfo.titleWithoutYear == "Show Name"
+    assert info.seriesTitleInfo.year == 2019
+
+
+def test_parse_release_title_absolute() -> None:
+    parsed = parse("[SubGroup] Anime Title - 105 (1080p) [ABCD1234].mkv")
+    info = parsed.info
+    assert info.seriesTitle == "Anime Title"
+    assert info.absoluteEpisodeNumbers == (105,)
+    assert info.episodeNumbers == ()
+    assert info.isAbsoluteNumbering is True
+    assert info.releaseGroup == "SubGroup"
+    assert info.releaseHash == "ABCD1234"
+    assert info.quality.quality.name == "HDTV-1080p"
+    assert parsed.confidence < 1
+
+
+def test_parse_release_title_full_season() -> None:
+    parsed = parse("Show.Name.S03.1080p.BluRay.x264-GRP")
+    assert parsed.info.fullSeason is True
+    assert parsed.info.seasonNumber == 3
+    assert parsed.info.episodeNumbers == ()
+    assert parsed.confidence < 1
+
+
+@pytest.mark.parametrize(
+    "title", ["Show.Name.2020.05.01.720p.HDTV-GRP", "Some Random Text", ""]
+)
+def test_parse_release_title_unparseable(title) -> None:
+    assert parser.parse_release_title(title) is None
+
+
+def test_confidence() -> None:
+    full = parse("Show.S01E01.720p.HDTV-GRP")
+    no_group = parse("Show.S01E01.720p.HDTV")
+    no_quality = parse("Show.S01E01")
+    assert full.confidence == 1
+    assert full.confidence > no_group.confidence > no_quality.confidence
+
+
+def test_to_parse_result() -> None:
+    parsed = parse("Series.Title.S01E01.720p.HDTV-Sonarr")
+    result = parsed.to_parse_result()
+    assert isinstance(result, models.ParseResult)
+    assert result.title == "Series.Title.S01E01.720p.HDTV-Sonarr"
+    assert result.parsedEpisodeInfo is parsed.info
+    assert result.series is None
+    assert result.episodes == ()
+
+
+def test_benchmark() -> None:
+    recorded = [models.ParseResult.from_dict(json.loads(PARSE))]
+    unparseable = replace(
+        recorded[0],
+        parsedEpisodeInfo=replace(
+            recorded[0].parsedEpisodeInfo, releaseTitle="Gibberish"
+        ),
+    )
+    result = parser.benchmark(recorded * 3 + [unparseable])
+    assert result.total == 4
+    assert result.parsed == 3
+    assert result.accuracy["seriesTitle"] == 0.75
+    assert set(result.accuracy.values()) == {0.75}
+    assert result.rate > 0
+
+
+@pytest.fixture
+def parse_server():
+    yield from mock_routes_server({(HttpMethod.GET, "/api/parse"): PARSE})
+
+
+def test_parse_titles_local(parse_server):
+    """SonarrClient.parse_titles() only sends low-confidence titles to server
+    """
+    client = replace(CLIENT, port=parse_server.server_port)
+    titles = [
+        "Show.Name.S02E05.1080p.WEB-DL-GRP",
+        "Show.Name.S03.1080p.BluRay.x264-GRP",
+        "Show.Name.S02E05.1080p.WEB-DL-GRP",
+        "Gibberish",
+    ]
+    response = client.parse_titles(titles, min_confidence=0.9)
+    assert len(response) == 4
+    assert response[0].parsedEpisodeInfo.seriesTitle == "Show Name"
+    assert response[2] is response[0]
+    assert response[1].parsedEpisodeInfo.seriesTitle == "Series Title"  # Server
+    assert response[3].parsedEpisodeInfo.seriesTitle == "Series Title"  # Server
+
+    queried = sorted(query["title"][0] for _, _, query, _ in parse_server.requests)
+    assert queried == ["Gibberish", "Show.Name.S03.1080p.BluRay.x264-GRP"]
@@ -0,0 +1,151 @@
+"""Tests for local release ranking, downloadcarr.sonarr.ranking
+"""
+import json
+import random
+from dataclasses import replace
+
+import pytest
+
+import downloadcarr.sonarr.models as models
+from downloadcarr.sonarr.ranking import QualityRanks, ReleaseRanker, RANK_KEY_FIELDS
+from downloadcarr.enums import HttpMethod
+
+from . import PROFILE, RELEASE, CLIENT, mock_routes_server
+
+
+PROFILES = tuple(
+    models.QualityAllowedProfile.from_dict(profile) for profile in json.loads(PROFILE)
+)
+HD_720P = PROFILES[1]
+RELEASE_ = models.Release.from_dict(json.loads(RELEASE)[0])
+
+
+def make_release(
+    qualityId, name="", resolution=None, version=1, real=0, **kwargs
+) -> models.Release:
+    quality = models.QualityRevision(
+        quality=models.Quality(id=qualityId, name=name, resolution=resolution),
+        revision=models.Revision(version=version, real=real),
+    )
+    kwargs.setdefault("approved", True)
+    kwargs.setdefault("rejections", ())
+    return replace(RELEASE_, quality=quality, **kwargs)
+
+
+def test_quality_ranks() -> None:
+    ranks = QualityRanks.from_profile(HD_720P)
+    assert ranks.profileId == 2
+    assert ranks.allowed == frozenset({4, 5, 6})
+    assert ranks.ordinal(1) == 0
+    assert ranks.ordinal(4) == 3
+    assert ranks.ordinal(7) == 9
+    assert ranks.ordinal(99) == -1
+    assert ranks.cutoff == 3
+    assert ranks.meets_cutoff(4) is True
+    assert ranks.meets_cutoff(6) is True
+    assert ranks.meets_cutoff(2) is False
+
+
+def test_score() -> None:
+    ranker = ReleaseRanker(HD_720P)
+    key = ranker.score(make_release(6, "Bluray-720p", 720, age=3))
+    assert len(key) == len(RANK_KEY_FIELDS)
+    assert dict(zip(RANK_KEY_FIELDS, key)) == {
+        "approved": 1,
+        "allowed": 1,
+        "quality": 7,
+        "revision": 2,
+        "preferredGroup": 0,
+        "sizeInRange": 1,
+        "resolution": 720,
+        "age": -3,
+    }
+
+
+@pytest.mark.parametrize(
+    "better, worse",
+    [
+        # Approval outranks quality
+        (
+            make_release(4, "HDTV-720p"),
+            make_release(6, "Bluray-720p", approved=False, rejections=("Nope",)),
+        ),
+        # Allowed quality outranks better quality
+        (make_release(4, "HDTV-720p"), make_release(7, "Bluray-1080p")),
+        # Profile order
+        (make_release(6, "Bluray-720p"), make_release(5, "WEBDL-720p")),
+        # Proper, then REAL
+        (make_release(4, version=2), make_release(4)),
+        (make_release(4, version=2, real=1), make_release(4, version=2)),
+        # Preferred group
+        (make_release(4, releaseGroup="good"), make_release(4, releaseGroup="ok")),
+        (make_release(4, releaseGroup="OK"), make_release(4, releaseGroup="other")),
+        # Size limits; 1GB for a 30 minute episode is ~34MB/min
+        (make_release(4, size=2 ** 30), make_release(4, size=5 * 2 ** 30)),
+        # Newer
+        (make_release(4, age=1), make_release(4, age=100)),
+    ],
+)
+def test_rank_order(better, worse) -> None:
+    ranker = ReleaseRanker(
+        HD_720P,
+        preferred_groups=["Good", "ok"],
+        runtime=30,
+        size_limits={4: (2.0, 100.0)},
+    )
+    assert ranker.score(better) > ranker.score(worse)
+    assert ranker.best([worse, better]) is better
+    assert ranker.rank([worse, better]) == [better, worse]
+
+
+def test_size_unknown() -> None:
+    """Sizes aren't checked without runtime, size limits, or episode numbers.
+    """
+    small = make_release(4, size=1)
+    assert ReleaseRanker(HD_720P, runtime=30)._size_in_range(small)
+    assert ReleaseRanker(HD_720P, size_limits={4: (2, 100)})._size_in_range(small)
+    ranker = ReleaseRanker(HD_720P, runtime=30, size_limits={4: (2, 100)})
+    assert not ranker._size_in_range(small)
+    assert ranker._size_in_range(replace(small, episodeNumbers=()))
+
+
+def test_best() -> None:
+    ranker = ReleaseRanker(PROFILES[3], preferred_groups=["GRP"])
+    qualities = [(q.quality.id, q.quality.name) for q in PROFILES[3].items]
+    rng = random.Random(0)
+    releases = [
+        make_release(
+            *rng.choice(qualities),
+            version=rng.choice([1, 2]),
+            age=rng.randrange(1000),
+            releaseGroup=rng.choice(["GRP", "other"]),
+            guid=str(n),
+        )
+        for n in range(500)
+    ]
+    expected = max(releases, key=ranker.score)
+    assert ranker.best(releases) is expected
+    assert ranker.rank(releases)[0] is expected
+    assert ranker.score_all(releases) == tuple(map(ranker.score, releases))
+    assert ranker.best([]) is None
+
+
+@pytest.fixture
+def release_server():
+    releases = [
+        dict(json.loads(RELEASE)[0], guid=str(n), age=age)
+        for n, age in enumerate([10, 1, 5])
+    ]
+    yield from mock_routes_server(
+        {(HttpMethod.GET, "/api/release"): json.dumps(releases)}
+    )
+
+
+def test_get_best_release(release_server):
+    """Test API call for SonarrClient.get_best_release()
+    """
+    client = replace(CLIENT, port=release_server.server_port)
+    best = client.get_best_release(1, ReleaseRanker(HD_720P))
+    assert isinstance(best, models.Release)
+    assert best.guid == "1"
+    assert release_server.requests[0][2] == {"episodeId": ["1"]}
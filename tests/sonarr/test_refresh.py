@@ -0,0 +1,107 @@
+"""Tests for selective episode refresh, downloadcarr.sonarr.refresh
+"""
+import json
+from dataclasses import replace
+
+from downloadcarr.client import ArrHttpError
+from downloadcarr.mirror import Mirror
+from downloadcarr.sonarr.refresh import EpisodeRefresher, summary
+import downloadcarr.sonarr.models as models
+
+from . import ALLSERIES, EPISODES, EPISODEFILES
+
+
+SERIES_ = models.Series.from_dict(json.loads(ALLSERIES)[0])
+EPISODE_ = models.Episode.from_dict(json.loads(EPISODES)[0])
+EPISODEFILE_ = models.EpisodeFile.from_dict(json.loads(EPISODEFILES)[0])
+
+
+def series(id, **kwargs):
+    return replace(SERIES_, id=id, **kwargs)
+
+
+class FakeClient:
+    def __init__(self, *series):
+        self.series = series
+        self.fetched = []
+        self.fail = set()
+
+    def get_all_series(self):
+        return self.series
+
+    def get_episodes(self, seriesId):
+        if seriesId in self.fail:
+            raise ArrHttpError("404", "Not Found", "http://localhost")
+        self.fetched.append(seriesId)
+        return (replace(EPISODE_, id=seriesId * 10, seriesId=seriesId),)
+
+    def get_episode_files(self, seriesId):
+        return (replace(EPISODEFILE_, id=seriesId * 10, seriesId=seriesId),)
+
+
+def test_summary() -> None:
+    assert summary(SERIES_) == summary(replace(SERIES_, title="Other"))
+    assert summary(SERIES_) != summary(replace(SERIES_, episodeFileCount=0))
+    assert SERIES_.seasons[0].statistics is not None
+    stats = replace(SERIES_.seasons[0].statistics, sizeOnDisk=1)
+    seasons = (replace(SERIES_.seasons[0], statistics=stats),) + SERIES_.seasons[1:]
+    assert summary(SERIES_) != summary(replace(SERIES_, seasons=seasons))
+
+
+def test_refresh() -> None:
+    client = FakeClient(series(1), series(2))
+    refresher = EpisodeRefresher(client)
+    refresh = refresher.refresh()
+    assert refresh.changed == (1, 2)
+    assert sorted(client.fetched) == [1, 2]
+    assert refresh.episodes[1][0].id == 10
+    assert refresh.files[2][0].seriesId == 2
+
+    #  Nothing changed: nothing fetched
+    client.fetched.clear()
+    refresh = refresher.refresh()
+    assert refresh.changed == ()
+    assert refresh.episodes == {}
+    assert client.fetched == []
+
+    client.series = (series(1, episodeFileCount=99), series(3))
+    refresh = refresher.refresh()
+    assert refresh.changed == (1, 3)
+    assert refresh.removed == (2,)
+    assert sorted(client.fetched) == [1, 3]
+    assert sorted(refresher.summaries) == [1, 3]
+
+
+def test_refresh_failure() -> None:
+    """Series whose fetch failed are retried next time"""
+    client = FakeClient(series(1), series(2))
+    client.fail.add(2)
+    refresher = EpisodeRefresher(client, retries=0)
+    refresh = refresher.refresh()
+    (failure,) = refresh.failed
+    assert failure.item.id == 2
+    assert list(refresh.episodes) == [1]
+
+    client.fail.clear()
+    client.fetched.clear()
+    assert refresher.refresh().changed == (2,)
+    assert client.fetched == [2]
+
+
+def test_refresh_mirror() -> None:
+    client = FakeClient(series(1), series(2))
+    client.fail.add(2)
+    with Mirror() as mirror:
+        mirror.upsert_series([series(9)])
+        EpisodeRefresher(client, mirror, retries=0).refresh()
+        assert [s.id for s in mirror.get_all_series()] == [1]
+        assert [e.id for e in mirror.get_episodes(1)] == [10]
+        assert [f.id for f in mirror.get_episode_files(1)] == [10]
+
+        #  A new refresher picks up the summaries held by the mirror
+        client.fail.clear()
+        client.fetched.clear()
+        refresher = EpisodeRefresher(client, mirror)
+        assert refresher.refresh().changed == (2,)
+        assert client.fetched == [2]
+        assert [s.id for s in mirror.get_all_series()] == [1, 2]
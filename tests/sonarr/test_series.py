@@ -15,6 +15,7 @@ from downloadcarr.sonarr.client import SonarrClient
 from downloadcarr.enums import HttpMethod
 from downloadcarr.utils import UTC
 from downloadcarr.client import ArrClientError
+from downloadcarr.cache import ResponseCache
 
 from . import (
     ALLSERIES,
@@ -25,8 +26,11 @@ from . import (
     QUEUE,
     WANTEDMISSING,
     TAG,
+    PROFILE,
+    ROOTFOLDER,
     mock_server,
     mock_error_server,
+    mock_routes_server,
     CLIENT,
 )
 
@@ -950,3 +954,125 @@ def test_lookup_series(lookup_series_server):
     assert isinstance(response, tuple)
     assert len(response) == 1
     assert isinstance(response[0], models.Series)
+
+
+@pytest.fixture
+def bulk_update_series_server():
+    def echo(query, body):
+        return body.decode()
+
+    routes = {
+        (HttpMethod.PUT, f"/api/series/{seriesId}"): echo for seriesId in range(10)
+    }
+    yield from mock_routes_server(routes)
+
+
+def test_bulk_update_series(bulk_update_series_server):
+    """Test SonarrClient.bulk_update_series()
+    """
+    client = replace(CLIENT, port=bulk_update_series_server.server_port)
+    original = models.Series.from_dict(json.loads(ALLSERIES)[0])
+    series = [replace(original, id=i, qualityProfileId=i % 2) for i in range(10)]
+
+    summary = client.bulk_update_series(
+        lambda s: replace(s, qualityProfileId=1), series, max_workers=4
+    )
+    assert len(summary.results) == 10
+    assert len(summary.skipped) == 5
+    assert len(summary.succeeded) == 5
+    assert summary.failed == ()
+    for result in summary.succeeded:
+        assert isinstance(result.result, models.Series)
+        assert result.result.qualityProfileId == 1
+        assert result.item.qualityProfileId == 0
+
+    put_paths = sorted(
+        path for method, path, query, data in bulk_update_series_server.requests
+    )
+    assert put_paths == [f"/api/series/{i}" for i in range(0, 10, 2)]
+
+
+@pytest.fixture
+def bulk_add_series_server():
+    lookups = {
+        "The+Blacklist": SERIESLOOKUP,
+        "Blacklist": SERIESLOOKUP,
+        "Daredevil": ALLSERIES,
+        "Nothing": "[]",
+    }
+
+    def lookup(query, body):
+        return lookups[query["term"][0]]
+
+    routes = {
+        (HttpMethod.GET, "/api/series"): ALLSERIES,
+        (HttpMethod.GET, "/api/profile"): PROFILE,
+        (HttpMethod.GET, "/api/rootfolder"): ROOTFOLDER,
+        (HttpMethod.GET, "/api/series/lookup"): lookup,
+        (HttpMethod.POST, "/api/series"): SERIESPOST,
+    }
+    yield from mock_routes_server(routes)
+
+
+def test_bulk_add_series(bulk_add_series_server):
+    """Test SonarrClient.bulk_add_series()
+    """
+    client = replace(CLIENT, port=bulk_add_series_server.server_port)
+    report = client.bulk_add_series(
+        [
+            "The Blacklist",
+            "Daredevil",
+            "tvdb:281662",
+            "Nothing",
+            "The Blacklist",
+            "Blacklist",
+        ],
+        profile="HD 720p",
+    )
+    assert len(report.added) == 1
+    assert isinstance(report.added[0], models.Series)
+    assert report.existing == ("tvdb:281662", "Daredevil", "Blacklist")
+    assert report.not_found == ("Nothing",)
+    assert report.failed == ()
+    assert set(report.timings) == {"prepare", "lookup", "add"}
+    assert report.elapsed > 0
+
+    requests = bulk_add_series_server.requests
+    paths = sorted(path for method, path, query, data in requests)
+    assert paths == [
+        "/api/profile",
+        "/api/rootfolder",
+        "/api/series",
+        "/api/series",
+        "/api/series/lookup",
+        "/api/series/lookup",
+        "/api/series/lookup",
+        "/api/series/lookup",
+    ]
+    (post,) = [data for method, path, query, data in requests if method == "POST"]
+    post = json.loads(post)
+    assert post["tvdbId"] == 266189
+    assert post["profileId"] == 2
+    assert post["rootFolderPath"] == "C:\\Downloads\\TV"
+
+
+def test_bulk_add_series_bad_profile(bulk_add_series_server):
+    """SonarrClient.bulk_add_series() raises error for unknown profile
+    """
+    client = replace(CLIENT, port=bulk_add_series_server.server_port)
+    with pytest.raises(ValueError):
+        client.bulk_add_series(["The Blacklist"], profile="Nonexistent")
+
+
+def test_lookup_series_cached(lookup_series_server):
+    """SonarrClient.lookup_series() serves repeated terms from lookup_cache
+    """
+    cache = ResponseCache()
+    client = replace(CLIENT, port=lookup_series_server.server_port, lookup_cache=cache)
+    response = client.lookup_series("The Blacklist")
+    lookup_series_server.shutdown()
+
+    assert client.lookup_series("the  blacklist") == response
+    stats = cache.stats()
+    assert stats.hits == 1
+    assert stats.misses == 1
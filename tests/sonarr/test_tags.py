@@ -0,0 +1,143 @@
+"""Tests for tag index, downloadcarr.sonarr.tags
+"""
+import json
+from dataclasses import replace
+
+import pytest
+
+import downloadcarr.sonarr.models as models
+from downloadcarr.sonarr.tags import TagIndex, bitset, members
+from downloadcarr.enums import HttpMethod
+
+from . import ALLSERIES, TAGS, CLIENT, mock_routes_server
+
+
+SERIES_ = models.Series.from_dict(json.loads(ALLSERIES)[0])
+TAGS_ = (
+    models.Tag(label="Anime", id=1),
+    models.Tag(label="kids", id=2),
+    models.Tag(label="4k", id=3),
+)
+
+
+def make_series():
+    return [
+        replace(SERIES_, id=1, tags=(1,)),
+        replace(SERIES_, id=2, tags=(1, 2)),
+        replace(SERIES_, id=3, tags=(2,)),
+        replace(SERIES_, id=4, tags=(1, 2, 3)),
+        replace(SERIES_, id=5, tags=()),
+        replace(SERIES_, id=70, tags=(3,)),
+    ]
+
+
+def test_bitset() -> None:
+    assert bitset([]) == 0
+    assert bitset([0, 3, 5]) == 0b101001
+    assert members(0b101001) == (0, 3, 5)
+    assert members(bitset([200, 1, 64])) == (1, 64, 200)
+    assert members(0) == ()
+
+
+def test_query() -> None:
+    index = TagIndex(make_series(), TAGS_)
+    assert len(index) == 6
+    assert index.query() == (1, 2, 3, 4, 5, 70)
+    assert index.query(all_of=[1]) == (1, 2, 4)
+    assert index.query(all_of=[1, 2]) == (2, 4)
+    assert index.query(any_of=[2, 3]) == (2, 3, 4, 70)
+    assert index.query(any_of=[]) == ()
+    assert index.query(none_of=[1]) == (3, 5, 70)
+    assert index.query(all_of=[1], none_of=[3]) == (1, 2)
+    assert index.query(all_of=[2], any_of=[1, 3], none_of=[3]) == (2,)
+    assert index.query(all_of=[99]) == ()
+    assert index.counts() == {1: 3, 2: 3, 3: 2}
+
+    #  By label
+    assert index.query(all_of=["anime", "KIDS"]) == (2, 4)
+    with pytest.raises(ValueError):
+        index.query(all_of=["nope"])
+
+    assert [s.id for s in index.select(index.query(all_of=[3]))] == [4, 70]
+
+
+def test_update() -> None:
+    index = TagIndex(make_series())
+    index.update(replace(SERIES_, id=1, tags=(2, 3)))
+    index.update(replace(SERIES_, id=80, tags=(1,)))
+    assert index.query(all_of=[1]) == (2, 4, 80)
+    assert index.query(all_of=[3]) == (1, 4, 70)
+    assert index.series[1].tags == (2, 3)
+
+    index.remove(4)
+    index.remove(99)
+    index.update(replace(SERIES_, id=None, tags=(1,)))
+    assert len(index) == 6
+    assert index.query(all_of=[1]) == (2, 80)
+    assert 4 not in index.query()
+
+
+@pytest.fixture
+def bulk_tag_server():
+    def echo(query, body):
+        return body.decode()
+
+    routes = {
+        (HttpMethod.PUT, f"/api/series/{seriesId}"): echo for seriesId in range(100)
+    }
+    yield from mock_routes_server(routes)
+
+
+def put_ids(server):
+    return sorted(int(path.rsplit("/", 1)[1]) for _, path, _, _ in server.requests)
+
+
+def test_bulk_tag_series(bulk_tag_server):
+    """SonarrClient.bulk_tag_series() only PUTs series whose tags change
+    """
+    client = replace(CLIENT, port=bulk_tag_server.server_port)
+    index = TagIndex(make_series(), TAGS_)
+
+    summary = client.bulk_tag_series([2, 3], index=index)
+    assert len(summary.skipped) == 1
+    assert summary.failed == ()
+    assert put_ids(bulk_tag_server) == [1, 2, 3, 5, 70]
+    tags = {r.result.id: r.result.tags for r in summary.succeeded}
+    assert tags == {1: (1, 2, 3), 2: (1, 2, 3), 3: (2, 3), 5: (2, 3), 70: (3, 2)}
+    #  Index is updated
+    assert index.query(all_of=[2, 3]) == (1, 2, 3, 4, 5, 70)
+
+
+def test_bulk_untag_series(bulk_tag_server):
+    """SonarrClient.bulk_untag_series() only PUTs series whose tags change
+    """
+    client = replace(CLIENT, port=bulk_tag_server.server_port)
+    index = TagIndex(make_series(), TAGS_)
+    series = index.select(index.query(any_of=[1, 2]))
+
+    summary = client.bulk_untag_series([1], series, index=index)
+    assert len(summary.skipped) == 1
+    assert put_ids(bulk_tag_server) == [1, 2, 4]
+    tags = {r.result.id: r.result.tags for r in summary.succeeded}
+    assert tags == {1: (), 2: (2,), 4: (2, 3)}
+    assert index.query(all_of=[1]) == ()
+
+
+@pytest.fixture
+def tag_index_server():
+    yield from mock_routes_server(
+        {
+            (HttpMethod.GET, "/api/series"): ALLSERIES,
+            (HttpMethod.GET, "/api/tag"): TAGS,
+        }
+    )
+
+
+def test_get_tag_index(tag_index_server):
+    """Test API calls for SonarrClient.get_tag_index()
+    """
+    client = replace(CLIENT, port=tag_index_server.server_port)
+    index = client.get_tag_index()
+    assert isinstance(index, TagIndex)
+    assert len(index) == 1
+    assert index.labels == {"amzn": 1, "netflix": 2}
@@ -0,0 +1,116 @@
+"""Tests for downloadcarr.bulk
+"""
+import time
+
+import pytest
+
+from downloadcarr.bulk import (
+    Checkpoint,
+    RateLimiter,
+    bulk_apply,
+    map_concurrent,
+    is_retryable,
+)
+from downloadcarr.client import ArrConnectionError, ArrHttpError
+
+
+def test_is_retryable() -> None:
+    assert is_retryable(ArrConnectionError("http://localhost", "Timeout"))
+    assert is_retryable(ArrHttpError("503", "Service Unavailable", "url"))
+    assert is_retryable(ArrHttpError("429", "Too Many Requests", "url"))
+    assert not is_retryable(ArrHttpError("404", "Not Found", "url"))
+    assert not is_retryable(ValueError("bad"))
+
+
+def test_map_concurrent_order() -> None:
+    """Results are returned in input order."""
+    results = map_concurrent(lambda n: n * 2, range(50), max_workers=4)
+    assert [r.item for r in results] == list(range(50))
+    assert [r.result for r in results] == [n * 2 for n in range(50)]
+    assert all(r.ok and r.attempts == 1 for r in results)
+
+
+def test_map_concurrent_retries() -> None:
+    """Transient errors are retried; permanent errors aren't."""
+    calls = {"flaky": 0, "broken": 0}
+
+    def func(key):
+        calls[key] += 1
+        if key == "flaky" and calls[key] < 3:
+            raise ArrConnectionError("http://localhost", "Timeout")
+        if key == "broken":
+            raise ArrHttpError("400", "Bad Request", "url")
+        return key
+
+    flaky, broken = map_concurrent(func, ["flaky", "broken"], retry_delay=0)
+    assert flaky.ok
+    assert flaky.result == "flaky"
+    assert flaky.attempts == 3
+    assert not broken.ok
+    assert isinstance(broken.error, ArrHttpError)
+    assert broken.attempts == 1
+
+
+def test_map_concurrent_retries_exhausted() -> None:
+    def func(item):
+        raise ArrConnectionError("http://localhost", "Timeout")
+
+    (result,) = map_concurrent(func, [1], retries=1, retry_delay=0)
+    assert isinstance(result.error, ArrConnectionError)
+    assert result.attempts == 2
+
+
+def test_bulk_apply() -> None:
+    updated = []
+
+    def update(item):
+        updated.append(item)
+        return item
+
+    def transform(item):
+        if item == 3:
+            raise ValueError("can't transform")
+        return item if item % 2 else item + 10
+
+    summary = bulk_apply(update, transform, range(6), retry_delay=0)
+    assert [r.item for r in summary.results] == list(range(6))
+    assert sorted(updated) == [10, 12, 14]
+    assert [r.item for r in summary.succeeded] == [0, 2, 4]
+    assert [r.result for r in summary.succeeded] == [10, 12, 14]
+    assert [r.item for r in summary.skipped] == [1, 5]
+    assert [r.item for r in summary.failed] == [3]
+    assert summary.requests == 3
+    assert summary.throughput > 0
+
+
+def test_rate_limiter() -> None:
+    limiter = RateLimiter(rate=100, burst=2)
+    start = time.monotonic()
+    for _ in range(6):
+        limiter.acquire()
+    # 2 calls allowed immediately; 4 more at 100/sec
+    assert time.monotonic() - start >= 0.035
+
+    with pytest.raises(ValueError):
+        RateLimiter(rate=0)
+
+
+def test_checkpoint(tmp_path) -> None:
+    path = tmp_path / "checkpoint"
+    checkpoint = Checkpoint(str(path))
+    assert checkpoint.load() == set()
+
+    checkpoint.record(["a", "b"])
+    checkpoint.record([])
+    checkpoint.record(["c"])
+    assert checkpoint.load() == {"a", "b", "c"}
+
+    # Simulate a crash midway through writing a line
+    with open(path, "a") as f:
+        f.write("trunc")
+    assert checkpoint.load() == {"a", "b", "c"}
+
+    # Resuming drops the truncated line rather than appending to it
+    checkpoint.record(["d"])
+    assert checkpoint.load() == {"a", "b", "c", "d"}
+    assert path.read_text() == "a\nb\nc\nd\n"
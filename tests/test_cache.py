@@ -0,0 +1,162 @@
+"""Tests for downloadcarr.cache
+"""
+from dataclasses import replace
+
+import pytest
+
+from downloadcarr.cache import (
+    ResponseCache,
+    MISSING,
+    make_key,
+    normalize_term,
+)
+from downloadcarr.client import Client
+from downloadcarr.enums import HttpMethod
+
+from . import mock_routes_server
+
+
+class Clock:
+    """Manually advanced clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_normalize_term() -> None:
+    assert normalize_term("  The   Blacklist ") == "the blacklist"
+    assert normalize_term("The+Blacklist") == "the blacklist"
+    assert normalize_term("STRASSE") == normalize_term("straße")
+
+
+def test_make_key() -> None:
+    assert make_key("series/lookup") == "series/lookup"
+    assert make_key("movie/lookup", {"tmdbId": 11}) == "movie/lookup?tmdbId=11"
+    assert make_key("a", {"b": "X", "a": "Y"}) == "a?a=y&b=x"
+    assert make_key("series/lookup", {"term": "The+Blacklist"}) == make_key(
+        "series/lookup", {"term": "the blacklist"}
+    )
+
+
+def test_lru() -> None:
+    cache = ResponseCache(maxsize=2)
+    cache.put("a", [1])
+    cache.put("b", [2])
+    assert cache.get("a") == [1]  # "b" is now least recently used
+    cache.put("c", [3])
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == [1]
+    assert cache.get("c") == [3]
+    assert len(cache) == 2
+
+    stats = cache.stats()
+    assert stats.hits == 3
+    assert stats.misses == 1
+    assert stats.evictions == 1
+    assert stats.entries == 2
+    assert stats.bytes == len("[1]") + len("[3]")
+    assert stats.hit_rate == 0.75
+
+
+def test_ttl() -> None:
+    clock = Clock()
+    cache = ResponseCache(ttl=10, clock=clock)
+    cache.put("a", None)
+    assert cache.get("a") is None  # Cached null is a hit, not a miss
+    assert "a" in cache
+
+    clock.now += 10
+    assert "a" not in cache
+    assert cache.get("a") is MISSING
+    stats = cache.stats()
+    assert stats.expirations == 1
+    assert stats.entries == 0
+    assert stats.bytes == 0
+
+
+def test_invalidate_clear() -> None:
+    cache = ResponseCache()
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.invalidate("a")
+    assert cache.get("a") is MISSING
+    assert cache.get("b") == 2
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.stats().bytes == 0
+
+
+def test_disk_tier(tmp_path) -> None:
+    clock = Clock()
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(ttl=10, path=path, clock=clock)
+    cache.put("a", {"title": "The Blacklist"})
+    cache.put("b", [])
+    cache.close()
+
+    clock.now += 5
+    cache = ResponseCache(ttl=10, path=path, clock=clock)
+    assert len(cache) == 0
+    assert cache.get("a") == {"title": "The Blacklist"}
+    assert len(cache) == 1
+    stats = cache.stats()
+    assert stats.hits == stats.disk_hits == 1
+
+    cache.invalidate("b")
+    cache.close()
+    cache = ResponseCache(ttl=10, path=path, clock=clock)
+    assert cache.get("b") is MISSING
+
+    clock.now += 5
+    assert cache.get("a") is MISSING
+    cache.close()
+
+
+def test_disk_tier_maxsize(tmp_path) -> None:
+    """The disk tier is bounded by maxsize too, keeping the latest entries"""
+    clock = Clock()
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(maxsize=2, ttl=10, path=path, clock=clock)
+    for n, key in enumerate("abc"):
+        clock.now += 1
+        cache.put(key, n)
+    cache.close()
+
+    cache = ResponseCache(maxsize=2, ttl=10, path=path, clock=clock)
+    assert cache.get("a") is MISSING
+    assert cache.get("b") == 1
+    assert cache.get("c") == 2
+    cache.close()
+
+    #  Shrinking maxsize prunes on opening
+    cache = ResponseCache(maxsize=1, ttl=10, path=path, clock=clock)
+    assert cache.get("b") is MISSING
+    assert cache.get("c") == 2
+    cache.close()
+
+
+@pytest.fixture
+def lookup_server():
+    yield from mock_routes_server({(HttpMethod.GET, "/api/lookup"): "[1, 2, 3]"})
+
+
+def test_cached_request(lookup_server) -> None:
+    """Test Client._cached_request()
+    """
+    cache = ResponseCache()
+    client = Client(
+        "localhost", "MYKEY", port=lookup_server.server_port, lookup_cache=cache
+    )
+    assert client == replace(client, lookup_cache=None)
+
+    for term in ("Foo", "foo", " FOO "):
+        response = client._cached_request(cache, "lookup", {"term": term})
+        assert response == [1, 2, 3]
+    assert client._cached_request(cache, "lookup", {"term": "bar"}) == [1, 2, 3]
+    assert client._cached_request(None, "lookup", {"term": "foo"}) == [1, 2, 3]
+
+    assert len(lookup_server.requests) == 3
+    assert cache.stats().hits == 2
@@ -0,0 +1,170 @@
+"""Tests for interval cache of calendar responses, downloadcarr.calendar
+"""
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Tuple
+
+from downloadcarr.calendar import CalendarCache
+
+
+@dataclass(frozen=True)
+class Item:
+    id: int
+    days: Tuple[date, ...]
+
+
+def day(n: int) -> date:
+    return date(2020, 6, 1) + timedelta(days=n)
+
+
+def item_dates(item: Item) -> Tuple[date, ...]:
+    return item.days
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Calendar:
+    """One item per day, plus one item dated on both day 2 and day 12."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, start, end):
+        self.calls.append((start, end))
+        items = [Item(id=n, days=(day(n),)) for n in range(30)]
+        items.append(Item(id=100, days=(day(2), day(12))))
+        #  Like the server, include items on the end date
+        return [item for item in items if any(start <= d <= end for d in item.days)]
+
+
+def ids(items):
+    return [item.id for item in items]
+
+
+def test_get() -> None:
+    cache: CalendarCache[Item] = CalendarCache(ttl=60, clock=Clock())
+    fetch = Calendar()
+
+    response = cache.get(day(0), day(7), fetch, item_dates)
+    assert ids(response) == [0, 1, 2, 100, 3, 4, 5, 6]
+    assert fetch.calls == [(day(0), day(7))]
+    assert cache.intervals == ((day(0), day(7)),)
+
+    #  Served entirely from cache
+    assert ids(cache.get(day(3), day(5), fetch, item_dates)) == [3, 4]
+    assert len(fetch.calls) == 1
+
+    #  Only missing sub-ranges are fetched, and adjacent intervals merged
+    response = cache.get(day(5), day(14), fetch, item_dates)
+    assert ids(response) == [5, 6, 7, 8, 9, 10, 11, 100, 12, 13]
+    assert fetch.calls[1:] == [(day(7), day(14))]
+    assert cache.intervals == ((day(0), day(14)),)
+    assert cache.fetches == 2
+
+    cache.get(day(20), day(22), fetch, item_dates)
+    assert cache.intervals == ((day(0), day(14)), (day(20), day(22)))
+    assert ids(cache.get(day(12), day(24), fetch, item_dates)) == (
+        [100, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23]
+    )
+    assert fetch.calls[3:] == [(day(14), day(20)), (day(22), day(24))]
+    assert cache.intervals == ((day(0), day(24)),)
+
+
+def test_get_empty_range() -> None:
+    cache: CalendarCache[Item] = CalendarCache()
+    fetch = Calendar()
+    assert cache.get(day(5), day(5), fetch, item_dates) == ()
+    assert cache.get(day(5), day(1), fetch, item_dates) == ()
+    assert fetch.calls == []
+
+
+def test_ttl() -> None:
+    clock = Clock()
+    cache: CalendarCache[Item] = CalendarCache(ttl=60, clock=clock)
+    fetch = Calendar()
+
+    cache.get(day(0), day(7), fetch, item_dates)
+    clock.now = 30
+    cache.get(day(10), day(14), fetch, item_dates)
+    assert len(fetch.calls) == 2
+
+    #  First interval has expired; second hasn't
+    clock.now = 61
+    assert ids(cache.get(day(0), day(14), fetch, item_dates))[:3] == [0, 1, 2]
+    assert fetch.calls[2:] == [(day(0), day(10))]
+
+    #  Merged interval expires with its oldest part
+    clock.now = 91
+    cache.get(day(0), day(14), fetch, item_dates)
+    assert fetch.calls[3:] == [(day(0), day(14))]
+
+
+def test_clear() -> None:
+    cache: CalendarCache[Item] = CalendarCache()
+    fetch = Calendar()
+    cache.get(day(0), day(7), fetch, item_dates)
+    cache.clear()
+    assert cache.intervals == ()
+    cache.get(day(0), day(7), fetch, item_dates)
+    assert len(fetch.calls) == 2
+
+
+def test_get_undated() -> None:
+    """Items without dates are kept for the range they were fetched for"""
+    cache: CalendarCache[Item] = CalendarCache(ttl=60, clock=Clock())
+
+    def fetch(start, end):
+        items = [Item(id=start.day, days=())]
+        return items + [Item(id=n, days=(day(n),)) for n in range(3, 5)]
+
+    assert ids(cache.get(day(0), day(7), fetch, item_dates)) == [1, 3, 4]
+    assert ids(cache.get(day(7), day(14), fetch, item_dates)) == [8]
+    assert ids(cache.get(day(3), day(14), fetch, item_dates)) == [3, 1, 4, 8]
+
+
+def test_invalidate() -> None:
+    """Only the days of matching items (and days given) are refetched"""
+    cache: CalendarCache[Item] = CalendarCache(ttl=60, clock=Clock())
+    fetch = Calendar()
+    cache.get(day(0), day(14), fetch, item_dates)
+
+    cache.invalidate(lambda item: item.id == 100, item_dates, days=[day(5)])
+    assert cache.intervals == (
+        (day(0), day(2)),
+        (day(3), day(5)),
+        (day(6), day(12)),
+        (day(13), day(14)),
+    )
+    assert ids(cache.get(day(3), day(5), fetch, item_dates)) == [3, 4]
+    assert len(fetch.calls) == 1
+
+    assert ids(cache.get(day(0), day(14), fetch, item_dates)) == (
+        [0, 1, 2, 100, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13]
+    )
+    assert fetch.calls[1:] == [(day(2), day(3)), (day(5), day(6)), (day(12), day(13))]
+    assert cache.intervals == ((day(0), day(14)),)
+
+    #  Nothing matching: nothing dropped
+    cache.invalidate(lambda item: item.id == 99, item_dates)
+    assert cache.intervals == ((day(0), day(14)),)
+
+
+def test_invalidate_undated() -> None:
+    cache: CalendarCache[Item] = CalendarCache(ttl=60, clock=Clock())
+
+    def fetch(start, end):
+        return [Item(id=start.day, days=())]
+
+    cache.get(day(0), day(7), fetch, item_dates)
+    cache.get(day(7), day(14), fetch, item_dates)
+    cache.invalidate(lambda item: item.id == 8, item_dates)
+    assert cache.intervals == ((day(0), day(7)),)
+    cache.invalidate(lambda item: False, item_dates, days=[day(3)])
+    assert cache.intervals == ((day(0), day(3)), (day(4), day(7)))
+    assert ids(cache.get(day(4), day(7), fetch, item_dates)) == [1]
@@ -0,0 +1,160 @@
+"""Tests for downloadcarr.columnar
+"""
+from datetime import date, datetime
+import json
+import math
+
+import pytest
+
+from downloadcarr.columnar import (
+    Column,
+    ColumnBatch,
+    DictColumn,
+    decode_columns,
+    fetch_columns,
+    fetch_history_columns,
+    field_type,
+)
+from downloadcarr.enums import HttpMethod
+from downloadcarr.radarr import RadarrClient
+from downloadcarr.sonarr import SonarrClient
+from downloadcarr.utils import UTC
+import downloadcarr.radarr.models as radarr_models
+import downloadcarr.sonarr.models as sonarr_models
+
+from . import mock_routes_server
+from .sonarr import EPISODES, HISTORY
+from .radarr import MOVIES
+
+
+EPISODE = json.loads(EPISODES)[0]
+
+
+def episodes():
+    """Episodes with missing values & repeated titles"""
+    rows = []
+    for id in range(6):
+        row = dict(EPISODE, id=id, hasFile=bool(id % 2), title=f"t{id % 3}")
+        if id == 4:
+            del row["airDate"]
+            row["title"] = None
+        rows.append(row)
+    return rows
+
+
+def test_field_type() -> None:
+    assert field_type(sonarr_models.Episode, "seriesId") is int
+    assert field_type(sonarr_models.Episode, "airDate") is date
+    assert field_type(sonarr_models.Download, "quality.quality.id") is int
+    with pytest.raises(ValueError):
+        field_type(sonarr_models.Episode, "nonesuch")
+    with pytest.raises(ValueError):
+        field_type(sonarr_models.Episode, "seriesId.id")
+    with pytest.raises(ValueError):
+        ColumnBatch(sonarr_models.Series, ["seasons"])
+
+
+def test_decode_columns() -> None:
+    fields = ["id", "hasFile", "airDate", "airDateUtc", "title"]
+    batch = decode_columns(sonarr_models.Episode, episodes(), fields)
+    assert len(batch) == 6
+    assert "id" in batch
+
+    ids = batch["id"]
+    assert isinstance(ids, Column)
+    assert ids.values.typecode == "q"
+    assert list(ids.values) == [0, 1, 2, 3, 4, 5]
+    assert ids.valid is None
+    assert list(batch["hasFile"]) == [False, True] * 3
+
+    airDate = batch["airDate"]
+    assert airDate.valid == bytearray([1, 1, 1, 1, 0, 1])
+    assert airDate[0] == date(2009, 9, 17)
+    assert airDate[4] is None
+    assert batch["airDateUtc"][0] == datetime(2009, 9, 18, 2, tzinfo=UTC)
+
+    title = batch["title"]
+    assert isinstance(title, DictColumn)
+    assert title.categories == ["t0", "t1", "t2"]
+    assert list(title.codes) == [0, 1, 2, 0, -1, 2]
+    assert title.counts() == {"t0": 2, "t1": 1, "t2": 2}
+    assert title.valid == bytearray([1, 1, 1, 1, 0, 1])
+
+    airDateUtc = datetime(2009, 9, 18, 2, tzinfo=UTC)
+    assert next(batch.rows()) == (0, False, date(2009, 9, 17), airDateUtc, "t0")
+
+
+def test_naive_datetime() -> None:
+    """Datetimes without "Z" are UTC too, not local time"""
+    column = Column("airDateUtc", datetime)
+    column.append("2009-09-18T02:00:00")
+    column.append("2009-09-18T02:00:00Z")
+    assert list(column) == [datetime(2009, 9, 18, 2, tzinfo=UTC)] * 2
+
+
+def test_nested_missing() -> None:
+    movie = json.loads(MOVIES)[0]
+    assert "movieFile" not in movie
+    batch = decode_columns(
+        radarr_models.Movie, [movie], ["tmdbId", "movieFile.size", "ratings.value"]
+    )
+    assert list(batch["tmdbId"]) == [121856]
+    assert list(batch["movieFile.size"]) == [None]
+    ratings = batch["ratings.value"]
+    assert isinstance(ratings, Column)
+    assert ratings.values.typecode == "d"
+
+
+def test_to_numpy() -> None:
+    numpy = pytest.importorskip("numpy")
+    fields = ["id", "hasFile", "airDate", "title"]
+    array = decode_columns(sonarr_models.Episode, episodes(), fields).to_numpy()
+    assert array.dtype.names == tuple(fields)
+    assert array["id"].tolist() == [0, 1, 2, 3, 4, 5]
+    assert array["hasFile"].dtype == numpy.bool_
+    assert array["title"].tolist() == [0, 1, 2, 0, -1, 2]
+
+
+@pytest.fixture
+def server():
+    routes = {
+        (HttpMethod.GET, "/api/episode"): json.dumps(episodes()),
+        (HttpMethod.GET, "/api/history"): HISTORY,
+        (HttpMethod.GET, "/api/movie"): MOVIES,
+    }
+    yield from mock_routes_server(routes)
+
+
+def test_fetch_columns(server) -> None:
+    client = SonarrClient("localhost", "MYKEY", port=server.server_port)
+    batch = fetch_columns(client, "episode", ["id"], query={"seriesId": 1})
+    fetch_columns(client, "episode", ["id"], query={"seriesId": 2}, batch=batch)
+    assert len(batch) == 12
+    assert server.requests[1][2] == {"seriesId": ["2"]}
+
+    fields = ["seriesId", "eventType", "quality.quality.id", "date"]
+    history = fetch_history_columns(client, fields, pageSize=2, max_pages=1)
+    assert len(history) == 2
+    assert list(history["quality.quality.id"]) == [3, 9]
+    eventType = history["eventType"]
+    assert isinstance(eventType, DictColumn)
+    assert eventType.categories == ["downloadFolderImported", "episodeFileDeleted"]
+    dates = history["date"]
+    assert isinstance(dates, Column)
+    assert not math.isnan(dates.values[0])
+
+    #  The fixture claims thousands of records
+    history = fetch_history_columns(client, ["seriesId"], pageSize=2, max_pages=3)
+    assert len(history) == 6
+    assert [query["page"] for (_, _, query, _) in server.requests[-3:]] == [
+        ["1"],
+        ["2"],
+        ["3"],
+    ]
+
+    with pytest.raises(ValueError):
+        fetch_columns(client, "movie", ["id"])
+
+    radarr = RadarrClient("localhost", "MYKEY", port=server.server_port)
+    movies = fetch_columns(radarr, "movie", ["id", "monitored"])
+    assert list(movies["id"]) == [1]
@@ -0,0 +1,493 @@
+"""Tests for downloadcarr.commands
+"""
+from dataclasses import replace
+from datetime import timedelta
+import json
+import threading
+from typing import List
+
+import pytest
+
+from downloadcarr.commands import (
+    CommandScheduler,
+    CommandWaiter,
+    SearchBatcher,
+    command_duration,
+    command_key,
+    status_key,
+)
+from downloadcarr.client import ArrHttpError
+from downloadcarr.models import CommandStatus, CommandStatusBody
+from downloadcarr.enums import HttpMethod
+from downloadcarr.sonarr import SonarrClient
+
+from . import COMMAND, mock_routes_server
+
+
+STATUS = CommandStatus.from_dict(json.loads(COMMAND))
+
+
+class FakeClient:
+    """Stands in for SonarrClient/RadarrClient command status endpoints.
+
+    ``listed`` commands are returned by /command; others by /command/{id}
+    only; unknown IDs are 404s.
+    """
+
+    def __init__(self):
+        self.states = {}
+        self.listed = set()
+        self.calls = {"all": 0, "one": 0}
+        self.posts = []
+        self.names = {}
+        self.lock = threading.Lock()
+
+    def add(self, commandId, state="queued", listed=True):
+        self.states[commandId] = state
+        if listed:
+            self.listed.add(commandId)
+        return replace(STATUS, id=commandId, state=state)
+
+    def status(self, commandId):
+        return replace(
+            STATUS,
+            id=commandId,
+            name=self.names.get(commandId, STATUS.name),
+            state=self.states[commandId],
+            duration=timedelta(seconds=8),
+        )
+
+    def get_all_commands_status(self):
+        with self.lock:
+            self.calls["all"] += 1
+            return tuple(self.status(commandId) for commandId in sorted(self.listed))
+
+    def _post_command(self, name, **kwargs):
+        with self.lock:
+            commandId = 1000 + len(self.posts)
+            self.posts.append((name, kwargs))
+            self.names[commandId] = name
+        return self.add(commandId)
+
+    def get_command_status(self, commandId):
+        with self.lock:
+            self.calls["one"] += 1
+            if commandId not in self.states:
+                raise ArrHttpError("404", "Not Found", f"command/{commandId}")
+            return self.status(commandId)
+
+
+def test_command_duration() -> None:
+    assert command_duration(replace(STATUS, duration=timedelta(seconds=3))) == 3
+    assert command_duration(STATUS) is None
+    assert STATUS.started is not None
+    ended = replace(STATUS, ended=STATUS.started + timedelta(seconds=5))
+    assert command_duration(ended) == 5
+
+
+def test_poll() -> None:
+    """One request per tick updates every tracked command."""
+    client = FakeClient()
+    waiter = CommandWaiter(client)
+    resolved: List[CommandStatus] = []
+    futures = [
+        waiter.watch(client.add(n), callback=resolved.append) for n in range(200)
+    ]
+    assert len(waiter.pending) == 200
+
+    assert waiter.poll() == 0
+    assert client.calls == {"all": 1, "one": 0}
+
+    for n in range(0, 200, 2):
+        client.states[n] = "completed"
+    client.states[1] = "failed"
+    assert waiter.poll() == 101
+    assert client.calls == {"all": 2, "one": 0}
+    assert futures[0].result().state == "completed"
+    assert futures[1].result().state == "failed"
+    assert not futures[3].done()
+    assert len(resolved) == 101
+    assert len(waiter.pending) == 99
+
+
+def test_poll_unlisted() -> None:
+    """Commands missing from /command are queried individually."""
+    client = FakeClient()
+    waiter = CommandWaiter(client)
+    done = waiter.watch(client.add(1, "completed", listed=False))
+    assert done.done()  # Already finished when watched
+
+    unlisted = waiter.watch(client.add(2, "started", listed=False))
+    missing = waiter.watch(3)
+    client.states[2] = "completed"
+    assert waiter.poll() == 2
+    assert client.calls == {"all": 1, "one": 2}
+    assert unlisted.result().id == 2
+    with pytest.raises(ArrHttpError):
+        missing.result()
+    assert waiter.pending == ()
+
+    #  Nothing to track, nothing to request
+    assert waiter.poll() == 0
+    assert client.calls == {"all": 1, "one": 2}
+
+
+def test_adaptive_interval() -> None:
+    client = FakeClient()
+    waiter = CommandWaiter(client, min_interval=0.5, max_interval=10, backoff=2)
+    waiter.watch(client.add(1))
+    assert waiter.interval == 0.5
+
+    #  Back off while nothing finishes
+    waiter.poll()
+    assert waiter.interval == 1
+    waiter.poll()
+    waiter.poll()
+    waiter.poll()
+    waiter.poll()
+    assert waiter.interval == 10
+
+    #  Commands take 8 seconds, so poll every 2 seconds
+    client.states[1] = "completed"
+    waiter.poll()
+    assert waiter.average_duration == 8
+    assert waiter.interval == 2
+    waiter.watch(client.add(2))
+    assert waiter.interval == 2
+
+
+def test_update() -> None:
+    """Statuses obtained elsewhere resolve tracked commands."""
+    client = FakeClient()
+    waiter = CommandWaiter(client)
+    future = waiter.watch(7)
+    assert waiter.update([replace(STATUS, id=7, state="started")]) == 0
+    assert waiter.update([replace(STATUS, id=8, state="completed")]) == 0
+    assert waiter.update([replace(STATUS, id=7, state="completed")]) == 1
+    assert future.result().id == 7
+    assert client.calls == {"all": 0, "one": 0}
+
+
+def test_wait() -> None:
+    client = FakeClient()
+    waiter = CommandWaiter(client, min_interval=0.01)
+    commands = [client.add(n) for n in range(3)]
+
+    def finish():
+        for n in range(3):
+            client.states[n] = "completed"
+
+    timer = threading.Timer(0.05, finish)
+    timer.start()
+    statuses = waiter.wait(commands, timeout=5)
+    assert [status.id for status in statuses] == [0, 1, 2]
+
+    waiter.watch(client.add(4))
+    with pytest.raises(TimeoutError):
+        waiter.wait([4], timeout=0.05)
+
+
+def test_background() -> None:
+    client = FakeClient()
+    with CommandWaiter(client, min_interval=0.01, max_interval=0.02) as waiter:
+        assert waiter.running
+        future = waiter.watch(client.add(1))
+        client.states[1] = "completed"
+        assert future.result(timeout=5).state == "completed"
+        assert waiter.wait([client.add(2, "completed")], timeout=5)[0].id == 2
+    assert not waiter.running
+
+
+def test_background_error() -> None:
+    """Unexpected errors fail pending futures, rather than hanging them"""
+    client = FakeClient()
+    setattr(client, "get_all_commands_status", lambda: [{"not": "a status"}])
+    with CommandWaiter(client, min_interval=0.01, max_interval=0.02) as waiter:
+        future = waiter.watch(client.add(1))
+        with pytest.raises(AttributeError):
+            future.result(timeout=5)
+        assert waiter.pending == ()
+        assert waiter.running
+
+
+def test_watch_callback_failed(caplog) -> None:
+    """Callbacks aren't called (nor raise) for failed or cancelled futures"""
+    client = FakeClient()
+    waiter = CommandWaiter(client)
+    resolved: List[CommandStatus] = []
+    missing = waiter.watch(3, callback=resolved.append)
+    done = waiter.watch(client.add(1, listed=False), callback=resolved.append)
+    assert waiter.watch(client.add(2), callback=resolved.append).cancel()
+    client.states[1] = "completed"
+    assert waiter.poll() == 2
+    assert isinstance(missing.exception(), ArrHttpError)
+    assert resolved == [done.result()]
+    assert "exception calling callback" not in caplog.text
+
+
+@pytest.fixture
+def command_server():
+    queued = replace(STATUS, state="queued").to_dict()
+    completed = replace(STATUS, state="completed").to_dict()
+    responses = iter([[queued], [completed]])
+    yield from mock_routes_server(
+        {
+            (HttpMethod.GET, "/api/command"): lambda query, body: json.dumps(
+                next(responses), default=str
+            ),
+        }
+    )
+
+
+def test_wait_client(command_server):
+    """CommandWaiter with SonarrClient"""
+    client = SonarrClient("localhost", "MYKEY", port=command_server.server_port)
+    waiter = CommandWaiter(client, min_interval=0.01)
+    (status,) = waiter.wait([STATUS.id], timeout=5)
+    assert status.state == "completed"
+    assert waiter.polls == 2
+
+
+def test_command_key() -> None:
+    assert command_key("RefreshSeries", {"seriesId": 3}) == command_key(
+        "refreshSeries", {"seriesId": 3}
+    )
+    assert command_key("EpisodeSearch", {"episodeIds": [3, 1]}) == command_key(
+        "EpisodeSearch", {"episodeIds": (1, 3)}
+    )
+    assert command_key("RefreshSeries", {"seriesId": 3}) != command_key(
+        "RefreshSeries", {"seriesId": 4}
+    )
+    assert command_key("RefreshSeries", {}) != command_key("RescanSeries", {})
+
+    assert STATUS.body is not None
+    body = replace(STATUS.body, name="EpisodeSearch", episodeIds=(1, 3))
+    status = replace(STATUS, name="EpisodeSearch", body=body)
+    assert status_key(status) == command_key("EpisodeSearch", {"episodeIds": [1, 3]})
+    assert status_key(STATUS) == command_key("RefreshSeries", {})
+
+
+def finish_all(client, waiter):
+    for commandId in list(client.states):
+        client.states[commandId] = "completed"
+    waiter.poll()
+
+
+def test_scheduler_coalesce() -> None:
+    """Duplicates of a queued or running command aren't posted."""
+    client = FakeClient()
+    waiter = CommandWaiter(client)
+    scheduler = CommandScheduler(client, waiter=waiter, sync_interval=None)
+
+    first = scheduler.submit("RefreshSeries", seriesId=1)
+    second = scheduler.submit("RefreshSeries", seriesId=1)
+    other = scheduler.submit("RefreshSeries", seriesId=2)
+    assert first is second
+    assert other is not first
+    assert client.posts == [
+        ("RefreshSeries", {"seriesId": 1}),
+        ("RefreshSeries", {"seriesId": 2}),
+    ]
+    assert scheduler.coalesced == 1
+    assert scheduler.running("RefreshSeries") == 2
+
+    finish_all(client, waiter)
+    assert first.result().state == "completed"
+    assert scheduler.running("RefreshSeries") == 0
+
+    #  Once finished, the same command may run again
+    third = scheduler.submit("RefreshSeries", seriesId=1)
+    assert third is not first
+    assert len(client.posts) == 3
+
+
+def test_scheduler_server_commands() -> None:
+    """Commands already running on the server aren't posted again."""
+    client = FakeClient()
+    body = CommandStatusBody(
+        sendUpdatesToClient=True,
+        updateScheduledTask=True,
+        completionMessage="Completed",
+        name="SeriesSearch",
+        trigger="manual",
+        seriesId=5,
+    )
+    client.names[1] = "SeriesSearch"
+    client.add(1, "started")
+    status = client.status
+
+    def with_body(commandId):
+        return replace(status(commandId), body=body if commandId == 1 else None)
+
+    setattr(client, "status", with_body)
+    waiter = CommandWaiter(client)
+    scheduler = CommandScheduler(client, waiter=waiter, sync_interval=60)
+
+    future = scheduler.submit("SeriesSearch", seriesId=5)
+    assert client.posts == []
+    assert client.calls["all"] == 1
+    scheduler.submit("SeriesSearch", seriesId=6)
+    assert client.posts == [("SeriesSearch", {"seriesId": 6})]
+    #  Server's commands are only listed once per sync_interval
+    assert client.calls["all"] == 1
+
+    finish_all(client, waiter)
+    assert future.result().id == 1
+
+
+def test_scheduler_limits() -> None:
+    """Commands over the limit for their kind are queued by priority."""
+    client = FakeClient()
+    waiter = CommandWaiter(client)
+    scheduler = CommandScheduler(
+        client, waiter=waiter, limits={"RescanSeries": 2}, sync_interval=None
+    )
+
+    futures = {
+        seriesId: scheduler.submit("RescanSeries", priority, seriesId=seriesId)
+        for seriesId, priority in [(1, 0), (2, 0), (3, 0), (4, 5), (5, 0)]
+    }
+    #  Unlimited kind
+    scheduler.submit("Backup")
+    posted = [kwargs.get("seriesId") for name, kwargs in client.posts]
+    assert posted == [1, 2, None]
+    assert scheduler.queued == 3
+    assert scheduler.running("RescanSeries") == 2
+
+    #  Raise priority of a queued command by resubmitting it
+    assert scheduler.submit("RescanSeries", priority=9, seriesId=5) is futures[5]
+
+    finish_all(client, waiter)
+    posted = [kwargs.get("seriesId") for name, kwargs in client.posts]
+    assert posted == [1, 2, None, 5, 4]
+    assert futures[1].done() and not futures[4].done()
+
+    finish_all(client, waiter)
+    finish_all(client, waiter)
+    assert all(future.done() for future in futures.values())
+    assert scheduler.queued == 0
+    assert scheduler.running("RescanSeries") == 0
+    assert scheduler.posted == 6
+
+
+def test_scheduler_post_error() -> None:
+    client = FakeClient()
+
+    def fail(name, **kwargs):
+        raise ArrHttpError("500", "Internal Server Error", "command")
+
+    setattr(client, "_post_command", fail)
+    scheduler = CommandScheduler(client, sync_interval=None)
+    future = scheduler.submit("RefreshSeries", seriesId=1)
+    with pytest.raises(ArrHttpError):
+        future.result()
+    assert scheduler.running("RefreshSeries") == 0
+    assert scheduler.queued == 0
+
+
+class FakeSearch:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, *ids):
+        self.calls.append(ids)
+        return replace(STATUS, id=len(self.calls), name="EpisodeSearch")
+
+
+def test_search_batcher_window() -> None:
+    search = FakeSearch()
+    batcher = SearchBatcher(search, window=0.05)
+    futures = [batcher.add(n) for n in (3, 1, 2, 1)]
+    assert batcher.pending == (3, 1, 2)
+    assert search.calls == []
+
+    statuses = [future.result(timeout=5) for future in futures]
+    assert search.calls == [(3, 1, 2)]
+    assert all(status is statuses[0] for status in statuses)
+    assert batcher.batches == 1
+
+    #  Next batch gets a new command
+    assert batcher.add(4).result(timeout=5).id == 2
+    assert search.calls == [(3, 1, 2), (4,)]
+
+
+def test_search_batcher_max_size() -> None:
+    search = FakeSearch()
+    batcher = SearchBatcher(search, window=60, max_size=3)
+    first = [batcher.add(n) for n in range(3)]
+    assert all(future.done() for future in first)
+    assert search.calls == [(0, 1, 2)]
+
+    second = batcher.add(3, 4)
+    assert not second.done()
+    flushed = batcher.flush()
+    assert flushed is not None and flushed.id == 2
+    assert second.result().id == 2
+    assert batcher.flush() is None
+    assert search.calls == [(0, 1, 2), (3, 4)]
+
+
+def test_search_batcher_empty() -> None:
+    """Adding no IDs resolves at once; flushing nothing keeps the batch"""
+    search = FakeSearch()
+    batcher = SearchBatcher(search, window=60)
+    assert batcher.add().result(timeout=0) is None
+
+    future = batcher.add(1)
+    assert batcher.add() is future
+    flushed = batcher.flush()
+    assert flushed is not None and flushed.id == 1
+    assert batcher.flush() is None
+    future = batcher.add(2)
+    assert batcher.flush() is not None
+    assert future.result(timeout=0).id == 2
+
+
+def test_search_batcher_stale_timer() -> None:
+    """A timer that fires after its batch was flushed leaves the next alone"""
+    search = FakeSearch()
+    batcher = SearchBatcher(search, window=60)
+    batcher.add(1)
+    stale = batcher._timer
+    assert stale is not None
+    batcher.flush()
+    future = batcher.add(2)
+    stale.function(*stale.args)
+    assert not future.done()
+    assert batcher.pending == (2,)
+    batcher.flush()
+    assert search.calls == [(1,), (2,)]
+
+
+def test_search_batcher_error() -> None:
+    def search(*ids):
+        raise ArrHttpError("500", "Internal Server Error", "command")
+
+    batcher = SearchBatcher(search, window=0.01)
+    future = batcher.add(1)
+    with pytest.raises(ArrHttpError):
+        future.result(timeout=5)
+
+    with SearchBatcher(search, window=60) as batcher:
+        future = batcher.add(1)
+    with pytest.raises(ArrHttpError):
+        future.result(timeout=5)
+
+
+@pytest.fixture
+def search_server():
+    yield from mock_routes_server({(HttpMethod.POST, "/api/command"): COMMAND})
+
+
+def test_search_batcher_client(search_server):
+    """SearchBatcher with SonarrClient.search_episodes()"""
+    client = SonarrClient("localhost", "MYKEY", port=search_server.server_port)
+    with SearchBatcher(client.search_episodes, window=60) as batcher:
+        futures = [batcher.add(n) for n in range(5)]
+    assert {future.result().id for future in futures} == {STATUS.id}
+
+    (request,) = search_server.requests
+    assert json.loads(request[3]) == {
+        "name": "EpisodeSearch",
+        "episodeIds": [0, 1, 2, 3, 4],
+    }
@@ -0,0 +1,109 @@
+"""Tests for downloadcarr.duplicates
+"""
+from dataclasses import replace
+import json
+
+from downloadcarr.client import ArrConnectionError
+from downloadcarr.duplicates import Copy, DuplicateIndex, external_id
+from downloadcarr.fleet import FleetResult, InstanceResult
+import downloadcarr.sonarr.models as sonarr_models
+import downloadcarr.radarr.models as radarr_models
+
+from .sonarr import ALLSERIES
+from .radarr import MOVIES, QUEUE
+
+
+SERIES = sonarr_models.Series.from_dict(json.loads(ALLSERIES)[0])
+MOVIE = radarr_models.Movie.from_dict(json.loads(MOVIES)[0])
+
+
+def series(id, tvdbId, sizeOnDisk=100):
+    return replace(SERIES, id=id, tvdbId=tvdbId, sizeOnDisk=sizeOnDisk)
+
+
+def movie(id, tmdbId, sizeOnDisk=100):
+    return replace(MOVIE, id=id, tmdbId=tmdbId, sizeOnDisk=sizeOnDisk)
+
+
+def test_external_id() -> None:
+    assert external_id(SERIES) == ("tvdb", 281662)
+    assert external_id(MOVIE) == ("tmdb", 121856)
+    assert external_id(replace(SERIES, tvdbId=0)) is None
+
+
+def test_copy() -> None:
+    copy = Copy.from_item("tv", SERIES)
+    assert copy == Copy("tv", 7, SERIES.title, 79282273693, 6)
+    assert copy.quality is None
+    #  Without a total, sum the seasons
+    copy = Copy.from_item("tv", replace(SERIES, sizeOnDisk=None))
+    sizes = [
+        season.statistics.sizeOnDisk for season in SERIES.seasons if season.statistics
+    ]
+    assert len(sizes) == len(SERIES.seasons)
+    assert copy.sizeOnDisk == sum(sizes)
+
+    queued = radarr_models.QueueItem.from_dict(json.loads(QUEUE)[0])
+    assert Copy.from_item("movies", queued.movie).quality == "WEBDL-1080p"
+    assert Copy.from_item("movies", MOVIE).quality is None
+
+
+def test_duplicates() -> None:
+    index = DuplicateIndex()
+    index.update("hd", [series(1, 10, 300), series(2, 20), series(3, 0)])
+    index.update("4k", [series(5, 10, 1000), series(6, 30)])
+    index.update("movies", [movie(1, 10)])
+    assert len(index) == 4
+    assert ("tvdb", 10) in index
+    assert index.instances == ("hd", "4k", "movies")
+
+    (duplicate,) = index.duplicates()
+    assert duplicate.externalId == ("tvdb", 10)
+    assert sorted((c.instance, c.id) for c in duplicate.copies) == [
+        ("4k", 5),
+        ("hd", 1),
+    ]
+    assert duplicate.sizeOnDisk == 1300
+    assert duplicate.redundant == 300
+    assert index.redundant == 300
+    assert [c.id for c in index.lookup(("tmdb", 10))] == [1]
+    assert index.lookup(("tmdb", 99)) == ()
+
+
+def test_incremental() -> None:
+    """A new snapshot replaces only its own instance's copies"""
+    index = DuplicateIndex()
+    index.update("a", [series(1, 10), series(2, 20)])
+    index.update("b", [series(1, 10)])
+    assert [d.externalId for d in index.duplicates()] == [("tvdb", 10)]
+
+    index.update("b", [series(1, 20, 50), series(2, 30)])
+    assert [d.externalId for d in index.duplicates()] == [("tvdb", 20)]
+    assert [c.instance for c in index.lookup(("tvdb", 10))] == ["a"]
+
+    index.remove("a")
+    assert index.duplicates() == ()
+    assert ("tvdb", 10) not in index
+    assert len(index) == 2
+
+
+def test_ordering() -> None:
+    index = DuplicateIndex()
+    index.update("a", [movie(1, 1, 10), movie(2, 2, 500)])
+    index.update("b", [movie(1, 1, 10), movie(2, 2, 500)])
+    assert [d.externalId for d in index.duplicates()] == [("tmdb", 2), ("tmdb", 1)]
+
+
+def test_update_all() -> None:
+    """Instances failing in a fleet call keep their previous snapshot"""
+    index = DuplicateIndex()
+    index.update("b", [movie(1, 1)])
+    result = FleetResult(
+        (
+            InstanceResult("a", (movie(1, 1), movie(2, 2))),
+            InstanceResult("b", error=ArrConnectionError("b", "Timeout")),
+        )
+    )
+    index.update_all(result)
+    assert [d.externalId for d in index.duplicates()] == [("tmdb", 1)]
+    assert len(index) == 2
@@ -0,0 +1,175 @@
+"""Tests for downloadcarr.fleet
+"""
+import threading
+import time
+from typing import Dict, Mapping, cast
+
+import pytest
+
+from downloadcarr.client import ArrConnectionError, ArrHttpError, Client
+from downloadcarr.enums import HttpMethod
+from downloadcarr.fleet import Fleet, Tagged, client_from_config
+from downloadcarr.radarr import RadarrClient
+from downloadcarr.sonarr import SonarrClient
+import downloadcarr.sonarr.models as sonarr_models
+import downloadcarr.radarr.models as radarr_models
+
+from . import mock_routes_server
+from .sonarr import ALLSERIES
+from .radarr import MOVIES
+
+
+class FakeClient:
+    def __init__(self, result=None, error=None, block=None, delay=0.0):
+        self.result = result
+        self.error = error
+        self.block = block
+        self.delay = delay
+
+    def get_queue(self):
+        if self.block is not None:
+            self.block.wait(5)
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def fakes(clients: Mapping[str, FakeClient]) -> Dict[str, Client]:
+    """FakeClients, typed as the Clients they stand in for."""
+    return cast(Dict[str, Client], dict(clients))
+
+
+def test_client_from_config() -> None:
+    name, client = client_from_config(
+        {"type": "Sonarr", "name": "tv-4k", "host": "tv", "api_key": "KEY"}
+    )
+    assert name == "tv-4k"
+    assert client == SonarrClient("tv", "KEY")
+
+    name, client = client_from_config(
+        {"type": "radarr", "host": "movies", "api_key": "KEY", "port": 7878}
+    )
+    assert name == "movies:7878"
+    assert isinstance(client, RadarrClient)
+
+    with pytest.raises(ValueError):
+        client_from_config({"type": "lidarr", "host": "music", "api_key": "KEY"})
+
+
+def test_from_configs() -> None:
+    configs = [
+        {"type": "sonarr", "host": "tv", "api_key": "KEY"},
+        {"type": "radarr", "host": "movies", "api_key": "KEY"},
+    ]
+    fleet = Fleet.from_configs(configs, timeout=5)
+    assert list(fleet) == ["tv:8989", "movies:7878"]
+    assert fleet.timeout == 5
+    assert list(fleet.subset(RadarrClient)) == ["movies:7878"]
+
+    with pytest.raises(ValueError):
+        Fleet.from_configs(configs + configs[:1])
+
+
+def test_call() -> None:
+    """Results are merged & tagged; failures don't lose the other results"""
+    error = ArrHttpError("500", "Internal Server Error", "http://c")
+    fleet = Fleet(
+        fakes(
+            {
+                "a": FakeClient((1, 2)),
+                "b": FakeClient(error=error, delay=0.05),
+                "c": FakeClient([3]),
+                "d": FakeClient(None),
+            }
+        )
+    )
+    result = fleet.call("get_queue")
+    assert [r.instance for r in result] == ["a", "b", "c", "d"]
+    assert [r.instance for r in result.failed] == ["b"]
+    assert result.errors == {"b": error}
+    assert result["b"].elapsed >= 0.05
+    assert result["a"].result == (1, 2)
+    assert result.items() == (Tagged("a", 1), Tagged("a", 2), Tagged("c", 3))
+
+
+def test_timeout() -> None:
+    """A slow instance is abandoned after the timeout"""
+    block = threading.Event()
+    fleet = Fleet(fakes({"slow": FakeClient(block=block), "fast": FakeClient(())}), 0.1)
+    try:
+        result = fleet.call("get_queue")
+    finally:
+        block.set()
+    assert result["fast"].ok
+    slow = result["slow"]
+    assert isinstance(slow.error, ArrConnectionError)
+    assert slow.elapsed == 0.1
+
+
+def test_timeout_queued() -> None:
+    """Each instance is timed from when its call starts, not while queued"""
+    clients = fakes({str(n): FakeClient([n], delay=0.1) for n in range(4)})
+    result = Fleet(clients, 0.3, max_workers=1).call("get_queue")
+    assert not result.failed
+    assert all(r.elapsed < 0.3 for r in result)
+
+    block = threading.Event()
+    clients = fakes({"slow": FakeClient(block=block), "fast": FakeClient(())})
+    try:
+        result = Fleet(clients, 0.1, max_workers=1).call("get_queue")
+    finally:
+        block.set()
+    assert [r.instance for r in result.failed] == ["slow"]
+    assert result["fast"].ok
+
+
+def test_empty() -> None:
+    assert Fleet({}).call("get_queue").results == ()
+
+
+@pytest.fixture
+def sonarr_server():
+    yield from mock_routes_server({(HttpMethod.GET, "/api/series"): ALLSERIES})
+
+
+@pytest.fixture
+def radarr_server():
+    yield from mock_routes_server({(HttpMethod.GET, "/api/movie"): MOVIES})
+
+
+def test_map(sonarr_server, radarr_server):
+    """Fleet.map() with real clients of both kinds"""
+    fleet = Fleet.from_configs(
+        [
+            {
+                "type": "sonarr",
+                "name": "tv",
+                "host": "localhost",
+                "api_key": "KEY",
+                "port": sonarr_server.server_port,
+            },
+            {
+                "type": "radarr",
+                "name": "movies",
+                "host": "localhost",
+                "api_key": "KEY",
+                "port": radarr_server.server_port,
+            },
+        ]
+    )
+
+    def library(client):
+        if isinstance(client, SonarrClient):
+            return client.get_all_series()
+        return client.get_movies()
+
+    result = fleet.map(library)
+    assert result.failed == ()
+    items = result.items()
+    assert {tagged.instance for tagged in items} == {"tv", "movies"}
+    for tagged in items:
+        if tagged.instance == "tv":
+            assert isinstance(tagged.item, sonarr_models.Series)
+        else:
+            assert isinstance(tagged.item, radarr_models.Movie)
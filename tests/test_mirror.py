@@ -0,0 +1,215 @@
+"""Tests for downloadcarr.mirror
+"""
+from dataclasses import replace
+import json
+import sqlite3
+
+import pytest
+
+from downloadcarr.client import ArrClientError
+from downloadcarr.enums import HttpMethod
+from downloadcarr.mirror import Mirror, load_history, load_radarr, load_sonarr
+from downloadcarr.radarr import RadarrClient
+from downloadcarr.sonarr import SonarrClient
+import downloadcarr.sonarr.models as sonarr_models
+import downloadcarr.radarr.models as radarr_models
+
+from . import mock_routes_server
+from .sonarr import ALLSERIES, EPISODES, EPISODEFILES, HISTORY
+from .radarr import HISTORY as RADARR_HISTORY
+from .radarr import MOVIES, QUEUE
+
+
+SERIES = sonarr_models.Series.from_dict(json.loads(ALLSERIES)[0])
+EPISODE = sonarr_models.Episode.from_dict(json.loads(EPISODES)[0])
+EPISODEFILE = sonarr_models.EpisodeFile.from_dict(json.loads(EPISODEFILES)[0])
+MOVIE = radarr_models.Movie.from_dict(json.loads(MOVIES)[0])
+#  Movie with a file
+QUEUED_MOVIE = radarr_models.QueueItem.from_dict(json.loads(QUEUE)[0]).movie
+
+
+def test_series() -> None:
+    other = replace(SERIES, id=8, tvdbId=1, seasons=())
+    with Mirror() as mirror:
+        assert mirror.upsert_series([SERIES, other]) == 2
+        assert mirror.get_all_series() == (SERIES, other)
+        assert mirror.get_series(7) == SERIES
+        assert mirror.get_series_by_tvdb(1) == (other,)
+        assert mirror.get_seasons(7) == SERIES.seasons
+        assert mirror.query("SELECT COUNT(*) FROM season") == [(2,)]
+
+        #  Seasons are replaced with their series
+        mirror.upsert_series([replace(SERIES, seasons=SERIES.seasons[:1])])
+        assert mirror.get_seasons(7) == SERIES.seasons[:1]
+
+        with pytest.raises(ArrClientError):
+            mirror.get_series(99)
+
+
+def test_many_series() -> None:
+    """Reading series binds no parameter per series"""
+    with Mirror() as mirror:
+        if hasattr(mirror._conn, "setlimit"):
+            #  Limit of SQLite before 3.32
+            mirror._conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        mirror.upsert_series(replace(SERIES, id=id) for id in range(1, 1200))
+        series = mirror.get_all_series()
+        assert len(series) == 1199
+        assert series[-1].seasons == SERIES.seasons
+
+
+def test_episodes() -> None:
+    gone = replace(EPISODE, id=99)
+    with Mirror() as mirror:
+        mirror.upsert_episodes([EPISODE, gone])
+        mirror.upsert_episode_files([EPISODEFILE])
+        assert mirror.get_episodes(1) == (EPISODE, gone)
+        assert mirror.get_episode_files(1) == (EPISODEFILE,)
+
+        mirror.replace_episodes(1, [EPISODE], [])
+        assert mirror.get_episodes(1) == (EPISODE,)
+        assert mirror.get_episode_files(1) == ()
+
+
+def test_delete_series() -> None:
+    with Mirror() as mirror:
+        mirror.upsert_series([replace(SERIES, id=1)])
+        mirror.upsert_episodes([EPISODE])
+        mirror.upsert_episode_files([EPISODEFILE])
+        mirror.delete_series(1)
+        for table in ("series", "season", "episode", "episodefile"):
+            assert mirror.query(f"SELECT COUNT(*) FROM {table}") == [(0,)]
+
+
+def test_movies() -> None:
+    assert MOVIE.id is not None and QUEUED_MOVIE.id is not None
+    with Mirror() as mirror:
+        mirror.upsert_movies([MOVIE, QUEUED_MOVIE])
+        assert mirror.get_movies() == (MOVIE, QUEUED_MOVIE)
+        assert mirror.get_movie(MOVIE.id) == MOVIE
+        assert mirror.get_movies_by_tmdb(MOVIE.tmdbId) == (MOVIE,)
+        assert mirror.get_movie_file(QUEUED_MOVIE.id) == QUEUED_MOVIE.movieFile
+        assert mirror.get_movie_file(MOVIE.id) is None
+        assert mirror.query("SELECT movieId, quality FROM moviefile") == [
+            (QUEUED_MOVIE.id, "WEBDL-1080p")
+        ]
+
+        mirror.delete_movies(QUEUED_MOVIE.id)
+        assert mirror.get_movies() == (MOVIE,)
+        with pytest.raises(ArrClientError):
+            mirror.get_movie(QUEUED_MOVIE.id)
+
+
+def test_downloads() -> None:
+    episodes = sonarr_models.History.from_dict(json.loads(HISTORY)).records
+    movies = radarr_models.History.from_dict(json.loads(RADARR_HISTORY)).records
+    with Mirror() as mirror:
+        assert mirror.upsert_downloads(episodes + movies) == 3
+        assert set(mirror.get_downloads()) == set(episodes + movies)
+        assert set(mirror.get_downloads(seriesId=60)) == set(episodes)
+        assert mirror.get_downloads(movieId=13) == movies
+        assert mirror.get_downloads(downloadId="SABnzbd_nzo_tlsnni") == episodes[:1]
+        assert mirror.get_downloads(seriesId=60, episodeId=1) == ()
+
+
+def test_wal(tmp_path) -> None:
+    path = str(tmp_path / "mirror.db")
+    with Mirror(path) as writer, Mirror(path) as reader:
+        assert writer.query("PRAGMA journal_mode") == [("wal",)]
+        writer.upsert_movies([MOVIE])
+        assert reader.get_movies() == (MOVIE,)
+
+
+def test_transaction() -> None:
+    with Mirror() as mirror:
+        with pytest.raises(RuntimeError):
+            with mirror.transaction():
+                mirror.upsert_movies([MOVIE])
+                raise RuntimeError
+        assert mirror.get_movies() == ()
+
+
+@pytest.fixture
+def sonarr_server():
+    def per_series(template):
+        def respond(query, body):
+            seriesId = int(query["seriesId"][0])
+            if seriesId == 404:
+                return 404
+            items = json.loads(template)
+            for item in items:
+                item["seriesId"] = seriesId
+                item["id"] += seriesId * 100
+            return json.dumps(items)
+
+        return respond
+
+    series = json.loads(ALLSERIES)
+    series.append(dict(series[0], id=8))
+    routes = {
+        (HttpMethod.GET, "/api/series"): json.dumps(series),
+        (HttpMethod.GET, "/api/episode"): per_series(EPISODES),
+        (HttpMethod.GET, "/api/episodefile"): per_series(EPISODEFILES),
+        (HttpMethod.GET, "/api/history"): HISTORY,
+    }
+    yield from mock_routes_server(routes)
+
+
+def test_load_sonarr(sonarr_server):
+    client = SonarrClient("localhost", "MYKEY", port=sonarr_server.server_port)
+    with Mirror() as mirror:
+        mirror.upsert_series([replace(SERIES, id=3)])
+        counts = load_sonarr(mirror, client)
+        assert counts == {"series": 2, "episode": 2, "episodefile": 2}
+        #  Series no longer on the server are dropped
+        assert [s.id for s in mirror.get_all_series()] == [7, 8]
+        (episode,) = mirror.get_episodes(8)
+        assert episode.id == EPISODE.id + 800
+        assert mirror.get_episode_files(7)[0].id == EPISODEFILE.id + 700
+
+        count = load_history(mirror, client, pageSize=2, max_pages=3)
+        assert count == 6
+        pages = [
+            query["page"]
+            for (_, path, query, _) in sonarr_server.requests
+            if path == "/api/history"
+        ]
+        assert pages == [["1"], ["2"], ["3"]]
+        assert len(mirror.get_downloads()) == 2
+
+
+def test_load_sonarr_error(sonarr_server):
+    """A failed fetch leaves the mirror untouched"""
+    series = json.loads(ALLSERIES)[0]
+    series["id"] = 404
+    sonarr_server.RequestHandlerClass.routes[
+        (HttpMethod.GET, "/api/series")
+    ] = json.dumps([series])
+    client = SonarrClient("localhost", "MYKEY", port=sonarr_server.server_port)
+    with Mirror() as mirror:
+        mirror.upsert_series([SERIES])
+        with pytest.raises(ArrClientError):
+            load_sonarr(mirror, client, retries=0)
+        assert mirror.get_all_series() == (SERIES,)
+
+
+@pytest.fixture
+def radarr_server():
+    routes = {
+        (HttpMethod.GET, "/api/movie"): MOVIES,
+        (HttpMethod.GET, "/api/history"): RADARR_HISTORY,
+    }
+    yield from mock_routes_server(routes)
+
+
+def test_load_radarr(radarr_server):
+    client = RadarrClient("localhost", "MYKEY", port=radarr_server.server_port)
+    with Mirror() as mirror:
+        mirror.upsert_movies([QUEUED_MOVIE])
+        assert load_radarr(mirror, client) == {"movie": 1, "moviefile": 0}
+        assert mirror.get_movies() == (MOVIE,)
+        assert mirror.query("SELECT COUNT(*) FROM moviefile") == [(0,)]
+
+        #  History stops at the last page
+        assert load_history(mirror, client) == 1
+        assert mirror.get_downloads()[0].movieId == 13
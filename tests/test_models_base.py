@@ -143,6 +143,10 @@ def test_encode_time():
     encoded = models.base.encode_time(time(13, 38, 55))
     assert encoded == "13:38:55"
 
+    # Whole seconds ending in zero
+    encoded = models.base.encode_time(time(13, 38, 0))
+    assert encoded == "13:38:00"
+
     # milliseconds
     encoded = models.base.encode_time(time(13, 38, 55, 123000))
     assert encoded == "13:38:55.123"
@@ -162,6 +166,10 @@ def test_encode_timedelta():
     encoded = models.base.encode_timedelta(timedelta(hours=13, minutes=38, seconds=55))
     assert encoded == "13:38:55"
 
+    # Whole seconds ending in zero
+    encoded = models.base.encode_timedelta(timedelta(hours=13, minutes=30))
+    assert encoded == "13:30:00"
+
     # milliseconds
     encoded = models.base.encode_timedelta(
         timedelta(hours=13, minutes=38, seconds=55, milliseconds=123)
@@ -0,0 +1,97 @@
+"""Tests for downloadcarr.ndjson
+"""
+import gzip
+import io
+import json
+
+import pytest
+
+from downloadcarr.enums import HttpMethod
+from downloadcarr.mirror import Mirror
+from downloadcarr.ndjson import (
+    NdjsonWriter,
+    decode_each,
+    dump,
+    iter_history,
+    load,
+)
+from downloadcarr.sonarr import SonarrClient
+import downloadcarr.sonarr.models as sonarr_models
+import downloadcarr.radarr.models as radarr_models
+
+from . import mock_routes_server
+from .sonarr import ALLSERIES, HISTORY
+from .radarr import MOVIES
+
+
+def test_round_trip(tmp_path) -> None:
+    series = tuple(decode_each(sonarr_models.Series, json.loads(ALLSERIES)))
+    path = tmp_path / "series.ndjson"
+    assert dump(iter(series), path) == len(series)
+    lines = path.read_text().splitlines()
+    assert len(lines) == len(series)
+    assert json.loads(lines[0]) == series[0].to_dict()
+    assert tuple(load(sonarr_models.Series, path)) == series
+
+
+def test_gzip(tmp_path) -> None:
+    movies = tuple(decode_each(radarr_models.Movie, json.loads(MOVIES)))
+    path = tmp_path / "movies.ndjson.gz"
+    dump(movies, path)
+    with gzip.open(path, "rt") as f:
+        assert len(f.readlines()) == len(movies)
+    assert tuple(load(radarr_models.Movie, path)) == movies
+
+    #  Compression is detected on reading, whatever the name
+    renamed = tmp_path / "movies.ndjson"
+    dump(movies, renamed, compress=True)
+    assert renamed.read_bytes()[:2] == b"\x1f\x8b"
+    assert tuple(load(radarr_models.Movie, renamed)) == movies
+
+
+def test_append_file_objects(tmp_path) -> None:
+    (movie,) = decode_each(radarr_models.Movie, json.loads(MOVIES))
+    path = tmp_path / "movies.ndjson.gz"
+    with NdjsonWriter(path) as writer:
+        writer.write(movie)
+    with NdjsonWriter(path, append=True) as writer:
+        assert writer.write_all([movie, movie]) == 2
+        assert writer.count == 2
+    assert len(list(load(radarr_models.Movie, path))) == 3
+
+    buffer = io.StringIO()
+    with NdjsonWriter(buffer) as writer:
+        writer.write(movie)
+    assert not buffer.closed
+    buffer.write("\n")
+    buffer.seek(0)
+    assert list(load(radarr_models.Movie, buffer)) == [movie]
+
+
+def test_load_lazy_errors() -> None:
+    (movie,) = decode_each(radarr_models.Movie, json.loads(MOVIES))
+    buffer = io.StringIO(json.dumps(movie.to_dict()) + "\n" + '{"id": "x"}\n')
+    models = load(radarr_models.Movie, buffer)
+    assert next(models) == movie
+    with pytest.raises(ValueError) as excinfo:
+        next(models)
+    assert "line 2" in str(excinfo.value)
+
+
+@pytest.fixture
+def history_server():
+    yield from mock_routes_server({(HttpMethod.GET, "/api/history"): HISTORY})
+
+
+def test_history_replay(history_server, tmp_path) -> None:
+    """Crawled history is archived page by page, and replayed into a mirror"""
+    client = SonarrClient("localhost", "MYKEY", port=history_server.server_port)
+    path = tmp_path / "history.ndjson.gz"
+    records = iter_history(client, pageSize=2, max_pages=3)
+    assert dump(records, path) == 6
+    pages = [query["page"] for (_, _, query, _) in history_server.requests]
+    assert pages == [["1"], ["2"], ["3"]]
+
+    with Mirror() as mirror:
+        assert mirror.upsert_downloads(load(sonarr_models.Download, path)) == 6
+        assert len(mirror.get_downloads()) == 2
@@ -0,0 +1,326 @@
+"""Tests for downloadcarr.push
+"""
+from dataclasses import replace
+from datetime import date, datetime, timedelta, timezone
+import json
+import time
+from typing import List
+
+import pytest
+
+from downloadcarr.calendar import CalendarCache
+from downloadcarr.commands import CommandWaiter
+from downloadcarr.enums import HttpMethod, PushAction
+from downloadcarr.mirror import Mirror
+from downloadcarr.models import CommandStatus
+from downloadcarr.push import SONARR_MODELS, PushEvent, PushSubscriber, parse_messages
+from downloadcarr.queue import QueueWatcher
+from downloadcarr.sonarr import SonarrClient
+from downloadcarr.sonarr.client import episode_dates
+import downloadcarr.sonarr.models as models
+
+from . import COMMAND, COMMANDS, mock_signalr_server
+from .sonarr import ALLSERIES, EPISODES, QUEUE
+
+
+def invocation(name, action, resource=None):
+    body = {"action": action}
+    if resource is not None:
+        body["resource"] = resource
+    message = {
+        "type": 1,
+        "target": "receiveMessage",
+        "arguments": [{"name": name, "body": body}],
+    }
+    return json.dumps(message) + "\x1e"
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_parse_messages() -> None:
+    command = json.loads(COMMAND)
+    data = (
+        '{"type":6}\x1e'
+        + invocation("command", "updated", command)
+        + invocation("queue", "sync")
+        + invocation("queue/status", "updated", {"totalCount": 1})
+        + invocation("series", "refreshed", {"id": 7})
+    )
+    messages, events = parse_messages(data, SONARR_MODELS)
+    assert len(messages) == 5
+    assert messages[0] == {"type": 6}
+    assert [(e.name, e.action) for e in events] == [
+        ("command", PushAction.UPDATED),
+        ("queue", PushAction.SYNC),
+        ("queue/status", PushAction.UPDATED),
+        ("series", PushAction.UNKNOWN),
+    ]
+    assert isinstance(events[0].model, CommandStatus)
+    assert events[0].id == 368630
+    assert events[1].resource is None
+    assert events[2].model is None
+
+    #  Resources not fitting the models aren't decoded
+    data = invocation("series", "updated", {"id": 7})
+    (event,) = parse_messages(data, SONARR_MODELS)[1]
+    assert event == PushEvent("series", PushAction.UPDATED, model=None)
+    assert event.id == 7
+
+
+@pytest.fixture
+def server():
+    yield from mock_signalr_server(
+        {
+            (HttpMethod.GET, "/api/queue"): QUEUE,
+            (HttpMethod.GET, "/api/command"): COMMANDS,
+        }
+    )
+
+
+def requests(server, path):
+    return sum(1 for request in server.requests if request[1] == path)
+
+
+def test_subscriber(server) -> None:
+    client = SonarrClient("localhost", "MYKEY", port=server.server_port)
+    subscriber = PushSubscriber(client, min_backoff=0.01)
+    received: List[PushEvent] = []
+    subscriber.subscribe(received.append)
+
+    with subscriber:
+        assert subscriber.wait_connected(5)
+        assert server.wait_clients(1)
+        (item,) = subscriber.get_queue()
+        assert isinstance(item, models.QueueItem)
+        assert [c.id for c in subscriber.get_all_commands_status()] == [
+            368621,
+            368629,
+        ]
+        assert requests(server, "/api/queue") == 1
+        assert requests(server, "/api/command") == 1
+        (_, _, query, _) = server.requests[0]
+        assert server.requests[0][1] == "/signalr/messages/negotiate"
+        assert query == {"negotiateVersion": ["1"]}
+
+        #  Changes pushed are served without asking the server
+        server.push("command", "updated", json.loads(COMMAND))
+        server.push("queue", "deleted", {"id": item.id})
+        wait_for(lambda: len(received) == 2)
+        assert subscriber.get_queue() == ()
+        assert [c.id for c in subscriber.get_all_commands_status()] == [
+            368621,
+            368629,
+            368630,
+        ]
+        assert requests(server, "/api/queue") == 1
+        assert requests(server, "/api/command") == 1
+
+        #  Sync refetches
+        server.push("queue", "sync")
+        wait_for(lambda: len(received) == 3)
+        assert subscriber.get_queue() == (item,)
+        assert requests(server, "/api/queue") == 2
+
+        #  Server pings are answered
+        server.send('{"type":6}\x1e')
+        wait_for(lambda: '{"type": 6}\x1e' in server.received)
+
+        #  Reconnects & resyncs after losing the connection
+        server.drop()
+        assert server.wait_clients(2)
+        wait_for(lambda: subscriber.connections == 2)
+        assert requests(server, "/api/command") == 2
+        assert subscriber.running
+
+    assert not subscriber.running
+    assert not subscriber.connected
+    assert [event.name for event in received] == ["command", "queue", "queue"]
+    assert subscriber.received == 3
+
+
+def test_subscriber_library(server) -> None:
+    cache: CalendarCache = CalendarCache()
+    client = SonarrClient(
+        "localhost", "MYKEY", port=server.server_port, calendar_cache=cache
+    )
+    episode = models.Episode.from_dict(json.loads(EPISODES)[0])
+    aired = date(2009, 9, 18)
+    other = replace(
+        episode, seriesId=8, airDateUtc=datetime(2009, 9, 20, tzinfo=timezone.utc)
+    )
+    cache.get(
+        aired,
+        aired + timedelta(days=7),
+        lambda start, end: (replace(episode, seriesId=7), other),
+        episode_dates,
+    )
+    series = json.loads(ALLSERIES)[0]
+    with Mirror() as mirror, PushSubscriber(client, mirror) as subscriber:
+        assert subscriber.wait_connected(5)
+        received: List[PushEvent] = []
+        subscriber.subscribe(received.append)
+        server.push("series", "updated", series)
+        wait_for(lambda: len(received) == 1)
+        assert [s.id for s in mirror.get_all_series()] == [7]
+        #  Only the days of the series' episodes are dropped from the calendar
+        assert cache.intervals == (
+            (aired + timedelta(days=1), aired + timedelta(days=7)),
+        )
+
+        server.push("series", "deleted", {"id": 7})
+        wait_for(lambda: len(received) == 2)
+        assert mirror.get_all_series() == ()
+
+
+#  Resources in the shape pushed by newer (v3) servers
+COMMAND_V3 = {
+    "name": "RefreshSeries",
+    "commandName": "Refresh Series",
+    "message": "Completed",
+    "body": {"sendUpdatesToClient": True, "trigger": "manual"},
+    "priority": "normal",
+    "status": "completed",
+    "queued": "2020-04-06T16:57:51.406504Z",
+    "started": "2020-04-06T16:57:51.417931Z",
+    "ended": "2020-04-06T16:57:52.417931Z",
+    "duration": "00:00:01",
+    "trigger": "manual",
+    "stateChangeTime": "2020-04-06T16:57:51.417931Z",
+    "sendUpdatesToClient": True,
+    "updateScheduledTask": True,
+    "id": 368631,
+}
+
+QUEUE_V3 = {
+    "seriesId": 1,
+    "episodeId": 2,
+    "languages": [{"id": 1, "name": "English"}],
+    "quality": {
+        "quality": {"id": 3, "name": "WEBDL-1080p"},
+        "revision": {"version": 1, "real": 0, "isRepack": False},
+    },
+    "size": 2000000000,
+    "title": "Show.S01E02.1080p.WEB-DL",
+    "sizeleft": 1000000000,
+    "timeleft": "00:10:00",
+    "estimatedCompletionTime": "2020-04-06T17:07:51Z",
+    "status": "downloading",
+    "trackedDownloadStatus": "ok",
+    "trackedDownloadState": "downloading",
+    "statusMessages": [],
+    "downloadId": "SABnzbd_nzo_1",
+    "protocol": "usenet",
+    "downloadClient": "SABnzbd",
+    "indexer": "NZBgeek",
+    "id": 123,
+}
+
+
+def test_subscriber_v3(server) -> None:
+    """Resources in newer shapes are decoded leniently, and applied by ID"""
+    client = SonarrClient("localhost", "MYKEY", port=server.server_port)
+    with PushSubscriber(client) as subscriber:
+        assert subscriber.wait_connected(5)
+        received: List[PushEvent] = []
+        subscriber.subscribe(received.append)
+        (item,) = subscriber.get_queue()
+        server.push("command", "updated", COMMAND_V3)
+        server.push("queue", "updated", dict(QUEUE_V3, id=item.id))
+        wait_for(lambda: len(received) == 2)
+        assert isinstance(received[0].model, CommandStatus)
+        command = subscriber.get_all_commands_status()[-1]
+        assert isinstance(command, CommandStatus)
+        assert (command.id, command.state) == (368631, "completed")
+        assert subscriber.get_command_status(368631) == command
+
+        #  Attributes missing from the newer shape are kept from the item held
+        (updated,) = subscriber.get_queue()
+        assert isinstance(updated, models.QueueItem)
+        assert updated.sizeleft == 1000000000
+        assert updated.series == item.series
+        assert updated.statusMessages == item.statusMessages
+        assert requests(server, "/api/queue") == 1
+        assert requests(server, "/api/command") == 1
+
+        #  Consumers of the client's methods can be served
+        QueueWatcher(subscriber).poll()
+        waiter = CommandWaiter(subscriber)
+        future = waiter.watch(368631)
+        waiter.poll()
+        assert future.result(timeout=0) == command
+
+        #  A new queue item that doesn't fit is fetched with the whole queue
+        server.push("queue", "added", QUEUE_V3)
+        wait_for(lambda: len(received) == 3)
+        assert requests(server, "/api/queue") == 2
+        assert subscriber.get_queue() == (item,)
+        assert requests(server, "/api/command") == 1
+
+
+def test_subscriber_errors(server, caplog) -> None:
+    """Bad messages & failing callbacks are logged, and the feed read on"""
+    client = SonarrClient("localhost", "MYKEY", port=server.server_port)
+    received: List[PushEvent] = []
+
+    def callback(event):
+        received.append(event)
+        raise RuntimeError("callback failed")
+
+    with PushSubscriber(client) as subscriber:
+        assert subscriber.wait_connected(5)
+        subscriber.subscribe(callback)
+        server.send("not json\x1e")
+        server.send(b"\xff\xfe")
+        server.send('{"type":1,"target":"receiveMessage","arguments":[5]}\x1e')
+        server.send("[1]\x1e")
+        server.push("queue", "deleted", {"id": 1503378561})
+        wait_for(lambda: len(received) == 1)
+        assert subscriber.errors == 4
+        assert subscriber.running
+        assert subscriber.connected
+        assert subscriber.connections == 1
+        assert subscriber.get_queue() == ()
+    assert "callback failed" in caplog.text
+
+
+def test_subscriber_refetch_errors(server, caplog) -> None:
+    """A refetch answered with an HTTP error is logged; the feed is read on"""
+    client = SonarrClient("localhost", "MYKEY", port=server.server_port)
+    with Mirror() as mirror, PushSubscriber(client, mirror) as subscriber:
+        assert subscriber.wait_connected(5)
+        received: List[PushEvent] = []
+        subscriber.subscribe(received.append)
+        #  Doesn't fit, so refetched from /api/command/368632 & /api/series/9
+        server.push("command", "updated", {"id": 368632, "status": "queued"})
+        server.push("series", "updated", {"id": 9})
+        wait_for(lambda: len(received) == 2)
+        assert subscriber.errors == 2
+        assert subscriber.connected
+        assert subscriber.connections == 1
+        assert [c.id for c in subscriber.get_all_commands_status()] == [
+            368621,
+            368629,
+        ]
+    assert "404" in caplog.text
+
+
+def test_get_queue_unconnected(server) -> None:
+    """While not connected, the server is asked"""
+    client = SonarrClient("localhost", "MYKEY", port=server.server_port)
+    subscriber = PushSubscriber(client)
+    assert len(subscriber.get_queue()) == 1
+    assert len(subscriber.get_queue()) == 1
+    assert len(subscriber.get_all_commands_status()) == 2
+    assert requests(server, "/api/queue") == 2
+
+    with subscriber:
+        assert subscriber.wait_connected(5)
+        server.push("queue", "deleted", {"id": 1503378561})
+        wait_for(lambda: subscriber.get_queue() == ())
+    #  Not the stale state after disconnecting
+    assert len(subscriber.get_queue()) == 1
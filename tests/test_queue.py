@@ -0,0 +1,413 @@
+"""Tests for downloadcarr.queue
+"""
+import asyncio
+from dataclasses import replace
+from datetime import timedelta
+import json
+from typing import List
+
+import pytest
+
+from downloadcarr.queue import (
+    QueueEvent,
+    QueueWatcher,
+    StalledDetector,
+    Throughput,
+    ThroughputEstimator,
+    has_warning,
+    queue_key,
+)
+from downloadcarr.client import ArrConnectionError, ArrHttpError
+from downloadcarr.enums import HttpMethod, Protocol, QueueEventType
+from downloadcarr.radarr import RadarrClient
+from downloadcarr.sonarr import SonarrClient
+import downloadcarr.sonarr.models as models
+
+from . import COMMAND, mock_routes_server
+from .sonarr import QUEUE
+from .radarr import QUEUE as RADARR_QUEUE
+
+
+ITEM = models.QueueItem.from_dict(json.loads(QUEUE)[0])
+
+
+def item(id, sizeleft=100, status="Downloading", downloadId=None, **kwargs):
+    return replace(
+        ITEM,
+        id=id,
+        sizeleft=sizeleft,
+        status=status,
+        downloadId=downloadId or f"dl{id}",
+        **kwargs,
+    )
+
+
+class FakeClient:
+    def __init__(self, *queues):
+        self.queues = list(queues)
+
+    def get_queue(self):
+        queue = self.queues.pop(0) if len(self.queues) > 1 else self.queues[0]
+        if isinstance(queue, Exception):
+            raise queue
+        return tuple(queue)
+
+
+class CleaningClient(FakeClient):
+    def __init__(self, *queues, fail=()):
+        super().__init__(*queues)
+        self.fail = fail
+        self.deleted = []
+        self.searched = []
+
+    def delete_queue_item(self, queueItemId, blacklist=False):
+        if queueItemId in self.fail:
+            raise ArrHttpError("404", "Not Found", "http://localhost")
+        self.deleted.append((queueItemId, blacklist))
+
+    def search_episodes(self, *episodeIds):
+        self.searched.append(episodeIds)
+        return "COMMAND"
+
+
+def types(events):
+    return [(event.type, event.item.id) for event in events]
+
+
+def test_queue_key() -> None:
+    assert queue_key(item(1)) == ("dl1", 1)
+    #  Multi-episode releases share a download
+    assert queue_key(item(2, downloadId="dl1")) != queue_key(item(1))
+
+
+def test_poll() -> None:
+    client = FakeClient(
+        [item(1), item(2)],
+        [item(1, sizeleft=50), item(2), item(3)],
+        [item(1, sizeleft=50, status="Completed"), item(3)],
+        [
+            item(1, sizeleft=0, status="Completed", trackedDownloadStatus="Warning"),
+            item(3),
+        ],
+    )
+    watcher = QueueWatcher(client)
+    received: List[QueueEvent] = []
+    watcher.subscribe(received.append)
+
+    assert types(watcher.poll()) == [
+        (QueueEventType.ADDED, 1),
+        (QueueEventType.ADDED, 2),
+    ]
+    events = watcher.poll()
+    assert types(events) == [
+        (QueueEventType.PROGRESSED, 1),
+        (QueueEventType.ADDED, 3),
+    ]
+    assert events[0] == QueueEvent(QueueEventType.PROGRESSED, item(1, 50), item(1))
+    assert types(watcher.poll()) == [
+        (QueueEventType.STATUS_CHANGED, 1),
+        (QueueEventType.REMOVED, 2),
+    ]
+    assert types(watcher.poll()) == [
+        (QueueEventType.STATUS_CHANGED, 1),
+        (QueueEventType.PROGRESSED, 1),
+    ]
+    assert len(received) == 8
+    assert watcher.polls == 4
+    assert set(watcher.snapshot) == {("dl1", 1), ("dl3", 3)}
+
+
+def test_stalled() -> None:
+    queues = [[item(1), item(2, status="Paused")] for _ in range(6)]
+    queues.append([item(1, sizeleft=99)])
+    queues.append([item(1, sizeleft=99)])
+    watcher = QueueWatcher(FakeClient(*queues), stall_polls=3)
+
+    stalled = []
+    for _ in range(6):
+        events = watcher.poll()
+        stalled.append(types(events))
+    #  Reported once, after 3 polls without progress; paused items don't stall
+    assert stalled[3] == [(QueueEventType.STALLED, 1)]
+    assert all(events == [] for events in stalled[1:3] + stalled[4:])
+    assert watcher.unchanged(item(1)) == 5
+
+    watcher.poll()
+    assert watcher.unchanged(item(1)) == 0
+    watcher.poll()
+    assert watcher.unchanged(item(1)) == 1
+
+
+def test_adaptive_interval() -> None:
+    client = FakeClient(
+        [item(1)], [item(1)], [item(1, status="Completed")], [], [], [], []
+    )
+    watcher = QueueWatcher(client, min_interval=1, max_interval=5, backoff=2)
+    watcher.poll()
+    assert watcher.interval == 1
+    #  Active download
+    watcher.poll()
+    assert watcher.interval == 1
+    watcher.poll()
+    assert watcher.interval == 1
+    #  Removed
+    watcher.poll()
+    assert watcher.interval == 1
+    #  Idle
+    watcher.poll()
+    assert watcher.interval == 2
+    watcher.poll()
+    assert watcher.interval == 4
+    watcher.poll()
+    assert watcher.interval == 5
+
+
+def test_events() -> None:
+    """QueueWatcher.events() async iterator"""
+    client = FakeClient(
+        [item(1)],
+        ArrConnectionError("http://localhost", "Timeout"),
+        ValueError("undecodable"),
+        [item(1, sizeleft=10)],
+        [],
+    )
+    watcher = QueueWatcher(client, min_interval=0, max_interval=0)
+
+    async def collect(count):
+        events = []
+        async for event in watcher.events():
+            events.append(event)
+            if len(events) == count:
+                return events
+
+    events = asyncio.run(collect(3))
+    assert types(events) == [
+        (QueueEventType.ADDED, 1),
+        (QueueEventType.PROGRESSED, 1),
+        (QueueEventType.REMOVED, 1),
+    ]
+    assert watcher.errors == 1
+
+
+def test_background() -> None:
+    client = FakeClient([item(1)], [item(1, sizeleft=10)], [])
+    received: List[QueueEvent] = []
+    watcher = QueueWatcher(client, min_interval=0.01, max_interval=0.01)
+    watcher.subscribe(received.append)
+    with watcher:
+        for _ in range(500):
+            if len(received) == 3:
+                break
+            watcher._stop.wait(0.01)
+    assert not watcher.running
+    assert types(received) == [
+        (QueueEventType.ADDED, 1),
+        (QueueEventType.PROGRESSED, 1),
+        (QueueEventType.REMOVED, 1),
+    ]
+
+
+def test_background_errors(caplog) -> None:
+    """Unexpected errors & failing callbacks are logged; polling carries on"""
+    client = FakeClient(
+        [item(1)], ValueError("undecodable"), [item(1, sizeleft=10)], []
+    )
+    received: List[QueueEvent] = []
+
+    def callback(event):
+        received.append(event)
+        raise RuntimeError("callback failed")
+
+    watcher = QueueWatcher(client, min_interval=0.01, max_interval=0.01)
+    watcher.subscribe(callback)
+    with watcher:
+        for _ in range(500):
+            if len(received) == 3:
+                break
+            watcher._stop.wait(0.01)
+        assert watcher.running
+    assert types(received) == [
+        (QueueEventType.ADDED, 1),
+        (QueueEventType.PROGRESSED, 1),
+        (QueueEventType.REMOVED, 1),
+    ]
+    assert watcher.errors == 4
+    assert "undecodable" in caplog.text
+    assert "callback failed" in caplog.text
+
+
+@pytest.fixture
+def queue_server():
+    yield from mock_routes_server({(HttpMethod.GET, "/api/queue"): QUEUE})
+
+
+def test_watch_client(queue_server):
+    """QueueWatcher with SonarrClient"""
+    client = SonarrClient("localhost", "MYKEY", port=queue_server.server_port)
+    watcher = QueueWatcher(client)
+    (event,) = watcher.poll()
+    assert event.type is QueueEventType.ADDED
+    assert isinstance(event.item, models.QueueItem)
+    assert watcher.poll() == []
+
+
+def estimate_of(estimator: ThroughputEstimator, downloadId: str) -> Throughput:
+    throughput = estimator.estimate(downloadId)
+    assert throughput is not None
+    return throughput
+
+
+def test_throughput() -> None:
+    estimator = ThroughputEstimator(capacity=3, alpha=0.5)
+    estimator.record([item(1, sizeleft=1000), item(2, sizeleft=500)], at=0)
+    estimate = estimate_of(estimator, "dl1")
+    assert estimate.rate == 0
+    assert estimate.eta is None
+    assert estimate.samples == 1
+
+    estimator.record([item(1, sizeleft=800), item(2, sizeleft=500)], at=10)
+    estimate = estimate_of(estimator, "dl1")
+    assert estimate.rate == 20
+    assert estimate.eta == timedelta(seconds=40)
+
+    #  EWMA: 20 + 0.5 * (40 - 20)
+    estimator.record([item(1, sizeleft=400), item(2, sizeleft=400)], at=20)
+    estimate = estimate_of(estimator, "dl1")
+    assert estimate.rate == 30
+    assert estimate.sizeleft == 400
+
+    estimator.record([item(1, sizeleft=100), item(2, sizeleft=400)], at=30)
+    assert estimator.samples("dl1") == ((10, 800), (20, 400), (30, 100))
+    assert estimate_of(estimator, "dl1").samples == 3
+
+    assert estimate_of(estimator, "dl2").rate == 2.5
+    assert estimator.rate == estimate_of(estimator, "dl1").rate + 2.5
+
+
+def test_throughput_shared_download() -> None:
+    """Items of one download are sampled once; gone downloads are dropped"""
+    estimator = ThroughputEstimator()
+    estimator.record([item(1, downloadId="x"), item(2, downloadId="x")], at=0)
+    estimator.record([item(1, sizeleft=50, downloadId="x")], at=5)
+    assert list(estimator.estimates()) == ["x"]
+    assert estimate_of(estimator, "x").rate == 10
+
+    estimator.record([], at=6)
+    assert estimator.estimate("x") is None
+    assert estimator.samples("x") == ()
+
+
+def test_throughput_totals() -> None:
+    estimator = ThroughputEstimator()
+    usenet = {"protocol": Protocol.USENET}
+    torrent = {"protocol": Protocol.TORRENT}
+    estimator.record([item(1, **usenet), item(2, **usenet), item(3, **torrent)], at=0)
+    estimator.record(
+        [
+            item(1, sizeleft=90, **usenet),
+            item(2, sizeleft=80, **usenet),
+            item(3, sizeleft=100, **torrent),
+        ],
+        at=1,
+    )
+    totals = estimator.totals()
+    assert totals[Protocol.USENET].downloads == 2
+    assert totals[Protocol.USENET].sizeleft == 170
+    assert totals[Protocol.USENET].rate == 30
+    assert totals[Protocol.TORRENT].rate == 0
+
+
+def test_watcher_estimator() -> None:
+    clock = iter(range(0, 100, 10))
+    estimator = ThroughputEstimator(clock=lambda: next(clock))
+    client = FakeClient([item(1)], [item(1, sizeleft=50)])
+    watcher = QueueWatcher(client, estimator=estimator)
+    watcher.poll()
+    watcher.poll()
+    assert estimate_of(estimator, "dl1").rate == 5
+
+
+def episode(id):
+    return replace(ITEM.episode, id=id)
+
+
+def test_has_warning() -> None:
+    assert not has_warning(item(1))
+    assert has_warning(item(1, trackedDownloadStatus="Warning"))
+    assert has_warning(item(1, trackedDownloadStatus="error"))
+    assert not has_warning(item(1, statusMessages=("No files found",)))
+
+
+def test_stalled_detector() -> None:
+    client = CleaningClient(
+        [item(1), item(2), item(3, status="Queued")],
+        [item(1), item(2, sizeleft=50), item(3, status="Queued")],
+        [
+            item(1),
+            item(2, sizeleft=50, trackedDownloadStatus="Warning"),
+            item(3, status="Queued"),
+        ],
+    )
+    watcher = QueueWatcher(client)
+    detector = StalledDetector(watcher, stall_polls=2)
+    watcher.poll()
+    watcher.poll()
+    assert detector.stalled() == ()
+    watcher.poll()
+    assert [item.id for item in detector.stalled()] == [1, 2]
+    assert [item.id for item in StalledDetector(watcher, 2, False).stalled()] == [1]
+
+
+def test_clean() -> None:
+    """Downloads are deleted once each; one search covers all episodes"""
+    stuck = [
+        item(1, downloadId="x", episode=episode(11)),
+        item(2, downloadId="x", episode=episode(12)),
+        item(3, episode=episode(13)),
+        item(4, episode=episode(14)),
+    ]
+    client = CleaningClient(stuck, fail=(4,))
+    detector = StalledDetector(QueueWatcher(client))
+    cleanup = detector.clean(stuck, blacklist=True, retries=0)
+
+    assert sorted(client.deleted) == [(1, True), (3, True)]
+    assert [item.id for item in cleanup.removed] == [1, 2, 3]
+    (failure,) = cleanup.failed
+    assert failure.item.id == 4
+    assert isinstance(failure.error, ArrHttpError)
+    assert client.searched == [(11, 12, 13)]
+    assert cleanup.search == "COMMAND"
+
+
+def test_clean_nothing() -> None:
+    client = CleaningClient([item(1)])
+    watcher = QueueWatcher(client)
+    watcher.poll()
+    cleanup = StalledDetector(watcher).clean(blacklist=False, search=False)
+    assert cleanup.removed == ()
+    assert client.deleted == []
+    assert client.searched == []
+
+
+@pytest.fixture
+def radarr_server():
+    routes = {
+        (HttpMethod.GET, "/api/queue"): RADARR_QUEUE,
+        (HttpMethod.DELETE, "/api/queue/473989688"): "{}",
+        (HttpMethod.POST, "/api/command"): COMMAND,
+    }
+    yield from mock_routes_server(routes)
+
+
+def test_clean_radarr(radarr_server):
+    """StalledDetector with RadarrClient searches for movies"""
+    client = RadarrClient("localhost", "MYKEY", port=radarr_server.server_port)
+    watcher = QueueWatcher(client)
+    watcher.poll()
+    cleanup = StalledDetector(watcher).clean()
+    assert [item.id for item in cleanup.removed] == [473989688]
+    assert cleanup.failed == ()
+
+    delete, post = radarr_server.requests[1:]
+    assert delete[:3] == ("DELETE", "/api/queue/473989688", {"blacklist": ["false"]})
+    assert json.loads(post[3]) == {"name": "MoviesSearch", "movieIds": [16]}
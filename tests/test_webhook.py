@@ -0,0 +1,256 @@
+"""Tests for downloadcarr.webhook
+"""
+import base64
+from dataclasses import replace
+from datetime import date, datetime, timedelta, timezone
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from downloadcarr.calendar import CalendarCache
+from downloadcarr.client import ArrHttpError
+from downloadcarr.enums import WebhookEventType
+from downloadcarr.mirror import Mirror
+from downloadcarr.models import WebhookFile, WebhookSeries
+from downloadcarr.radarr.client import movie_dates
+from downloadcarr.sonarr.client import episode_dates
+from downloadcarr.sonarr.tags import TagIndex
+from downloadcarr.webhook import WebhookEvent, WebhookReceiver, WebhookSync, parse_event
+import downloadcarr.sonarr.models as sonarr_models
+import downloadcarr.radarr.models as radarr_models
+
+from .sonarr import ALLSERIES, EPISODES, EPISODEFILES
+from .radarr import QUEUE
+
+
+SONARR_DOWNLOAD = {
+    "eventType": "Download",
+    "series": {
+        "id": 7,
+        "title": "Marvel's Daredevil",
+        "path": "/tv/Marvel's Daredevil",
+        "tvdbId": 281662,
+        "type": "standard",
+    },
+    "episodes": [
+        {
+            "id": 889,
+            "episodeNumber": 1,
+            "seasonNumber": 1,
+            "title": "Into the Ring",
+            "airDate": "2015-04-10",
+            "airDateUtc": "2015-04-10T07:00:00Z",
+            "quality": "WEBDL-1080p",
+            "qualityVersion": 1,
+            "unknownAttribute": True,
+        }
+    ],
+    "episodeFile": {
+        "id": 1,
+        "relativePath": "Season 1/Daredevil - S01E01.mkv",
+        "path": "/tv/Marvel's Daredevil/Season 1/Daredevil - S01E01.mkv",
+        "quality": "WEBDL-1080p",
+        "qualityVersion": 1,
+        "releaseGroup": "NTb",
+        "sceneName": "Marvels.Daredevil.S01E01.1080p.WEB-DL.NTb",
+        "size": 2000000000,
+    },
+    "isUpgrade": False,
+    "downloadId": "SABnzbd_nzo_abc",
+}
+
+RADARR_DELETE = {
+    "eventType": "MovieDelete",
+    "movie": {"id": 16, "title": "Mowgli", "releaseDate": "2018-12-07"},
+}
+
+
+SERIES_ = sonarr_models.Series.from_dict(json.loads(ALLSERIES)[0])
+EPISODE_ = sonarr_models.Episode.from_dict(json.loads(EPISODES)[0])
+EPISODEFILE_ = sonarr_models.EpisodeFile.from_dict(json.loads(EPISODEFILES)[0])
+MOVIE_ = radarr_models.QueueItem.from_dict(json.loads(QUEUE)[0]).movie
+
+
+class FakeClient:
+    def __init__(self):
+        self.calendar_cache = CalendarCache()
+        self.calls = []
+
+    def get_series(self, seriesId):
+        self.calls.append(("series", seriesId))
+        return replace(SERIES_, id=seriesId, tags=(1,))
+
+    def get_episodes(self, seriesId):
+        self.calls.append(("episodes", seriesId))
+        return (replace(EPISODE_, seriesId=seriesId),)
+
+    def get_episode_files(self, seriesId):
+        self.calls.append(("episodefiles", seriesId))
+        return (replace(EPISODEFILE_, seriesId=seriesId),)
+
+    def get_movie(self, movieId):
+        self.calls.append(("movie", movieId))
+        return replace(MOVIE_, id=movieId)
+
+
+def parse(payload) -> WebhookEvent:
+    event = parse_event(payload)
+    assert event is not None
+    return event
+
+
+def test_parse_event() -> None:
+    event = parse(SONARR_DOWNLOAD)
+    assert event.eventType is WebhookEventType.DOWNLOAD
+    assert event.series == WebhookSeries(
+        7, "Marvel's Daredevil", "/tv/Marvel's Daredevil", 281662, type="standard"
+    )
+    (episode,) = event.episodes
+    assert episode.id == 889
+    assert episode.airDate == date(2015, 4, 10)
+    assert isinstance(event.file, WebhookFile)
+    assert event.file.releaseGroup == "NTb"
+    assert event.movie is None
+    assert event.downloadId == "SABnzbd_nzo_abc"
+    assert event.payload is SONARR_DOWNLOAD
+
+    event = parse(RADARR_DELETE)
+    assert event.eventType is WebhookEventType.MOVIE_DELETE
+    assert event.movie is not None
+    assert event.movie.releaseDate == date(2018, 12, 7)
+    assert event.series is None
+    assert event.episodes == ()
+
+    assert parse_event({"eventType": "ApplicationUpdate"}) is None
+
+
+def test_sync_series() -> None:
+    client = FakeClient()
+    aired = date(2009, 9, 18)  # EPISODE_'s air date
+    other = replace(
+        EPISODE_,
+        id=2,
+        seriesId=8,
+        airDateUtc=datetime(2009, 9, 20, tzinfo=timezone.utc),
+    )
+    client.calendar_cache.get(
+        aired - timedelta(days=1),
+        aired + timedelta(days=7),
+        lambda start, end: (replace(EPISODE_, seriesId=7), other),
+        episode_dates,
+    )
+    tags = TagIndex([])
+    with Mirror() as mirror:
+        sync = WebhookSync(client, mirror, tags)
+        sync(parse(SONARR_DOWNLOAD))
+        assert client.calls == [("series", 7), ("episodes", 7), ("episodefiles", 7)]
+        assert [s.id for s in mirror.get_all_series()] == [7]
+        assert len(mirror.get_episodes(7)) == 1
+        assert tags.query(all_of=[1]) == (7,)
+        #  Only the day of the series' episode is dropped from the calendar
+        assert client.calendar_cache.intervals == (
+            (aired - timedelta(days=1), aired),
+            (aired + timedelta(days=1), aired + timedelta(days=7)),
+        )
+
+        sync(parse(dict(SONARR_DOWNLOAD, eventType="SeriesDelete")))
+        assert mirror.get_all_series() == ()
+        assert mirror.get_episodes(7) == ()
+        assert tags.query() == ()
+        assert sync.applied == 2
+
+        #  Grabs don't change the library
+        client.calls.clear()
+        sync(parse(dict(SONARR_DOWNLOAD, eventType="Grab")))
+        assert client.calls == []
+        assert sync.applied == 2
+
+
+def test_sync_movie() -> None:
+    client = FakeClient()
+    client.calendar_cache.get(
+        date(2018, 11, 20),
+        date(2018, 12, 10),
+        lambda start, end: (MOVIE_, replace(MOVIE_, id=17)),
+        movie_dates,
+    )
+    with Mirror() as mirror:
+        sync = WebhookSync(client, mirror)
+        sync(parse(dict(RADARR_DELETE, eventType="Download")))
+        assert client.calls == [("movie", 16)]
+        assert mirror.get_movie(16).movieFile == MOVIE_.movieFile
+        #  The movie's release days are dropped from the calendar
+        assert client.calendar_cache.intervals == (
+            (date(2018, 11, 20), date(2018, 11, 24)),
+            (date(2018, 11, 25), date(2018, 12, 7)),
+            (date(2018, 12, 8), date(2018, 12, 10)),
+        )
+
+        sync(parse(RADARR_DELETE))
+        assert mirror.get_movies() == ()
+        assert sync.applied == 2
+
+        #  Events missing the series/movie they concern are skipped
+        for eventType in ("MovieDelete", "SeriesDelete", "Download"):
+            sync(parse({"eventType": eventType}))
+        assert sync.applied == 2
+
+
+def post(receiver, payload, path="/", auth=None):
+    headers = {"Content-Type": "application/json"}
+    if auth is not None:
+        headers["Authorization"] = "Basic " + base64.b64encode(auth).decode()
+    data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+    request = urllib.request.Request(
+        f"http://localhost:{receiver.port}{path}",
+        data=data,
+        headers=headers,
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as err:
+        return err.code
+
+
+@pytest.fixture
+def receiver():
+    events = []
+
+    def handler(event):
+        if event.eventType is WebhookEventType.RENAME:
+            raise ArrHttpError("500", "Internal Server Error", "http://localhost")
+        events.append(event)
+
+    receiver = WebhookReceiver(handler, path="/hook", username="user", password="pw")
+    receiver.events = events
+    with receiver:
+        yield receiver
+    assert not receiver.running
+
+
+def test_receiver(receiver):
+    assert post(receiver, SONARR_DOWNLOAD, "/hook?x=1", b"user:pw") == 200
+    assert post(receiver, {"eventType": "Test"}, "/hook", b"user:pw") == 200
+    assert post(receiver, {"eventType": "Unknown"}, "/hook", b"user:pw") == 200
+    assert [event.eventType for event in receiver.events] == [
+        WebhookEventType.DOWNLOAD,
+        WebhookEventType.TEST,
+    ]
+    assert receiver.received == 3
+
+
+def test_receiver_errors(receiver):
+    assert post(receiver, SONARR_DOWNLOAD, "/hook") == 401
+    assert post(receiver, SONARR_DOWNLOAD, "/hook", b"user:wrong") == 401
+    assert post(receiver, SONARR_DOWNLOAD, "/hook", "usér:pw".encode()) == 401
+    assert post(receiver, SONARR_DOWNLOAD, "/other", b"user:pw") == 404
+    assert post(receiver, b"not json", "/hook", b"user:pw") == 400
+    assert post(receiver, {"series": {}}, "/hook", b"user:pw") == 400
+    rename = dict(SONARR_DOWNLOAD, eventType="Rename")
+    assert post(receiver, rename, "/hook", b"user:pw") == 500
+    assert receiver.errors == 1
+    assert receiver.events == []
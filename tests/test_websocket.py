@@ -0,0 +1,95 @@
+"""Tests for downloadcarr.websocket
+"""
+import io
+import socket
+
+import pytest
+
+from downloadcarr.client import ArrConnectionError
+from downloadcarr.websocket import (
+    OP_CLOSE,
+    OP_PING,
+    OP_TEXT,
+    WebSocket,
+    WebSocketClosed,
+    accept_key,
+    encode_frame,
+    read_frame,
+)
+
+from . import mock_routes_server, mock_signalr_server
+
+
+def test_accept_key() -> None:
+    """Example from RFC 6455 section 1.3"""
+    assert accept_key("dGhlIHNhbXBsZSBub25jZQ==") == "s3pPLMBiTxaQ9kYGzzhZRbK+xOo="
+
+
+@pytest.mark.parametrize("size", [0, 125, 126, 65535, 65536])
+@pytest.mark.parametrize("mask", [True, False])
+def test_frame(size, mask) -> None:
+    payload = bytes(i % 251 for i in range(size))
+    frame = encode_frame(OP_TEXT, payload, mask=mask)
+    assert bool(frame[1] & 0x80) is mask
+    stream = io.BytesIO(frame + encode_frame(OP_PING, b"x"))
+    assert read_frame(stream) == (True, OP_TEXT, payload)
+    assert read_frame(stream) == (True, OP_PING, b"x")
+    with pytest.raises(WebSocketClosed):
+        read_frame(stream)
+
+
+def test_fragmented() -> None:
+    stream = io.BytesIO(b"\x01\x03abc" + b"\x80\x02de" + b"\x88\x00")
+    assert read_frame(stream) == (False, OP_TEXT, b"abc")
+    assert read_frame(stream) == (True, 0, b"de")
+    assert read_frame(stream) == (True, OP_CLOSE, b"")
+
+
+@pytest.fixture
+def server():
+    yield from mock_signalr_server({})
+
+
+def test_websocket(server) -> None:
+    url = f"ws://localhost:{server.server_port}/signalr/messages?id=token"
+    with WebSocket(url, timeout=5) as ws:
+        ws.send('{"protocol":"json","version":1}\x1e')
+        assert ws.recv() == "{}\x1e"
+        server.send("hello")
+        assert ws.recv() == "hello"
+
+        server.drop()
+        with pytest.raises(WebSocketClosed):
+            ws.recv()
+        assert ws.closed
+        assert ws._stream.closed
+    assert server.received == ['{"protocol":"json","version":1}\x1e']
+
+
+def test_handshake_failed(server) -> None:
+    url = f"ws://localhost:{server.server_port}/signalr/messages?id=wrong"
+    with pytest.raises(ArrConnectionError) as excinfo:
+        WebSocket(url, timeout=5)
+    assert "404" in str(excinfo.value)
+
+
+def test_connection_refused() -> None:
+    server = mock_routes_server({})
+    port = next(server).server_port
+    next(server, None)
+    with pytest.raises(ArrConnectionError):
+        WebSocket(f"ws://localhost:{port}/", timeout=5)
+
+
+def test_handshake_timeout() -> None:
+    """A server that never answers the handshake"""
+    listener = socket.socket()
+    listener.bind(("localhost", 0))
+    listener.listen()
+    port = listener.getsockname()[1]
+    try:
+        with pytest.raises(ArrConnectionError) as excinfo:
+            WebSocket(f"ws://localhost:{port}/", timeout=0.1)
+        assert "Timeout" in str(excinfo.value)
+    finally:
+        listener.close()